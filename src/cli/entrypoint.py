@@ -3,7 +3,7 @@
 entrypoint.py
 - Manual entrypoint for triggering orchestrator tasks via `docker exec`.
 - Usage:
-    docker exec <container> python /src/runner/entrypoint.py [label_sync|rebalance]
+    docker exec <container> python /src/runner/entrypoint.py [label_sync|rebalance|simulate ...]
 
 - Extensible command router to support additional runners.
 """
@@ -32,6 +32,7 @@ def usage():
     print("Available commands:")
     print("  label_sync   Run the label dependency sync loop")
     print("  rebalance    Run the service rebalance loop")
+    print("  simulate     Replay a recording or synthetic workload through the rebalance policy (see --help)")
     sys.exit(1)
 
 def handle_exit(signum, frame):
@@ -43,7 +44,7 @@ signal.signal(signal.SIGINT, handle_exit)
 signal.signal(signal.SIGTERM, handle_exit)
 
 def main():
-    if len(sys.argv) != 2:
+    if len(sys.argv) < 2:
         usage()
 
     command = sys.argv[1]
@@ -52,6 +53,9 @@ def main():
         label_sync.run()
     elif command == "rebalance":
         rebalance.run()
+    elif command == "simulate":
+        from lib.rebalance import simulator
+        simulator.main(sys.argv[2:])
     # Future additions:
     # elif command == "bootstrap":
     #     from lib.bootstrap import bootstrap_runner
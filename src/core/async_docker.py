@@ -0,0 +1,219 @@
+"""
+async_docker.py
+- Native asyncio client for the Docker Engine API over the local unix socket.
+- Covers only the endpoints orcastra uses: services, tasks, nodes, containers,
+  events, stats, info, node update and service update.
+- Requests share one pooled aiohttp connector per event loop, so async runners
+  never block the event loop on a slow API call and can fan out inspections
+  concurrently. aiohttp sessions are bound to the loop that created them, so the
+  shared client keeps one session per loop (main orchestrator loop, API server
+  thread, `asyncio.run()` in worker threads).
+- Every request is recorded per endpoint and per calling runner (see
+  `docker_instrumentation`).
+"""
+
+import asyncio
+import json
+import os
+import time
+import weakref
+import aiohttp
+
+from core.docker_instrumentation import record, record_bytes
+
+# --- Config via Environment Variables ---
+DOCKER_SOCKET = os.getenv("DOCKER_SOCKET", "/var/run/docker.sock")
+DOCKER_API_VERSION = os.getenv("DOCKER_API_VERSION", "")  # e.g. "v1.43"; empty uses the daemon default
+DOCKER_POOL_SIZE = int(os.getenv("DOCKER_POOL_SIZE", "16"))
+DOCKER_CONCURRENCY = int(os.getenv("DOCKER_CONCURRENCY", "8"))
+DOCKER_TIMEOUT = float(os.getenv("DOCKER_TIMEOUT", "30"))
+
+
+class DockerAPIError(Exception):
+    """Raised when the Docker Engine API answers with a non-2xx status."""
+
+    def __init__(self, status, message, method=None, path=None):
+        super().__init__(f"{method} {path} -> {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def _encode_filters(filters):
+    if not filters:
+        return None
+    return json.dumps({k: v if isinstance(v, list) else [v] for k, v in filters.items()})
+
+
+class AsyncDockerClient:
+    """
+    Minimal asyncio Docker Engine client backed by a pooled unix-socket connector.
+
+    Sessions are created lazily, one per running event loop, so the client can
+    be instantiated at import time and shared by coroutines on any loop.
+    """
+
+    def __init__(self, socket_path=DOCKER_SOCKET, pool_size=DOCKER_POOL_SIZE, timeout=DOCKER_TIMEOUT):
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._sessions = weakref.WeakKeyDictionary()  # event loop -> its aiohttp session
+        self._prefix = f"/{DOCKER_API_VERSION}" if DOCKER_API_VERSION else ""
+
+    def _get_session(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            raise RuntimeError("AsyncDockerClient must be used from a coroutine running on an event loop") from None
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.UnixConnector(path=self.socket_path, limit=self.pool_size)
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def close(self):
+        """Close the session of the running loop (other loops close their own)."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def request(self, method, path, params=None, body=None, timeout=None):
+        """
+        Perform one API request and return the decoded JSON body (or None).
+
+        Raises:
+            DockerAPIError: If the daemon answers with a status >= 400.
+        """
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        kwargs = {"params": params, "json": body}
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+
+        started = time.monotonic()
+        try:
+            async with self._get_session().request(method, f"http://docker{self._prefix}{path}", **kwargs) as resp:
+                payload = await resp.read()
+        except Exception:
+            record(method, path, time.monotonic() - started, error=True)
+            raise
+        record(method, path, time.monotonic() - started, len(payload), error=resp.status >= 400)
+
+        if resp.status >= 400:
+            try:
+                message = json.loads(payload).get("message", payload.decode(errors="replace"))
+            except Exception:
+                message = payload.decode(errors="replace")
+            raise DockerAPIError(resp.status, message, method, path)
+        if not payload:
+            return None
+        return json.loads(payload)
+
+    # --- Read Endpoints ---
+
+    async def info(self):
+        return await self.request("GET", "/info")
+
+    async def services(self, filters=None):
+        return await self.request("GET", "/services", params={"filters": _encode_filters(filters)})
+
+    async def service(self, service_id):
+        return await self.request("GET", f"/services/{service_id}")
+
+    async def tasks(self, filters=None):
+        return await self.request("GET", "/tasks", params={"filters": _encode_filters(filters)})
+
+    async def nodes(self, filters=None):
+        return await self.request("GET", "/nodes", params={"filters": _encode_filters(filters)})
+
+    async def node(self, node_id):
+        return await self.request("GET", f"/nodes/{node_id}")
+
+    async def containers(self, all=False, filters=None):
+        return await self.request(
+            "GET", "/containers/json",
+            params={"all": "1" if all else "0", "filters": _encode_filters(filters)},
+        )
+
+    async def container_stats(self, container_id):
+        """Single stats sample; one-shot skips the daemon's CPU sampling window."""
+        return await self.request(
+            "GET", f"/containers/{container_id}/stats",
+            params={"stream": "false", "one-shot": "true"},
+        )
+
+    async def events(self, since=None, filters=None):
+        """
+        Stream decoded events until the connection drops.
+
+        Yields:
+            dict: One Docker event per iteration.
+        """
+        params = {"since": since, "filters": _encode_filters(filters)}
+        params = {k: str(v) for k, v in params.items() if v is not None}
+        started = time.monotonic()
+        async with self._get_session().get(
+            f"http://docker{self._prefix}/events",
+            params=params,
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=None),
+        ) as resp:
+            record("GET", "/events", time.monotonic() - started, error=resp.status >= 400)
+            if resp.status >= 400:
+                raise DockerAPIError(resp.status, await resp.text(), "GET", "/events")
+            async for line in resp.content:
+                record_bytes("GET", "/events", len(line))
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    # --- Write Endpoints ---
+
+    async def update_node(self, node_id, version, spec):
+        return await self.request("POST", f"/nodes/{node_id}/update", params={"version": version}, body=spec)
+
+    async def update_service(self, service_id, version, spec):
+        return await self.request("POST", f"/services/{service_id}/update", params={"version": version}, body=spec)
+
+    async def mutate_service_spec(self, service_id, mutate):
+        """
+        Read-modify-write a service spec at its current version.
+
+        Args:
+            mutate (callable): Receives the spec dict and edits it in place.
+        """
+        service = await self.service(service_id)
+        spec = service["Spec"]
+        mutate(spec)
+        return await self.update_service(service_id, service["Version"]["Index"], spec)
+
+    async def force_update_service(self, service_id):
+        """
+        Re-deploy a service's tasks, equivalent to `docker service update --force`.
+        Reads the current spec first so the update uses the latest version index.
+        """
+        def bump(spec):
+            task_template = spec.setdefault("TaskTemplate", {})
+            task_template["ForceUpdate"] = task_template.get("ForceUpdate", 0) + 1
+        return await self.mutate_service_spec(service_id, bump)
+
+
+async def bounded_gather(aws, limit=DOCKER_CONCURRENCY):
+    """
+    Await coroutines concurrently with at most `limit` in flight.
+
+    Exceptions are returned in place of results, like
+    `asyncio.gather(..., return_exceptions=True)`.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _run(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(_run(aw) for aw in aws), return_exceptions=True)
+
+
+# Shared instance for all async runners.
+async_client = AsyncDockerClient()
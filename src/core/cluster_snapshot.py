@@ -0,0 +1,234 @@
+"""
+cluster_snapshot.py
+- Builds a shared, read-only view of the Swarm from three bulk API calls:
+    - services.list()
+    - tasks (all services at once)
+    - nodes.list()
+- Indexes the result by service name, service ID and node ID so runners can
+  resolve placements without per-service `services.get()` / `service.tasks()` calls.
+- A freshness TTL (SNAPSHOT_TTL) decides when the shared snapshot is rebuilt.
+- Concurrent async readers share one in-flight capture. `invalidate()` bumps a
+  generation counter, and a capture that started before it is never stored.
+"""
+
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from loguru import logger
+
+from core.config import SNAPSHOT_TTL
+from core.docker_client import client
+from core.metrics import registry
+from core.async_docker import async_client
+
+
+def _task_timestamp(task):
+    return task.get("Status", {}).get("Timestamp", "")
+
+
+class ClusterSnapshot:
+    """
+    Point-in-time view of services, tasks and nodes in the Swarm.
+
+    Service and node entries are the Docker SDK model objects returned by the
+    bulk list calls, so callers can still invoke `.update()` on them. Tasks are
+    the raw API dicts.
+    """
+
+    def __init__(self, services, tasks, nodes, taken_at=None):
+        self.taken_at = taken_at if taken_at is not None else time.monotonic()
+
+        self.services_by_name = {}
+        self.services_by_id = {}
+        for service in services:
+            self.services_by_id[service.id] = service
+            self.services_by_name[service.attrs.get("Spec", {}).get("Name", service.id)] = service
+
+        self.tasks_by_service_id = defaultdict(list)
+        self.tasks_by_node_id = defaultdict(list)
+        for task in tasks:
+            self.tasks_by_service_id[task.get("ServiceID")].append(task)
+            if task.get("NodeID"):
+                self.tasks_by_node_id[task["NodeID"]].append(task)
+
+        self.nodes_by_id = {node.id: node for node in nodes}
+        self.nodes_by_hostname = {
+            node.attrs.get("Description", {}).get("Hostname"): node for node in nodes
+        }
+
+    @classmethod
+    def capture(cls, docker_client=None):
+        """
+        Build a snapshot using one bulk call per object type.
+
+        Args:
+            docker_client: Docker SDK client (defaults to the shared client).
+
+        Returns:
+            ClusterSnapshot: The freshly captured snapshot.
+        """
+        docker_client = docker_client or client
+        services = docker_client.services.list()
+        tasks = docker_client.api.tasks()
+        nodes = docker_client.nodes.list()
+        return cls(services, tasks, nodes)
+
+    @classmethod
+    async def capture_async(cls, aclient, docker_client=None):
+        """
+        Build a snapshot with the asyncio client, fetching all three lists concurrently.
+
+        Raw API dicts are wrapped into Docker SDK models bound to the sync client so
+        callers get the same objects as from `capture()`.
+        """
+        docker_client = docker_client or client
+        services, tasks, nodes = await asyncio.gather(aclient.services(), aclient.tasks(), aclient.nodes())
+        return cls(
+            [docker_client.services.prepare_model(s) for s in services],
+            tasks,
+            [docker_client.nodes.prepare_model(n) for n in nodes],
+        )
+
+    # --- Freshness ---
+
+    def age(self):
+        """Seconds elapsed since this snapshot was captured."""
+        return time.monotonic() - self.taken_at
+
+    def is_fresh(self, max_age=SNAPSHOT_TTL):
+        return self.age() < max_age
+
+    # --- Lookups ---
+
+    @property
+    def services(self):
+        return list(self.services_by_id.values())
+
+    @property
+    def nodes(self):
+        return list(self.nodes_by_id.values())
+
+    def service(self, service_name):
+        """Return the SDK Service object for a name, or None if it does not exist."""
+        return self.services_by_name.get(service_name)
+
+    def node(self, node_id):
+        return self.nodes_by_id.get(node_id)
+
+    def tasks(self, service_name, desired_state=None):
+        """
+        Return all tasks of a service, optionally filtered by desired state.
+
+        Args:
+            service_name (str): Full service name (e.g. swarm-dev_gitea).
+            desired_state (str): Only return tasks with this DesiredState.
+
+        Returns:
+            list[dict]: Task dicts, empty if the service is unknown.
+        """
+        service = self.services_by_name.get(service_name)
+        if service is None:
+            return []
+        tasks = self.tasks_by_service_id.get(service.id, [])
+        if desired_state:
+            tasks = [t for t in tasks if t.get("DesiredState") == desired_state]
+        return tasks
+
+    def latest_task(self, service_name):
+        """Return the most recently updated task of a service, or None."""
+        tasks = self.tasks(service_name)
+        if not tasks:
+            return None
+        return max(tasks, key=_task_timestamp)
+
+    def running_node(self, service_name):
+        """Return the NodeID of the first running task of a service, or None."""
+        for task in self.tasks(service_name):
+            if task.get("Status", {}).get("State") == "running" and task.get("NodeID"):
+                return task["NodeID"]
+        return None
+
+
+# --- Shared Snapshot Cache ---
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+_generation = 0          # bumped by invalidate(); captures from older generations are dropped
+_inflight = None         # asyncio.Task of the running async capture
+_inflight_generation = None
+snapshot_refreshes_total = registry.counter("cluster_snapshot_refreshes_total", "Total bulk cluster snapshot rebuilds")
+snapshot_capture_seconds = registry.histogram("cluster_snapshot_capture_seconds", "Time to capture a bulk cluster snapshot")
+
+
+def get_snapshot(max_age=SNAPSHOT_TTL):
+    """
+    Return the shared snapshot, rebuilding it if it is older than `max_age`.
+
+    Args:
+        max_age (float): Maximum acceptable age in seconds.
+
+    Returns:
+        ClusterSnapshot: A snapshot no older than `max_age` seconds.
+    """
+    global _snapshot
+
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.age() < max_age:
+        return snapshot
+
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.age() >= max_age:
+            started = time.monotonic()
+            _snapshot = ClusterSnapshot.capture()  # invalidate() waits for the lock, so no generation check
+            snapshot_refreshes_total.inc()
+            snapshot_capture_seconds.observe(time.monotonic() - started)
+            logger.debug(
+                f"[snapshot] Refreshed: {len(_snapshot.services_by_id)} services, "
+                f"{sum(len(t) for t in _snapshot.tasks_by_service_id.values())} tasks, "
+                f"{len(_snapshot.nodes_by_id)} nodes in {time.monotonic() - started:.2f}s"
+            )
+        return _snapshot
+
+
+async def get_snapshot_async(max_age=SNAPSHOT_TTL):
+    """
+    Async counterpart of `get_snapshot()` for coroutines: never blocks the event loop.
+    Shares the same cached snapshot as the sync readers, and concurrent misses
+    share one capture.
+    """
+    global _inflight, _inflight_generation
+
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.age() < max_age:
+        return snapshot
+
+    # A capture started before the last invalidate() may predate a write; don't join it.
+    if _inflight is None or _inflight.done() or _inflight_generation != _generation:
+        _inflight_generation = _generation
+        _inflight = asyncio.ensure_future(_capture_async(_generation))
+    # Shielded: a cancelled reader must not cancel the capture the others wait for.
+    return await asyncio.shield(_inflight)
+
+
+async def _capture_async(generation):
+    global _snapshot
+
+    started = time.monotonic()
+    snapshot = await ClusterSnapshot.capture_async(async_client)
+    snapshot_capture_seconds.observe(time.monotonic() - started)
+    with _snapshot_lock:
+        if generation == _generation:
+            _snapshot = snapshot
+            snapshot_refreshes_total.inc()
+        else:
+            logger.debug("[snapshot] Discarding a capture that started before the last invalidate().")
+    return snapshot
+
+
+def invalidate():
+    """Drop the shared snapshot so the next reader rebuilds it (e.g. after a write)."""
+    global _snapshot, _generation
+    with _snapshot_lock:
+        _snapshot = None
+        _generation += 1
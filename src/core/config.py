@@ -20,8 +20,15 @@ RUN_ONCE = os.getenv("RUN_ONCE", "false").lower() == "true"
 EVENT_MODE = os.getenv("EVENT_MODE", "false").lower() == "true"
 POLLING_MODE = os.getenv("POLLING_MODE", "true").lower() == "true"
 
+# --- Cluster Snapshot ---
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", "10"))  # seconds a shared cluster snapshot stays fresh
+
+# --- API ---
+API_PORT = int(os.getenv("API_PORT", "6060"))  # health, metrics and follower /usage endpoint
+
 # --- Stack & Logging ---
 STACK_NAME = os.getenv("STACK_NAME", "swarm-dev")
+RESTART_DEPENDENTS = os.getenv("RESTART_DEPENDENTS", "false").lower() == "true"  # default for groups without restart_dependents
 LOG_TO_FILE = os.getenv("LOG_TO_FILE", "false").lower() == "true"
 LOG_LEVEL = "DEBUG" if DEBUG else "INFO"  # Correct for Loguru string levels
 
@@ -41,4 +48,6 @@ if "loguru" in globals():
 # --- Config Paths ---
 SWARM_FILE = os.getenv("SWARM_FILE", "/etc/swarm-orchestration/swarm.yml")
 REBALANCE_CONFIG_PATH = os.getenv("REBALANCE_CONFIG", "/etc/swarm-orchestration/rebalance_config.yml")
-REBALANCE_STATE_PATH = "/var/lib/swarm-orchestration/rebalance_state.json"
+STATE_DIR = os.getenv("STATE_DIR", "/var/lib/swarm-orchestration")  # runtime state snapshot and journal
+REBALANCE_STATE_PATH = "/var/lib/swarm-orchestration/rebalance_state.json"  # pre-journal state file, imported once
+REBALANCE_RECORD_FILE = os.getenv("REBALANCE_RECORD_FILE", "")  # JSON lines of per-cycle inputs for the simulator; empty disables
@@ -1,34 +1,266 @@
 """
 config_loader.py
-- Loads and previews YAML configuration files used by orchestration modules.
-- Supports dependencies.yml, nodes.yml, and rebalance_config.yml.
+- Config service for the YAML files used by orchestration modules (swarm.yml,
+  rebalance_config.yml, the rebalance dependencies file).
+- Each file is parsed once with the C YAML loader (pure-Python fallback) and
+  validated into an immutable object: `SwarmConfig` for swarm.yml, read-only
+  mappings for the others. Callers get the same instance until the file
+  actually changes, so a pass can compare configs with `is`.
+- The cache is keyed on mtime and size (a `stat()` per lookup); a changed stamp
+  is confirmed by the content hash before anything is re-parsed.
+- A file that fails to parse or validate keeps its last good value.
+- Subscribers are notified with the new value whenever a file changes, either on
+  lookup or on `refresh()` (called by the config file watcher).
+- `load_yaml` remains for one-shot readers (CLI tools) that want a plain dict.
 """
 
+import hashlib
 import os
+import threading
 import yaml
 import logging
 
-def load_yaml(path):
-    """Safely load a YAML file and return a parsed dict. Returns {} on failure."""
-    try:
-        with open(path, "r") as f:
-            return yaml.safe_load(f) or {}
-    except Exception as e:
-        logging.error(f"[load_yaml] Failed to load {path}: {e}")
+from core.config import SWARM_FILE, REBALANCE_CONFIG_PATH
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:  # libyaml not available
+    from yaml import SafeLoader as YamlLoader
+
+
+class ConfigError(ValueError):
+    """A config file does not match its expected structure."""
+
+
+class FrozenDict(dict):
+    """A dict that refuses modification; config values are shared between runners."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("config is read-only")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _readonly
+
+
+def freeze(value):
+    """Recursively convert dicts to FrozenDict and lists to tuples."""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def _mapping(value, where):
+    if value is None:
         return {}
+    if not isinstance(value, dict):
+        raise ConfigError(f"{where} must be a mapping, got {type(value).__name__}")
+    return value
+
+
+def _string_list(value, where):
+    if value is None:
+        return ()
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ConfigError(f"{where} must be a list of names")
+    return tuple(value)
+
+
+def validate_dependency_group(anchor, value):
+    """
+    Normalize one `dependencies` entry: either a plain list of dependents or a
+    mapping with `services` and optional `stack`, `restart_dependents` and
+    `retry_intervals`.
+    """
+    where = f"dependencies.{anchor}"
+    if isinstance(value, list) or value is None:
+        return _string_list(value, where)
+    group = dict(_mapping(value, where))
+    group["services"] = _string_list(group.get("services"), f"{where}.services")
+    if "stack" in group and not isinstance(group["stack"], str):
+        raise ConfigError(f"{where}.stack must be a string")
+    if "restart_dependents" in group and not isinstance(group["restart_dependents"], bool):
+        raise ConfigError(f"{where}.restart_dependents must be true or false")
+    if "retry_intervals" in group:
+        intervals = group["retry_intervals"]
+        if not isinstance(intervals, list) or not intervals or not all(isinstance(i, (int, float)) and i >= 0 for i in intervals):
+            raise ConfigError(f"{where}.retry_intervals must be a non-empty list of seconds")
+    return freeze(group)
+
 
-def preview_yaml(path, name=None):
+class SwarmConfig:
     """
-    Print a human-readable preview of the YAML file contents for debugging.
-    Typically used during startup to verify config presence and structure.
+    Validated, immutable swarm.yml.
     """
-    if not os.path.exists(path):
-        logging.warning(f"[config] File not found: {path}")
-        return
 
+    __slots__ = ("leader", "advertise_addr", "nodes", "options", "dependencies")
+
+    def __init__(self, raw):
+        raw = _mapping(raw, "swarm.yml")
+        for key in ("leader", "advertise_addr"):
+            if raw.get(key) is not None and not isinstance(raw[key], str):
+                raise ConfigError(f"{key} must be a string")
+        nodes = {}
+        for name, meta in _mapping(raw.get("nodes"), "nodes").items():
+            meta = _mapping(meta, f"nodes.{name}")
+            if not isinstance(meta.get("ip"), str):
+                raise ConfigError(f"nodes.{name}.ip is required")
+            nodes[name] = freeze({**meta, "labels": list(_string_list(meta.get("labels"), f"nodes.{name}.labels"))})
+
+        object.__setattr__(self, "leader", raw.get("leader"))
+        object.__setattr__(self, "advertise_addr", raw.get("advertise_addr"))
+        object.__setattr__(self, "nodes", FrozenDict(nodes))
+        object.__setattr__(self, "options", freeze(_mapping(raw.get("options"), "options")))
+        object.__setattr__(self, "dependencies", FrozenDict(
+            (anchor, validate_dependency_group(anchor, value))
+            for anchor, value in _mapping(raw.get("dependencies"), "dependencies").items()
+        ))
+
+    def __setattr__(self, name, value):
+        raise TypeError("config is read-only")
+
+    def __repr__(self):
+        return f"SwarmConfig(leader={self.leader!r}, nodes={len(self.nodes)}, dependencies={len(self.dependencies)})"
+
+
+def validate_rebalance_config(raw):
+    """Validate rebalance_config.yml into a read-only mapping with `default` and `services` always present."""
+    raw = dict(_mapping(raw, "rebalance_config.yml"))
+    raw["default"] = _mapping(raw.get("default"), "default")
+    raw["services"] = _mapping(raw.get("services"), "services")
+    for key in ("node_exporters", "node_exporter_nodes", "node_map"):
+        _mapping(raw.get(key), key)
+    interval = raw.get("comonitor_interval_seconds", raw["default"].get("check_interval_seconds", 60))
+    if not isinstance(interval, (int, float)) or interval <= 0:
+        raise ConfigError("comonitor_interval_seconds must be a positive number")
+    for name, entry in raw["services"].items():
+        _mapping(entry, f"services.{name}")
+    return freeze(raw)
+
+
+def validate_dependency_map(raw):
+    """Validate a rebalance dependencies file: anchor service -> list of dependents."""
+    return FrozenDict(
+        (anchor, _string_list(deps, f"dependencies.{anchor}"))
+        for anchor, deps in _mapping(raw, "dependencies file").items()
+    )
+
+
+class ConfigService:
+    """
+    Cache of parsed config files with change notifications.
+    """
+
+    def __init__(self):
+        self.entries = {}      # (path, parser) -> {"stat", "digest", "value"}
+        self.subscribers = {}  # path -> [callback(value)]
+        self.lock = threading.RLock()
+
+    def get(self, path, parser=freeze):
+        """
+        Current parsed value of `path`.
+
+        Args:
+            path (str): YAML file to read.
+            parser (callable): Validates the parsed YAML into the returned object.
+
+        Returns:
+            The cached instance while the file is unchanged, else a freshly parsed one.
+        """
+        path = str(path)
+        with self.lock:
+            entry = self.entries.get((path, parser))
+            try:
+                st = os.stat(path)
+                stamp = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                stamp = None
+            if entry is not None and entry["stat"] == stamp:
+                return entry["value"]
+            value, changed = self._load(path, parser, entry, stamp)
+        if changed:
+            self._notify(path, value)
+        return value
+
+    def _load(self, path, parser, entry, stamp):
+        if stamp is None:
+            if entry is None:
+                logging.warning(f"[config] File not found: {path}")
+                entry = self.entries[(path, parser)] = {"stat": None, "digest": None, "value": parser({})}
+            entry["stat"] = None
+            return entry["value"], False
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            logging.error(f"[config] Could not read {path}: {e}")
+            return (entry["value"] if entry else parser({})), False
+
+        digest = hashlib.sha256(data).hexdigest()
+        if entry is not None and entry["digest"] == digest:
+            entry["stat"] = stamp  # touched, content unchanged
+            return entry["value"], False
+
+        try:
+            value = parser(yaml.load(data, Loader=YamlLoader) or {})
+        except (yaml.YAMLError, ValueError, TypeError) as e:
+            logging.error(f"[config] Invalid {path}, keeping the last good version: {e}")
+            if entry is None:
+                entry = self.entries[(path, parser)] = {"stat": stamp, "digest": digest, "value": parser({})}
+            entry["stat"] = stamp
+            return entry["value"], False
+
+        logging.info(f"[config] Loaded {path} (sha256 {digest[:12]}).")
+        logging.debug(f"\n📄 {path}:\n" + "\n".join(f"│ {line}" for line in data.decode(errors="replace").strip().splitlines()))
+        self.entries[(path, parser)] = {"stat": stamp, "digest": digest, "value": value}
+        return value, entry is not None
+
+    def _notify(self, path, value):
+        for callback in list(self.subscribers.get(path, [])):
+            try:
+                callback(value)
+            except Exception as e:
+                logging.error(f"[config] Change subscriber for {path} failed: {e}")
+
+    def subscribe(self, path, callback):
+        """Call `callback(new_value)` whenever `path` changes."""
+        with self.lock:
+            self.subscribers.setdefault(str(path), []).append(callback)
+
+    def unsubscribe(self, path, callback):
+        with self.lock:
+            callbacks = self.subscribers.get(str(path), [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def refresh(self, path=None):
+        """Re-check `path` (default: every loaded file) and notify subscribers of changes."""
+        with self.lock:
+            keys = [key for key in self.entries if path is None or key[0] == str(path)]
+        for key_path, parser in keys:
+            self.get(key_path, parser)
+
+
+# Shared config service for all runners.
+config_service = ConfigService()
+
+
+def swarm_config():
+    """The current validated swarm.yml."""
+    return config_service.get(SWARM_FILE, SwarmConfig)
+
+
+def rebalance_config():
+    """The current validated rebalance_config.yml."""
+    return config_service.get(REBALANCE_CONFIG_PATH, validate_rebalance_config)
+
+
+def load_yaml(path):
+    """Load a YAML file once, uncached, and return a plain parsed dict. Returns {} on failure."""
     try:
         with open(path, "r") as f:
-            contents = f.read()
-            logging.info(f"\n📄 Loaded {name or path}:\n" + "\n".join(f"│ {line}" for line in contents.strip().splitlines()))
+            return yaml.load(f, Loader=YamlLoader) or {}
     except Exception as e:
-        logging.error(f"[config] Could not preview {path}: {e}")
+        logging.error(f"[load_yaml] Failed to load {path}: {e}")
+        return {}
@@ -12,3 +12,5 @@ DEBOUNCE_TIME = 5  # seconds between rechecks (used in metric polling)
 
 # --- Rebalance Buffer ---
 DEFAULT_REBALANCE_BUFFER_GB = 1  # GB difference required to trigger rebalancing
+DEFAULT_MAX_MOVES_PER_CYCLE = 2  # move budget of one rebalance planning stage
+DEFAULT_REBALANCE_HYSTERESIS_GB = 0.5  # GB the gap must fall below the threshold to clear pressure
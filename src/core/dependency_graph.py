@@ -0,0 +1,161 @@
+"""
+dependency_graph.py
+- Compiles the `dependencies` block of swarm.yml once into an indexed graph of
+  anchor groups, instead of reinterpreting the raw mapping on every pass.
+- Each group carries its fully-qualified service names (`<stack>_<service>`) and
+  its resolved policy (retry intervals, restart_dependents).
+- Indexes:
+    - groups: anchor label -> group
+    - by_service: anchor or dependent service -> its group (reverse index), so
+      event handlers and the rebalancer resolve a service's group in O(1)
+    - dependents_of: anchor service -> dependent services (forward index, the
+      shape the rebalance planner consumes)
+- The graph is recompiled only when swarm.yml changes: the config service hands
+  out the same dependencies mapping until then, and the compiled graph is cached
+  on its identity.
+- The rebalancer's legacy dependencies file (anchor -> dependents, short or
+  fully-qualified names) is folded in for anchors swarm.yml does not define.
+"""
+
+import threading
+from loguru import logger
+
+from core.config import STACK_NAME, RESTART_DEPENDENTS
+from core.config_loader import swarm_config
+from core.constants import DEFAULT_RETRY_INTERVALS
+
+
+def _label(name, stack):
+    """Service name without its `<stack>_` prefix."""
+    prefix = f"{stack}_"
+    return name[len(prefix):] if name.startswith(prefix) else name
+
+
+def legacy_groups(legacy, stack=STACK_NAME):
+    """
+    Convert a rebalance dependencies file to `dependencies` entries.
+
+    Args:
+        legacy (dict): Anchor service -> dependent services, with or without the stack prefix.
+
+    Returns:
+        dict[str, list[str]]: Anchor label -> dependent labels.
+    """
+    return {_label(anchor, stack): [_label(dep, stack) for dep in deps or ()] for anchor, deps in (legacy or {}).items()}
+
+
+class AnchorGroup:
+    """
+    One compiled anchor group: an anchor service and the dependents that follow it.
+    """
+
+    __slots__ = ("anchor", "stack", "anchor_service", "dependents", "members", "retry_intervals", "restart_dependents", "retry_key")
+
+    def __init__(self, anchor, value, stack=STACK_NAME, restart_dependents=RESTART_DEPENDENTS):
+        """
+        Args:
+            anchor (str): Anchor label (the anchor service without its stack prefix).
+            value: The group's `dependencies` entry: a list of dependents or a
+                mapping with `services` and optional `stack`, `retry_intervals`
+                and `restart_dependents`.
+        """
+        options = value if isinstance(value, dict) else {"services": value}
+        self.anchor = anchor
+        self.stack = options.get("stack", stack)
+        self.anchor_service = f"{self.stack}_{anchor}"
+        self.dependents = tuple(f"{self.stack}_{dep}" for dep in options.get("services") or ())
+        self.members = (self.anchor_service,) + self.dependents
+        self.retry_intervals = tuple(options.get("retry_intervals") or DEFAULT_RETRY_INTERVALS)
+        self.restart_dependents = options.get("restart_dependents", restart_dependents)
+        self.retry_key = f"group:{anchor}"
+
+    def __repr__(self):
+        return f"AnchorGroup({self.anchor_service!r}, dependents={list(self.dependents)})"
+
+
+class DependencyGraph:
+    """
+    Anchor groups with forward and reverse indexes over fully-qualified service names.
+    """
+
+    def __init__(self, groups=()):
+        self.groups = {}         # anchor label -> AnchorGroup
+        self.by_service = {}     # anchor or dependent service -> AnchorGroup
+        self.dependents_of = {}  # anchor service -> tuple of dependent services
+        for group in groups:
+            self.groups[group.anchor] = group
+            self.dependents_of[group.anchor_service] = group.dependents
+            for service in group.members:
+                owner = self.by_service.setdefault(service, group)
+                if owner is not group:
+                    logger.warning(f"[dependencies] {service} is listed in anchor groups {owner.anchor} and {group.anchor}; keeping {owner.anchor}.")
+
+    @classmethod
+    def compile(cls, dependencies, stack=STACK_NAME, restart_dependents=RESTART_DEPENDENTS):
+        """
+        Build a graph from a `dependencies` mapping (anchor label -> group entry).
+
+        Returns:
+            DependencyGraph
+        """
+        return cls(AnchorGroup(anchor, value, stack, restart_dependents) for anchor, value in (dependencies or {}).items())
+
+    def group(self, anchor):
+        """The group of anchor label `anchor`, or None."""
+        return self.groups.get(anchor)
+
+    def group_for(self, service):
+        """The group an anchor or dependent service (fully-qualified name) belongs to, or None."""
+        return self.by_service.get(service)
+
+    def anchor_of(self, service):
+        """Anchor label of the group `service` belongs to, or None."""
+        group = self.by_service.get(service)
+        return group.anchor if group is not None else None
+
+    def subset(self, anchors):
+        """A graph of only the groups in `anchors` (the graph itself if that is all of them)."""
+        if len(anchors) == len(self.groups) and all(anchor in self.groups for anchor in anchors):
+            return self
+        return DependencyGraph(self.groups[anchor] for anchor in anchors if anchor in self.groups)
+
+    def __iter__(self):
+        return iter(self.groups.values())
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __contains__(self, anchor):
+        return anchor in self.groups
+
+    def __repr__(self):
+        return f"DependencyGraph(groups={len(self.groups)}, services={len(self.by_service)})"
+
+
+_cache_lock = threading.Lock()
+_cache = {}  # with/without a legacy file -> (dependencies, legacy, graph)
+
+
+def dependency_graph(legacy=None):
+    """
+    The compiled graph of swarm.yml's `dependencies`, recompiled only when it changes.
+
+    Args:
+        legacy (dict): A rebalance dependencies file (anchor -> dependents, short or
+            fully-qualified names). Anchors not defined in swarm.yml are added from it.
+
+    Returns:
+        DependencyGraph
+    """
+    dependencies = swarm_config().dependencies
+    slot = legacy is not None
+    with _cache_lock:
+        cached = _cache.get(slot)
+        if cached is not None and cached[0] is dependencies and cached[1] is legacy:
+            return cached[2]
+
+        merged = {**legacy_groups(legacy), **dependencies}
+        graph = DependencyGraph.compile(merged)
+        logger.info(f"[dependencies] Compiled {len(graph)} anchor group(s) covering {len(graph.by_service)} service(s).")
+        _cache[slot] = (dependencies, legacy, graph)
+        return graph
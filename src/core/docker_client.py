@@ -2,21 +2,51 @@
 docker_client.py
 - Provides a shared, preconfigured Docker SDK client instance for all modules.
 - Exposes Docker version info and handles initialization errors gracefully.
+- Every API call of the shared client is recorded per endpoint and per calling
+  runner (see `docker_instrumentation`).
+- Caches the node's leadership state for cheap repeated synchronous checks;
+  the long-running service follows leadership changes via `core.leadership`.
 """
 
+import time
+
 import docker
 from docker import from_env
 
+from core.docker_instrumentation import instrument_sdk_client
+
 try:
-    client = from_env()
+    client = instrument_sdk_client(from_env())
     DOCKER_SDK_VERSION = tuple(map(int, docker.__version__.split(".")))
 except Exception:
     client = None
     DOCKER_SDK_VERSION = (0, 0, 0)  # fallback if docker SDK is not usable
 
-def is_leader_node():
+# --- Leader State ---
+LEADER_CACHE_TTL = 30  # seconds a leadership check is reused
+
+_leader_checked_at = None
+_leader = False
+
+def is_leader_node(max_age=LEADER_CACHE_TTL):
+    """
+    Whether this node is the Swarm leader (not just a manager with control available).
+
+    The result is cached for `max_age` seconds.
+    """
+    global _leader_checked_at, _leader
+
+    now = time.monotonic()
+    if _leader_checked_at is not None and now - _leader_checked_at < max_age:
+        return _leader
     try:
-        info = client.info()
-        return info.get("Swarm", {}).get("ControlAvailable", False)
+        swarm = client.info().get("Swarm", {})
+        if swarm.get("ControlAvailable"):
+            node = client.api.inspect_node(swarm["NodeID"])
+            _leader = bool((node.get("ManagerStatus") or {}).get("Leader"))
+        else:
+            _leader = False
     except Exception:
-        return False
+        _leader = False
+    _leader_checked_at = now
+    return _leader
@@ -0,0 +1,105 @@
+"""
+docker_instrumentation.py
+- Instrumentation layer for all Docker Engine API traffic: the SDK client in
+  `docker_client.py` and the asyncio client in `async_docker.py`.
+- Records per endpoint and per calling runner (the `current_runner` of the job
+  making the call): call count, errors, response bytes and latency.
+- Endpoints are reduced to route templates (`/services/{id}/update`) so object
+  IDs never create a series of their own.
+- Every call is also counted against the runner job in flight, which
+  `runner_pool` reports as API calls per reconcile cycle.
+"""
+
+import re
+import time
+from urllib.parse import urlsplit
+
+from core.metrics import registry
+from core.runner_pool import current_runner, current_cycle
+
+API_VERSION_PREFIX = re.compile(r"^/v\d+(\.\d+)?(?=/)")
+ID_COLLECTIONS = {"services", "tasks", "nodes", "containers", "networks", "secrets", "configs", "volumes", "images", "exec", "plugins"}
+COLLECTION_ACTIONS = {"json", "create", "prune"}
+API_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# --- Metrics ---
+API_LABELS = ["endpoint", "method", "runner"]
+docker_api_calls_total = registry.counter("docker_api_calls_total", "Docker API calls per endpoint and calling runner", API_LABELS)
+docker_api_errors_total = registry.counter("docker_api_errors_total", "Docker API calls that failed or returned an error status", API_LABELS)
+docker_api_response_bytes_total = registry.counter("docker_api_response_bytes_total", "Docker API response bytes received", API_LABELS)
+docker_api_request_duration_seconds = registry.histogram(
+    "docker_api_request_duration_seconds", "Docker API latency until the response headers", API_LABELS, buckets=API_LATENCY_BUCKETS
+)
+
+
+def endpoint(path):
+    """
+    Route template of an API path.
+
+    Example:
+        /v1.43/services/k3l2j4/update -> /services/{id}/update
+    """
+    parts = API_VERSION_PREFIX.sub("", path.split("?", 1)[0]).strip("/").split("/")
+    template = []
+    for i, part in enumerate(parts):
+        if i > 0 and parts[i - 1] in ID_COLLECTIONS and template[-1] == parts[i - 1] and part not in COLLECTION_ACTIONS:
+            template.append("{id}")
+        else:
+            template.append(part)
+    return "/" + "/".join(template)
+
+
+def _labels(method, path):
+    return {"endpoint": endpoint(path), "method": method.upper(), "runner": current_runner.get()}
+
+
+def record(method, path, elapsed, nbytes=0, error=False):
+    """Record one API call made from the current runner context."""
+    labels = _labels(method, path)
+    docker_api_calls_total.inc(**labels)
+    docker_api_request_duration_seconds.observe(elapsed, **labels)
+    if nbytes:
+        docker_api_response_bytes_total.inc(nbytes, **labels)
+    if error:
+        docker_api_errors_total.inc(**labels)
+    cycle = current_cycle.get()
+    if cycle is not None:
+        with registry.lock:
+            cycle["api_calls"] += 1
+
+
+def record_bytes(method, path, nbytes):
+    """Add bytes read later from a streamed response (e.g. the events stream)."""
+    docker_api_response_bytes_total.inc(nbytes, **_labels(method, path))
+
+
+def instrument_sdk_client(client):
+    """
+    Wrap the SDK client's HTTP transport so every API call is recorded.
+
+    The Docker SDK's APIClient is a `requests.Session`; all of its calls go
+    through `send()`, which is wrapped on this instance only.
+
+    Returns:
+        The same client, instrumented.
+    """
+    api = client.api
+    send = api.send
+
+    def instrumented_send(request, **kwargs):
+        path = urlsplit(request.url).path
+        started = time.monotonic()
+        try:
+            response = send(request, **kwargs)
+        except Exception:
+            record(request.method, path, time.monotonic() - started, error=True)
+            raise
+        if kwargs.get("stream"):
+            nbytes = int(response.headers.get("Content-Length") or 0)  # body not read yet
+        else:
+            nbytes = len(response.content or b"")
+        record(request.method, path, time.monotonic() - started, nbytes, error=response.status_code >= 400)
+        return response
+
+    api.send = instrumented_send
+    return client
@@ -0,0 +1,131 @@
+"""
+leadership.py
+- Tracks whether this instance runs on the Swarm leader: the manager whose
+  `ManagerStatus.Leader` is set, not every manager with control available.
+- Leadership is re-checked every LEADERSHIP_CHECK_INTERVAL seconds on the
+  asyncio Docker client; the last result is cached on the watcher.
+- Leader-only runners (label sync, bootstrap, rebalance) are started when
+  leadership is gained and cancelled when it is lost, so after a failover
+  exactly one instance runs them.
+- Exports the leadership gauge, transition counts and time-to-takeover.
+"""
+
+import asyncio
+import os
+import time
+from loguru import logger
+
+from core.async_docker import async_client
+from core.metrics import registry
+from core.scheduler import scheduler, Job
+
+# --- Config via Environment Variables ---
+LEADERSHIP_CHECK_INTERVAL = float(os.getenv("LEADERSHIP_CHECK_INTERVAL", "5"))
+LEADERSHIP_MAX_FAILURES = 3  # consecutive failed checks before a leader steps down
+TAKEOVER_BUCKETS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600)
+
+# --- Metrics ---
+swarm_orch_leader = registry.gauge("swarm_orch_leader", "1 if this instance is Swarm leader, 0 if follower")
+leadership_transitions_total = registry.counter("leadership_transitions_total", "Leadership changes of this instance", ["direction"])
+leadership_check_failures_total = registry.counter("leadership_check_failures_total", "Leadership checks that failed to reach the Docker API")
+leadership_takeover_seconds = registry.histogram(
+    "leadership_takeover_seconds",
+    "Seconds from the last check that saw another leader until this instance started the leader runners",
+    buckets=TAKEOVER_BUCKETS,
+)
+
+
+async def check_leader():
+    """
+    Whether this node is the Swarm leader.
+
+    Returns:
+        bool: True only on the Raft leader; False on other managers, workers
+        and nodes outside a swarm.
+    """
+    swarm = (await async_client.info()).get("Swarm", {})
+    if not swarm.get("ControlAvailable"):
+        return False
+    node = await async_client.node(swarm["NodeID"])
+    return bool((node.get("ManagerStatus") or {}).get("Leader"))
+
+
+class LeadershipWatcher:
+    """
+    Runs the leader-only runners on whichever instance currently holds leadership.
+    """
+
+    def __init__(self, runners, interval=LEADERSHIP_CHECK_INTERVAL):
+        """
+        Args:
+            runners (dict[str, callable]): Runner name -> coroutine function to run while leader.
+            interval (float): Seconds between leadership checks.
+        """
+        self.runners = runners
+        self.interval = interval
+        self.leader = None            # None until the first successful check
+        self.tasks = {}               # runner name -> asyncio.Task while leader
+        self.follower_seen_at = None  # monotonic time of the last check that saw another leader
+        self.failures = 0
+
+    async def _supervise(self, name, runner):
+        try:
+            await runner()
+            logger.info(f"[leadership] Leader runner {name} finished.")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"[leadership] Leader runner {name} failed; it is restarted on the next leadership gain.")
+
+    def _start(self):
+        for name, runner in self.runners.items():
+            self.tasks[name] = asyncio.create_task(self._supervise(name, runner), name=f"leader:{name}")
+
+    async def _stop(self):
+        tasks, self.tasks = list(self.tasks.values()), {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def transition(self, leader):
+        """Start or cancel the leader runners if `leader` differs from the cached state."""
+        if leader == self.leader:
+            return
+        previous, self.leader = self.leader, leader
+        swarm_orch_leader.set(int(leader))
+
+        if leader:
+            logger.info("[leadership] Leadership status: LEADER — starting global orchestration tasks.")
+            self._start()
+            if previous is False and self.follower_seen_at is not None:
+                leadership_takeover_seconds.observe(time.monotonic() - self.follower_seen_at)
+        else:
+            logger.info("[leadership] Leadership status: FOLLOWER — global orchestration tasks not running here.")
+            await self._stop()
+
+        if previous is not None:
+            leadership_transitions_total.inc(direction="gained" if leader else "lost")
+
+    async def check(self):
+        """One leadership check; a leader steps down only after LEADERSHIP_MAX_FAILURES failed checks in a row."""
+        try:
+            leader = await check_leader()
+        except Exception as e:
+            self.failures += 1
+            leadership_check_failures_total.inc()
+            logger.warning(f"[leadership] Leadership check failed ({self.failures}/{LEADERSHIP_MAX_FAILURES}): {e}")
+            if self.failures >= LEADERSHIP_MAX_FAILURES and self.leader is not False:
+                await self.transition(False)
+            return
+
+        self.failures = 0
+        if not leader:
+            self.follower_seen_at = time.monotonic()
+        await self.transition(leader)
+
+    async def run(self):
+        """Check leadership forever; the leader runners are cancelled when the watcher stops."""
+        try:
+            await scheduler.run_job(Job("leadership", self.check, every=self.interval))
+        finally:
+            await self._stop()
@@ -0,0 +1,236 @@
+"""
+metrics.py
+- Central Prometheus metrics registry shared by all runners.
+- Counters, gauges and histograms, each optionally labelled (service, node,
+  anchor, runner, host, ...).
+- Exposition text is pre-rendered per metric family and only rebuilt for the
+  families whose values changed since the last scrape; an unchanged registry is
+  served from one cached string, so scrape cost stays flat with thousands of series.
+- Callback gauges (values derived from the clock at scrape time, e.g. how long
+  a job has been running) are the only part evaluated on every scrape.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """
+    One metric family: a name, help text, label names and a value per label set.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, registry, name, help_text, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}      # label values tuple -> value
+        self.text = ""
+        self.dirty = True
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _changed(self):
+        self.dirty = True
+        self.registry.dirty = True
+
+    def value(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def remove(self, **labels):
+        """Drop one series, e.g. for a service that no longer exists."""
+        with self.registry.lock:
+            if self.values.pop(self._key(labels), None) is not None:
+                self._changed()
+
+    def clear(self):
+        with self.registry.lock:
+            self.values.clear()
+            self._changed()
+
+    def _samples(self):
+        for key in sorted(self.values):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_format(self.values[key])}"
+
+    def render(self):
+        """Exposition text of this family, rebuilt only if a value changed."""
+        if self.dirty:
+            lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+            lines += self._samples()
+            self.text = "\n".join(lines) + "\n"
+            self.dirty = False
+        return self.text
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            self._changed()
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, registry, name, help_text, labelnames=()):
+        super().__init__(registry, name, help_text, labelnames)
+        self.callback = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            if self.values.get(key) != value:
+                self.values[key] = value
+                self._changed()
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            self._changed()
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, callback):
+        """
+        Sample this gauge from `callback` on every scrape.
+
+        Args:
+            callback (callable): Returns {label values tuple: value} (or a number for
+                an unlabelled gauge).
+        """
+        self.callback = callback
+
+    def render(self):
+        if self.callback is not None:
+            result = self.callback()
+            self.values = result if isinstance(result, dict) else {(): result}
+            self.dirty = True
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+            self._changed()
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def value(self, **labels):
+        series = self.values.get(self._key(labels))
+        return series["count"] if series else 0
+
+    def _samples(self):
+        for key in sorted(self.values):
+            series = self.values[key]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series["counts"]):
+                cumulative += count
+                le = f'le="{_format(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_format(series['sum'])}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {series['count']}"
+
+
+class MetricsRegistry:
+    """
+    Ordered set of metric families with cached exposition text.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.RLock()
+        self.dirty = True
+        self.text = ""
+
+    def _get_or_create(self, cls, name, help_text, labelnames, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(self, name, help_text, labelnames, **kwargs)
+                self.dirty = True
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as a different {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render(self):
+        """
+        Full exposition text. Families are rendered in registration order; callback
+        gauges are re-sampled, everything else comes from the cache.
+        """
+        with self.lock:
+            dynamic = any(isinstance(m, Gauge) and m.callback is not None for m in self.metrics.values())
+            if self.dirty or dynamic:
+                self.text = "".join(m.render() for m in self.metrics.values())
+                self.dirty = False
+            return self.text
+
+
+# Shared registry for every runner; served by GET /metrics.
+registry = MetricsRegistry()
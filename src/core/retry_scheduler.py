@@ -0,0 +1,140 @@
+"""
+retry_scheduler.py
+- One retry scheduler for orchestration actions (anchor and dependent
+  force-updates, failed anchor-group passes), replacing tenacity's blocking
+  retries and the old per-service retry bookkeeping.
+- Each key (a service name, or `group:<anchor>` for a whole group) has a failure
+  count and a next-eligible time. The delay after the n-th attempt is
+  `retry_intervals[n]` (capped at the last interval) plus up to RETRY_JITTER of
+  it, so services that failed together do not retry in lockstep.
+- A min-heap of (next-eligible time, key, action) lets the reconcile loops sleep
+  until the earliest due retry and re-run only the anchor groups that are due;
+  nothing ever sleeps inside an API call, so one failing service never delays
+  the other anchors.
+- Failure counts and next-eligible times are kept in the state store (`retries`
+  namespace), so cooldowns and pending retries survive a restart.
+"""
+
+import heapq
+import os
+import random
+import threading
+import time
+
+from core.metrics import registry
+from core.state import state_store
+
+RETRY_JITTER = float(os.getenv("RETRY_JITTER", "0.1"))  # fraction of the delay added at random
+RETRY_REQUEUE_SECONDS = 5  # delay before a popped retry that could not run is due again
+
+# --- Metrics ---
+retry_attempts_total = registry.counter("retry_attempts_total", "Retry attempts recorded by the retry scheduler")
+retry_pending = registry.gauge("retry_pending", "Keys waiting for their next retry")
+
+
+class RetryScheduler:
+    """
+    Backoff bookkeeping plus a due-time heap over the `retries` state namespace.
+    """
+
+    def __init__(self, entries, jitter=RETRY_JITTER):
+        """
+        Args:
+            entries (dict): Persistent key -> {"failures", "last_attempt", "next_at", "action"}.
+            jitter (float): Maximum random extra delay, as a fraction of the interval.
+        """
+        self.entries = entries
+        self.jitter = jitter
+        self.heap = []
+        self.lock = threading.Lock()
+        for key, entry in entries.items():
+            if entry.get("action") is not None and "next_at" in entry:
+                self.heap.append((entry["next_at"], key, entry["action"]))
+        heapq.heapify(self.heap)
+        retry_pending.set(len(self.entries))
+
+    def eligible(self, key, now=None):
+        """Whether `key` may be attempted now (True if it never failed)."""
+        entry = self.entries.get(key)
+        return entry is None or (now or time.time()) >= entry.get("next_at", 0)
+
+    def attempt(self, key, retry_intervals, action=None, now=None):
+        """
+        Record an attempt of `key` and schedule its next eligible time.
+
+        Args:
+            key (str): Service name or other retry key.
+            retry_intervals (list[int]): Cooldown in seconds per attempt count.
+            action: What to re-run once the key is due (an anchor label), or None
+                if the next regular pass is enough.
+
+        Returns:
+            float: Unix time the key becomes eligible again.
+        """
+        now = now or time.time()
+        with self.lock:
+            entry = self.entries.setdefault(key, {"failures": 0})
+            entry["failures"] += 1
+            delay = retry_intervals[min(entry["failures"], len(retry_intervals) - 1)]
+            entry["last_attempt"] = now
+            entry["next_at"] = now + delay * (1 + random.uniform(0, self.jitter))
+            entry["action"] = action
+            if action is not None:
+                heapq.heappush(self.heap, (entry["next_at"], key, action))
+            retry_pending.set(len(self.entries))
+        retry_attempts_total.inc()
+        return entry["next_at"]
+
+    def clear(self, key):
+        """Forget `key`'s failures, e.g. once its group has settled."""
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                retry_pending.set(len(self.entries))
+
+    def failures(self, key):
+        return self.entries.get(key, {}).get("failures", 0)
+
+    def _live(self, at, key):
+        entry = self.entries.get(key)
+        return entry is not None and entry.get("next_at") == at
+
+    def next_due(self):
+        """Unix time of the earliest scheduled retry, or None."""
+        with self.lock:
+            # Drop entries superseded by a later attempt or cleared keys.
+            while self.heap and not self._live(self.heap[0][0], self.heap[0][1]):
+                heapq.heappop(self.heap)
+            return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now=None):
+        """
+        Remove and return the actions of every retry that is due.
+
+        Returns:
+            list: Distinct actions (anchor labels), earliest first.
+        """
+        now = now or time.time()
+        actions = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                at, key, action = heapq.heappop(self.heap)
+                if self._live(at, key) and action not in actions:
+                    actions.append(action)
+        return actions
+
+    def requeue(self, action, delay=RETRY_REQUEUE_SECONDS, now=None):
+        """
+        Make the pending retries of `action` due again after `delay` seconds, for
+        actions that were popped but could not run (e.g. the runner was busy).
+        The failure counts are unchanged.
+        """
+        at = (now or time.time()) + delay
+        with self.lock:
+            for key, entry in self.entries.items():
+                if entry.get("action") == action:
+                    entry["next_at"] = at
+                    heapq.heappush(self.heap, (at, key, action))
+
+
+# Shared scheduler for all reconcile loops.
+retry_scheduler = RetryScheduler(state_store.namespace("retries"))
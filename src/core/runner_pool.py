@@ -0,0 +1,168 @@
+"""
+runner_pool.py
+- Execution layer for blocking runner work (label sync passes, bootstrap, GC, log rotation).
+- Jobs run on a bounded thread pool so the asyncio loop stays responsive.
+- Each job has a timeout; a runner whose previous job is still running is not
+  re-submitted, and jobs running longer than RUNNER_STUCK_AFTER are reported as stuck.
+- Tracks per-runner "last tick", "running for N seconds" and job durations in
+  the shared metrics registry.
+- Each job is one reconcile cycle of its runner; the Docker API calls it makes
+  are counted against it (see `docker_instrumentation`).
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from loguru import logger
+
+from core.metrics import registry
+from core.scheduler import scheduler, Job
+
+# --- Config via Environment Variables ---
+RUNNER_POOL_SIZE = int(os.getenv("RUNNER_POOL_SIZE", "8"))
+RUNNER_JOB_TIMEOUT = float(os.getenv("RUNNER_JOB_TIMEOUT", "600"))
+RUNNER_STUCK_AFTER = float(os.getenv("RUNNER_STUCK_AFTER", "900"))
+RUNNER_WATCHDOG_INTERVAL = 30
+
+# Name of the runner whose job is executing in the current context.
+current_runner = contextvars.ContextVar("current_runner", default="unknown")
+# Counters of the job executing in the current context ({"api_calls": n}), None outside jobs.
+current_cycle = contextvars.ContextVar("current_cycle", default=None)
+
+CYCLE_CALL_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# --- Metrics ---
+runner_last_tick = registry.gauge("runner_last_tick_timestamp_seconds", "Unix time the runner last finished a job", ["runner"])
+runner_running_seconds = registry.gauge("runner_running_seconds", "Seconds the runner's current job has been running (0 when idle)", ["runner"])
+runner_stuck = registry.gauge("runner_stuck", "1 if the runner's current job has exceeded RUNNER_STUCK_AFTER", ["runner"])
+runner_jobs_total = registry.counter("runner_jobs_total", "Jobs completed by the runner", ["runner"])
+runner_job_errors_total = registry.counter("runner_job_errors_total", "Jobs that raised an exception", ["runner"])
+runner_job_timeouts_total = registry.counter("runner_job_timeouts_total", "Jobs that exceeded their timeout", ["runner"])
+runner_jobs_skipped_total = registry.counter("runner_jobs_skipped_total", "Ticks skipped because the previous job was still running", ["runner"])
+runner_job_duration_seconds = registry.histogram("runner_job_duration_seconds", "Duration of runner jobs in seconds", ["runner"])
+runner_api_calls_per_cycle = registry.histogram(
+    "runner_docker_api_calls_per_cycle", "Docker API calls made by one runner job (one reconcile cycle)", ["runner"], buckets=CYCLE_CALL_BUCKETS
+)
+runner_api_calls_last_cycle = registry.gauge("runner_docker_api_calls_last_cycle", "Docker API calls made by the runner's last job", ["runner"])
+
+
+class RunnerPool:
+    """
+    Bounded worker pool that runs blocking runner jobs off the event loop.
+    """
+
+    def __init__(self, max_workers=RUNNER_POOL_SIZE):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="runner")
+        self.last_tick = {}      # runner -> wall-clock time the last job finished
+        self.started = {}        # runner -> monotonic start time of the job in flight
+        self.stuck_reported = set()
+        # Sampled at scrape time: these change with the clock, not with events.
+        runner_running_seconds.set_function(
+            lambda: {(r,): round(self.running_for(r), 3) for r in self.runners()}
+        )
+        runner_stuck.set_function(
+            lambda: {(r,): int(self.running_for(r) >= RUNNER_STUCK_AFTER) for r in self.runners()}
+        )
+
+    # --- Tracking ---
+
+    @contextmanager
+    def track(self, runner):
+        """Mark `runner` as busy for the duration of the block and record its tick."""
+        token = current_runner.set(runner)
+        cycle = {"api_calls": 0}
+        cycle_token = current_cycle.set(cycle)
+        started = self.started[runner] = time.monotonic()
+        try:
+            yield
+        except Exception:
+            runner_job_errors_total.inc(runner=runner)
+            raise
+        finally:
+            self.started.pop(runner, None)
+            self.stuck_reported.discard(runner)
+            self.last_tick[runner] = time.time()
+            runner_last_tick.set(self.last_tick[runner], runner=runner)
+            runner_jobs_total.inc(runner=runner)
+            runner_job_duration_seconds.observe(time.monotonic() - started, runner=runner)
+            runner_api_calls_per_cycle.observe(cycle["api_calls"], runner=runner)
+            runner_api_calls_last_cycle.set(cycle["api_calls"], runner=runner)
+            current_cycle.reset(cycle_token)
+            current_runner.reset(token)
+
+    def tracked(self, runner, fn):
+        """Wrap a sync callable so every call is tracked as a job of `runner`."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.track(runner):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def runners(self):
+        """Every runner seen so far."""
+        return sorted(set(self.last_tick) | set(self.started))
+
+    def is_running(self, runner):
+        return runner in self.started
+
+    def running_for(self, runner):
+        """Seconds the current job of `runner` has been running (0 if idle)."""
+        started = self.started.get(runner)
+        return time.monotonic() - started if started is not None else 0.0
+
+    # --- Execution ---
+
+    async def run(self, runner, fn, *args, timeout=RUNNER_JOB_TIMEOUT, **kwargs):
+        """
+        Run a blocking callable on the pool and await its result.
+
+        Args:
+            runner (str): Runner name used for metrics and overlap prevention.
+            fn (callable): Blocking function to execute.
+            timeout (float): Seconds to wait before giving up on the job.
+
+        Returns:
+            The callable's return value, or None if skipped, timed out or failed.
+        """
+        if self.is_running(runner):
+            runner_jobs_skipped_total.inc(runner=runner)
+            logger.warning(
+                f"[runner_pool] {runner} still running after {self.running_for(runner):.0f}s — skipping this tick."
+            )
+            return None
+
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, self.tracked(runner, fn), *args, **kwargs)
+        # Mark busy before the job starts so a queued job also blocks overlap.
+        self.started[runner] = time.monotonic()
+        future = loop.run_in_executor(self.executor, call)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            # Threads cannot be killed; the job keeps its slot until it returns.
+            runner_job_timeouts_total.inc(runner=runner)
+            logger.error(f"[runner_pool] {runner} job exceeded {timeout:.0f}s timeout; still running in background.")
+        except Exception as e:
+            logger.exception(f"[runner_pool] {runner} job failed: {e}")
+        return None
+
+    async def watchdog(self, interval=RUNNER_WATCHDOG_INTERVAL):
+        """Periodically report jobs that have been running longer than RUNNER_STUCK_AFTER."""
+        await scheduler.run_job(Job("runner_watchdog", self.check_stuck, every=interval))
+
+    async def check_stuck(self):
+        for runner in list(self.started):
+            running_for = self.running_for(runner)
+            if running_for >= RUNNER_STUCK_AFTER and runner not in self.stuck_reported:
+                self.stuck_reported.add(runner)
+                logger.error(f"[runner_pool] {runner} appears stuck (running for {running_for:.0f}s).")
+
+
+# Shared pool for all runners.
+runner_pool = RunnerPool()
@@ -0,0 +1,298 @@
+"""
+scheduler.py
+- One scheduler for every periodic job (GC, log rotation, autoheal, bootstrap,
+  mod refresh, cgroup sampling, ...), replacing a sleep loop per runner.
+- Jobs run on a 5-field cron expression (minute hour day-of-month month
+  day-of-week, with lists, ranges, steps, month/day names and @daily-style
+  macros) or a fixed interval, in container local time.
+- A single asyncio task keeps a heap of due times and sleeps until the earliest
+  one; nothing else wakes up while no job is due.
+- Per job:
+    - jitter: a random delay of up to `jitter` seconds on every run, so heavy
+      jobs on the same schedule (and on every node) do not start together
+    - overlap prevention: a run that is due while the previous one is still
+      going is skipped
+    - misfire policy for runs that start late (event loop blocked, host
+      suspended): COALESCE runs once for all missed slots, SKIP drops a run that
+      is more than `misfire_grace` seconds late
+- Per-job runs, failures, skips, durations, lag and next run time are exported
+  in the metrics registry.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from loguru import logger
+
+from core.metrics import registry
+
+COALESCE = "coalesce"
+SKIP = "skip"
+
+CRON_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+MONTH_NAMES = {name: i + 1 for i, name in enumerate(["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"])}
+WEEKDAY_NAMES = {name: i for i, name in enumerate(["sun", "mon", "tue", "wed", "thu", "fri", "sat"])}
+CRON_SEARCH_DAYS = 366 * 5  # give up on expressions that never match (e.g. 30 February)
+JOB_LAG_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+# --- Metrics ---
+job_runs_total = registry.counter("scheduler_job_runs_total", "Scheduled job runs started", ["job"])
+job_failures_total = registry.counter("scheduler_job_failures_total", "Scheduled job runs that raised an exception", ["job"])
+job_skipped_total = registry.counter("scheduler_job_skipped_total", "Scheduled runs not started (overlap: previous run still going, misfire: too late)", ["job", "reason"])
+job_duration_seconds = registry.histogram("scheduler_job_duration_seconds", "Duration of scheduled job runs", ["job"])
+job_lag_seconds = registry.histogram("scheduler_job_lag_seconds", "Seconds a run started after its due time (jitter included)", ["job"], buckets=JOB_LAG_BUCKETS)
+job_last_run = registry.gauge("scheduler_job_last_run_timestamp_seconds", "Unix time the job last started", ["job"])
+job_next_run = registry.gauge("scheduler_job_next_run_timestamp_seconds", "Unix time of the job's next scheduled run", ["job"])
+
+
+def _parse_field(text, low, high, names=None):
+    values = set()
+    for part in text.lower().split(","):
+        step = None
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"step must be positive in {text!r}")
+
+        def value(token):
+            return names[token] if names and token in names else int(token)
+
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (value(token) for token in part.split("-", 1))
+        else:
+            start = value(part)
+            end = high if step else start  # "5/15" means from 5 every 15
+        if not low <= start <= end <= high:
+            raise ValueError(f"{text!r} is outside {low}-{high}")
+        values.update(range(start, end + 1, step or 1))
+    return frozenset(values)
+
+
+class CronExpression:
+    """
+    A parsed 5-field cron expression.
+
+    Like Vixie cron, when both day-of-month and day-of-week are restricted a
+    day matches if either field does.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = CRON_MACROS.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields, got {expression!r}")
+        minute, hour, day, month, weekday = fields
+        self.minutes = _parse_field(minute, 0, 59)
+        self.hours = _parse_field(hour, 0, 23)
+        self.days = _parse_field(day, 1, 31)
+        self.months = _parse_field(month, 1, 12, MONTH_NAMES)
+        self.weekdays = frozenset(d % 7 for d in _parse_field(weekday, 0, 7, WEEKDAY_NAMES))  # 7 is Sunday too
+        self.any_day = day.startswith("*")
+        self.any_weekday = weekday.startswith("*")
+
+    def _day_matches(self, dt):
+        in_days = dt.day in self.days
+        in_weekdays = dt.isoweekday() % 7 in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return in_weekdays
+        if self.any_weekday:
+            return in_days
+        return in_days or in_weekdays
+
+    def next_after(self, timestamp):
+        """
+        First matching minute strictly after `timestamp`.
+
+        Returns:
+            float: Unix timestamp.
+        """
+        dt = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=CRON_SEARCH_DAYS)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = dt.replace(year=dt.year + dt.month // 12, month=dt.month % 12 + 1, day=1, hour=0, minute=0)
+            elif not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+        raise ValueError(f"cron expression {self.expression!r} never matches")
+
+    def __repr__(self):
+        return f"CronExpression({self.expression!r})"
+
+
+class Job:
+    """
+    A periodic async callable and its schedule.
+    """
+
+    def __init__(self, name, fn, cron=None, every=None, jitter=0, misfire=COALESCE, misfire_grace=60, run_at_start=None):
+        """
+        Args:
+            name (str): Job name used in logs and metric labels.
+            fn (callable): Coroutine function taking no arguments. Blocking work
+                should go through `runner_pool.run`.
+            cron (str): 5-field cron expression (or macro) for the run times.
+            every (float): Interval in seconds, as an alternative to `cron`.
+            jitter (float): Random extra delay of up to this many seconds per run.
+            misfire (str): COALESCE or SKIP for runs that start late.
+            misfire_grace (float): Seconds a run may be late before SKIP drops it.
+            run_at_start (bool): Run as soon as the job is added. Defaults to True
+                for interval jobs and False for cron jobs.
+        """
+        if (cron is None) == (every is None):
+            raise ValueError(f"job {name} needs exactly one of cron or every")
+        if misfire not in (COALESCE, SKIP):
+            raise ValueError(f"job {name}: unknown misfire policy {misfire!r}")
+        self.name = name
+        self.fn = fn
+        self.cron = CronExpression(cron) if cron is not None else None
+        self.every = every
+        self.jitter = jitter
+        self.misfire = misfire
+        self.misfire_grace = misfire_grace
+        self.run_at_start = every is not None if run_at_start is None else run_at_start
+        self.scheduled_at = None  # slot time of the pending run, without jitter
+        self.task = None          # asyncio.Task of the run in flight
+        self.removed = False
+
+    def following(self, after):
+        """Slot time of the first run after `after`."""
+        if self.cron is not None:
+            return self.cron.next_after(after)
+        return after + self.every
+
+    def describe(self):
+        return self.cron.expression if self.cron is not None else f"every {self.every:g}s"
+
+
+class Scheduler:
+    """
+    Heap of job due times driven by one asyncio task.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.heap = []  # (due time incl. jitter, sequence, slot time, job)
+        self.sequence = itertools.count()
+        self.wakeup = asyncio.Event()
+
+    def _push(self, job, slot):
+        job.scheduled_at = slot
+        due = slot + random.uniform(0, job.jitter) if job.jitter else slot
+        heapq.heappush(self.heap, (due, next(self.sequence), slot, job))
+        job_next_run.set(due, job=job.name)
+
+    def add(self, job):
+        """Schedule `job`; a job with the same name is replaced."""
+        if job.name in self.jobs:
+            self.remove(self.jobs[job.name])
+        self.jobs[job.name] = job
+        now = time.time()
+        self._push(job, now if job.run_at_start else job.following(now))
+        logger.info(f"[scheduler] Scheduled {job.name} ({job.describe()}, jitter {job.jitter:g}s).")
+        self.wakeup.set()
+        return job
+
+    def remove(self, job):
+        """Unschedule `job`; a run in flight is left to finish."""
+        job.removed = True
+        if self.jobs.get(job.name) is job:
+            del self.jobs[job.name]
+        job_next_run.remove(job=job.name)
+
+    async def run_job(self, job):
+        """
+        Keep `job` scheduled for as long as the calling task lives.
+
+        Used by runners that are started and cancelled as a unit (e.g. the
+        leader-only runners); cancelling the caller unschedules the job and
+        cancels its run in flight.
+        """
+        self.add(job)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.remove(job)
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+
+    async def _execute(self, job):
+        started = time.monotonic()
+        try:
+            await job.fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            job_failures_total.inc(job=job.name)
+            logger.exception(f"[scheduler] Job {job.name} failed")
+        finally:
+            job_duration_seconds.observe(time.monotonic() - started, job=job.name)
+
+    def _fire(self, job, due, now):
+        lateness = now - due
+        if job.misfire == SKIP and lateness > job.misfire_grace:
+            job_skipped_total.inc(job=job.name, reason="misfire")
+            logger.warning(f"[scheduler] Skipping {job.name}: {lateness:.0f}s late (misfire grace {job.misfire_grace:g}s).")
+            return
+        if job.task is not None and not job.task.done():
+            job_skipped_total.inc(job=job.name, reason="overlap")
+            logger.warning(f"[scheduler] Skipping {job.name}: previous run still in progress.")
+            return
+        job_runs_total.inc(job=job.name)
+        job_last_run.set(now, job=job.name)
+        job_lag_seconds.observe(max(lateness, 0), job=job.name)
+        job.task = asyncio.create_task(self._execute(job), name=f"job:{job.name}")
+
+    def _reschedule(self, job, slot, now):
+        slot = job.following(slot)
+        missed = 0
+        while slot <= now:
+            # Missed slots are coalesced into the run that just fired (or was skipped).
+            slot = job.following(slot)
+            missed += 1
+        if missed:
+            job_skipped_total.inc(missed, job=job.name, reason="misfire")
+        self._push(job, slot)
+
+    async def run(self):
+        """Fire due jobs forever."""
+        while True:
+            now = time.time()
+            while self.heap and self.heap[0][0] <= now:
+                due, _, slot, job = heapq.heappop(self.heap)
+                if job.removed or job.scheduled_at != slot:
+                    continue
+                self._fire(job, due, now)
+                self._reschedule(job, slot, now)
+
+            self.wakeup.clear()
+            timeout = self.heap[0][0] - time.time() if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Shared scheduler for all periodic jobs; its run() task is started by main.
+scheduler = Scheduler()
@@ -0,0 +1,192 @@
+"""
+sharding.py
+- Opt-in sharding of orchestration work across manager instances (SHARDING=true).
+- Every live manager (ready, reachable, not drained) that runs a running orcastra
+  task is placed on a consistent-hash ring with SHARD_VNODES virtual points; each
+  work key (an anchor group, a service) belongs to the first member clockwise of
+  its hash. A healthy manager whose orcastra task crashed or was rescheduled is
+  not a member, so its keys move to instances that are actually running.
+- The orcastra service is SHARD_SERVICE, or detected from this container's Swarm
+  labels. Outside a Swarm task, membership falls back to live managers.
+- Each orcastra instance refreshes the membership every SHARD_REFRESH_INTERVAL
+  seconds from the shared cluster snapshot and acts only on the keys it owns.
+  When a member drops, only its keys move, spread over the remaining members;
+  listeners are notified so they can pick up newly owned work right away.
+- With sharding disabled every instance owns every key, and the leader-only
+  runners keep the single-leader behaviour.
+"""
+
+import hashlib
+import os
+import socket
+from bisect import bisect_right
+from loguru import logger
+
+from core.async_docker import async_client
+from core.cluster_snapshot import get_snapshot_async
+from core.metrics import registry
+from core.scheduler import scheduler, Job
+
+# --- Config via Environment Variables ---
+SHARDING = os.getenv("SHARDING", "false").lower() == "true"
+SHARD_REFRESH_INTERVAL = float(os.getenv("SHARD_REFRESH_INTERVAL", "10"))
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "128"))
+SHARD_SERVICE = os.getenv("SHARD_SERVICE", "")  # orcastra's own Swarm service; detected from container labels if empty
+SERVICE_LABEL = "com.docker.swarm.service.name"
+SHARD_MAX_FAILURES = 3  # consecutive failed refreshes before this instance gives up its keys
+
+# --- Metrics ---
+shard_members = registry.gauge("shard_members", "Live orcastra instances on the sharding ring")
+shard_membership_changes_total = registry.counter("shard_membership_changes_total", "Sharding ring rebuilds after the set of live instances changed")
+shard_refresh_failures_total = registry.counter("shard_refresh_failures_total", "Sharding ring refreshes that failed to reach the Docker API")
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+def is_live_manager(node):
+    """Whether a node from `GET /nodes` is a manager that can run its orcastra instance."""
+    return (
+        node.get("Spec", {}).get("Role") == "manager"
+        and node.get("Spec", {}).get("Availability", "active") != "drain"
+        and node.get("Status", {}).get("State") == "ready"
+        and (node.get("ManagerStatus") or {}).get("Reachability") == "reachable"
+    )
+
+
+def live_members(nodes, tasks):
+    """
+    Node IDs that run a live orcastra instance.
+
+    Args:
+        nodes (list[dict]): Raw node dicts (`GET /nodes`).
+        tasks (list[dict]): Raw task dicts of the orcastra service.
+
+    Returns:
+        list[str]: Sorted IDs of live managers with a running orcastra task.
+    """
+    running = {
+        task.get("NodeID") for task in tasks
+        if task.get("DesiredState") == "running" and task.get("Status", {}).get("State") == "running"
+    }
+    return sorted(node["ID"] for node in nodes if node["ID"] in running and is_live_manager(node))
+
+
+class HashRing:
+    """
+    Consistent-hash ring over a set of member IDs.
+    """
+
+    def __init__(self, members=(), vnodes=SHARD_VNODES):
+        points = sorted((_hash(f"{member}#{i}"), member) for member in members for i in range(vnodes))
+        self.members = frozenset(members)
+        self.hashes = [h for h, _ in points]
+        self.owners = [member for _, member in points]
+
+    def owner(self, key):
+        """Member owning `key`, or None on an empty ring."""
+        if not self.hashes:
+            return None
+        return self.owners[bisect_right(self.hashes, _hash(key)) % len(self.hashes)]
+
+
+class ShardMap:
+    """
+    This instance's view of the sharding ring.
+    """
+
+    def __init__(self, enabled=SHARDING, interval=SHARD_REFRESH_INTERVAL):
+        self.enabled = enabled
+        self.interval = interval
+        self.node_id = None
+        self.service = SHARD_SERVICE or None
+        self.service_checked = bool(SHARD_SERVICE)
+        self.ring = HashRing()
+        self.failures = 0
+        self.listeners = []
+
+    def owner(self, key):
+        return self.ring.owner(key)
+
+    def owns(self, key):
+        """Whether this instance acts on `key`. Always True with sharding disabled."""
+        if not self.enabled:
+            return True
+        return self.node_id is not None and self.ring.owner(key) == self.node_id
+
+    def select(self, mapping):
+        """The entries of `mapping` whose key this instance owns."""
+        if not self.enabled:
+            return mapping
+        return {key: value for key, value in mapping.items() if self.owns(key)}
+
+    def subscribe(self, callback):
+        """Call `callback()` after every ring change (from the event loop thread)."""
+        self.listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def _rebuild(self, members):
+        if set(members) == self.ring.members:
+            return
+        self.ring = HashRing(members)
+        shard_members.set(len(members))
+        shard_membership_changes_total.inc()
+        logger.info(f"[sharding] Ring rebuilt with {len(members)} instance(s); this node {'is' if self.node_id in members else 'is not'} a member.")
+        for callback in list(self.listeners):
+            try:
+                callback()
+            except Exception:
+                logger.exception("[sharding] Ring change listener failed")
+
+    async def own_service(self):
+        """Name of the Swarm service this instance runs in (None outside a Swarm task)."""
+        if not self.service_checked:
+            self.service_checked = True
+            try:
+                container = await async_client.request("GET", f"/containers/{socket.gethostname()}/json")
+                self.service = ((container.get("Config") or {}).get("Labels") or {}).get(SERVICE_LABEL)
+            except Exception as e:
+                logger.debug(f"[sharding] Could not inspect this container: {e}")
+            if self.service:
+                logger.info(f"[sharding] Ring members are the nodes running a task of {self.service}.")
+            else:
+                logger.warning("[sharding] Not running as a Swarm task and SHARD_SERVICE is unset; every live manager is a ring member.")
+        return self.service
+
+    async def refresh(self):
+        """Rebuild the ring if the set of live orcastra instances changed."""
+        try:
+            swarm = (await async_client.info()).get("Swarm", {})
+            members = []
+            if swarm.get("ControlAvailable"):
+                snapshot = await get_snapshot_async(max_age=self.interval)
+                nodes = [node.attrs for node in snapshot.nodes]
+                service = await self.own_service()
+                if service:
+                    members = live_members(nodes, snapshot.tasks(service))
+                else:
+                    members = sorted(node["ID"] for node in nodes if is_live_manager(node))
+        except Exception as e:
+            self.failures += 1
+            shard_refresh_failures_total.inc()
+            logger.warning(f"[sharding] Ring refresh failed ({self.failures}/{SHARD_MAX_FAILURES}): {e}")
+            if self.failures >= SHARD_MAX_FAILURES:
+                # Likely cut off from the managers' quorum; the others take over our keys.
+                self._rebuild([])
+            return
+
+        self.failures = 0
+        self.node_id = swarm.get("NodeID")
+        self._rebuild(members)
+
+    async def run(self):
+        """Keep the ring current forever."""
+        await scheduler.run_job(Job("sharding", self.refresh, every=self.interval))
+
+
+# Shared ring view for all runners.
+shard_map = ShardMap()
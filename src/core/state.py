@@ -1,37 +1,235 @@
 """
 state.py
-- Loads and saves persistent rebalance state to disk for long-term tracking.
-- Stores metadata such as:
-    - first_detected: When imbalance was first detected
-    - last_moved: Timestamp of last service movement
-    - moved_to: Target node ID or hostname
+- One durable store for the runtime state that has to survive a restart, split
+  into namespaces (each a plain dict owned by one runner):
+    - rebalance: per-service rebalance state (last_moved, moved_to, cooldown
+      phase, temporary placement constraints)
+    - retries: retry backoff and pending retries (`core.retry_scheduler`)
+    - mismatches: when a dependent was first seen away from its anchor
+    - missing_anchors: when an anchor was first seen missing
+    - debounce: last trigger time per watched config file
+- `flush()` appends only the keys whose value changed since the last flush to a
+  write-ahead journal (one JSON line per key, fsynced), so unchanged state
+  costs no I/O. Once the journal holds STATE_COMPACT_ENTRIES entries it is
+  folded into a snapshot that is written to a temp file and atomically renamed.
+- On startup the snapshot is loaded and the journal replayed on top of it; a
+  torn last line from a crash is skipped. The old rebalance_state.json is
+  imported once if no snapshot exists yet.
 
-Used by rebalance orchestrator to apply cooldowns and avoid flapping.
+Used by rebalance, label sync and the config watcher to keep cooldowns,
+mismatch timers and rebalance history across container restarts.
 """
 
 import json
+import os
+import threading
 from pathlib import Path
-from core.config import REBALANCE_STATE_PATH
+from loguru import logger
+
+from core.config import STATE_DIR, REBALANCE_STATE_PATH
+from core.metrics import registry
+
+STATE_COMPACT_ENTRIES = int(os.getenv("STATE_COMPACT_ENTRIES", "1000"))
+
+# --- Metrics ---
+state_journal_entries_total = registry.counter("state_journal_entries_total", "State changes appended to the journal", ["namespace"])
+state_compactions_total = registry.counter("state_compactions_total", "Journal compactions into a new state snapshot")
+state_flush_duration_seconds = registry.histogram("state_flush_duration_seconds", "Duration of state flushes that wrote to disk")
+
+
+def _encode(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class StateStore:
+    """
+    Namespaced runtime state backed by a snapshot file and an append-only journal.
+    """
+
+    def __init__(self, directory=STATE_DIR, compact_entries=STATE_COMPACT_ENTRIES):
+        self.directory = Path(directory)
+        self.snapshot_path = self.directory / "state.json"
+        self.journal_path = self.directory / "state.journal"
+        self.compact_entries = compact_entries
+        self.data = {}        # namespace -> live dict handed to its runner
+        self.persisted = {}   # namespace -> {key: encoded value as last written}
+        self.journal_entries = 0
+        self.loaded = False
+        self.lock = threading.RLock()
+
+    # --- Loading ---
+
+    def load(self):
+        """Load the snapshot and replay the journal. Called lazily on first use."""
+        with self.lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            if self.snapshot_path.exists():
+                try:
+                    with open(self.snapshot_path) as f:
+                        snapshot = json.load(f)
+                    for name, entries in snapshot.items():
+                        self.data[name] = dict(entries)
+                except (OSError, ValueError) as e:
+                    logger.error(f"[state] Unreadable snapshot {self.snapshot_path}, starting from the journal only: {e}")
+            elif Path(REBALANCE_STATE_PATH).exists():
+                self._import_legacy()
+
+            replayed, torn = self._replay()
+            for name, entries in self.data.items():
+                self.persisted[name] = {key: _encode(value) for key, value in entries.items()}
+            if torn:
+                # Appending after a torn line would corrupt the next entry; start a clean journal.
+                self.compact()
+            if replayed:
+                logger.info(f"[state] Restored runtime state ({replayed} journal entries replayed).")
+
+    def _import_legacy(self):
+        try:
+            with open(REBALANCE_STATE_PATH) as f:
+                self.data["rebalance"] = json.load(f)
+            logger.info(f"[state] Imported rebalance state from {REBALANCE_STATE_PATH}.")
+            self.compact(force=True)  # becomes the first snapshot
+        except (OSError, ValueError) as e:
+            logger.error(f"[state] Could not import {REBALANCE_STATE_PATH}: {e}")
+
+    def _replay(self):
+        if not self.journal_path.exists():
+            return 0, False
+        replayed, torn = 0, False
+        with open(self.journal_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("[state] Skipping torn journal entry (interrupted write).")
+                    torn = True
+                    continue
+                entries = self.data.setdefault(entry["ns"], {})
+                if entry.get("deleted"):
+                    entries.pop(entry["key"], None)
+                else:
+                    entries[entry["key"]] = entry["value"]
+                replayed += 1
+        self.journal_entries = replayed
+        return replayed, torn
+
+    def namespace(self, name):
+        """
+        The live dict of a namespace; mutate it in place and call `flush(name)`.
+
+        Returns:
+            dict: Restored contents, or an empty dict for a new namespace.
+        """
+        self.load()
+        with self.lock:
+            return self.data.setdefault(name, {})
+
+    # --- Writing ---
+
+    def _changes(self, name):
+        entries = self.data.get(name, {})
+        persisted = self.persisted.setdefault(name, {})
+        changes = []
+        for key, value in list(entries.items()):
+            encoded = _encode(value)
+            if persisted.get(key) != encoded:
+                changes.append((key, encoded))
+        for key in [key for key in persisted if key not in entries]:
+            changes.append((key, None))
+        return changes
+
+    def flush(self, *names):
+        """
+        Journal the keys of `names` (default: every namespace) that changed since
+        the last flush. Only call it for namespaces owned by the calling thread.
+
+        Returns:
+            int: Number of journal entries written (0 means no I/O).
+        """
+        self.load()
+        with self.lock:
+            changes = [(name, key, encoded) for name in names or list(self.data) for key, encoded in self._changes(name)]
+            if not changes:
+                return 0
+            lines = [
+                f'{{"ns":{json.dumps(name)},"key":{json.dumps(key)},"deleted":true}}\n' if encoded is None
+                else f'{{"ns":{json.dumps(name)},"key":{json.dumps(key)},"value":{encoded}}}\n'
+                for name, key, encoded in changes
+            ]
+
+            with state_flush_duration_seconds.time():
+                self.directory.mkdir(parents=True, exist_ok=True)
+                with open(self.journal_path, "a") as f:
+                    f.write("".join(lines))
+                    f.flush()
+                    os.fsync(f.fileno())
+                # Only what reached the disk counts as persisted; a failed write is retried next flush.
+                for name, key, encoded in changes:
+                    if encoded is None:
+                        self.persisted[name].pop(key, None)
+                    else:
+                        self.persisted[name][key] = encoded
+                    state_journal_entries_total.inc(namespace=name)
+                self.journal_entries += len(lines)
+                if self.journal_entries >= self.compact_entries:
+                    self.compact()
+            return len(lines)
+
+    def compact(self, force=False):
+        """
+        Fold the journal into a new snapshot (temp file + fsync + atomic rename)
+        and start an empty journal. Built from the last written values, so it
+        never reads a namespace another thread is mutating.
+        """
+        with self.lock:
+            if force:
+                for name in self.data:
+                    self.persisted[name] = {key: _encode(value) for key, value in self.data[name].items()}
+            body = ",".join(
+                json.dumps(name) + ":{" + ",".join(f"{json.dumps(key)}:{encoded}" for key, encoded in entries.items()) + "}"
+                for name, entries in self.persisted.items()
+            )
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.snapshot_path.with_suffix(".json.tmp")
+            with open(tmp_path, "w") as f:
+                f.write("{" + body + "}")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            # The journal is only emptied once the snapshot that covers it is in place.
+            with open(self.journal_path, "w") as f:
+                os.fsync(f.fileno())
+            dir_fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+            self.journal_entries = 0
+            state_compactions_total.inc()
+
+
+# --- Rebalance State ---
 
 def load_state():
     """
-    Load rebalance state from disk (JSON file).
-    
+    Rebalance state, restored from the state store.
+
     Returns:
-        dict: Parsed state dictionary, or {} if no file exists.
+        dict: Live service -> state dict (the store's `rebalance` namespace).
     """
-    if Path(REBALANCE_STATE_PATH).exists():
-        with open(REBALANCE_STATE_PATH, "r") as f:
-            return json.load(f)
-    return {}
+    return state_store.namespace("rebalance")
 
 def save_state(state):
     """
-    Save rebalance state to disk as formatted JSON.
-    
+    Persist the rebalance state changes since the last save (no I/O if unchanged).
+
     Args:
-        state (dict): The current rebalance state to persist.
+        state (dict): The dict returned by `load_state()`.
     """
-    Path(REBALANCE_STATE_PATH).parent.mkdir(parents=True, exist_ok=True)
-    with open(REBALANCE_STATE_PATH, "w") as f:
-        json.dump(state, f, indent=2)
+    state_store.flush("rebalance")
+
+
+# Shared store for all runners.
+state_store = StateStore()
@@ -9,7 +9,8 @@ Used by bootstrap_runner.py to apply label consistency on Swarm startup or rebal
 
 import yaml
 from loguru import logger
-from lib.common.ssh_helpers import ssh
+from lib.common.ssh_helpers import ssh, ssh_many
+from lib.bootstrap.bootstrap_tasks import fan_out
 
 def sync_labels(advertise, nodes, node_map, prune=False, dry_run=False, debug=False):
     """
@@ -25,16 +26,24 @@ def sync_labels(advertise, nodes, node_map, prune=False, dry_run=False, debug=Fa
     """
     logger.info("[labels] Starting bootstrap-time label reconciliation...")
 
-    for name, meta in nodes.items():
+    known = [name for name in nodes if name in node_map]
+    for name in nodes:
         if name not in node_map:
             logger.warning(f"[labels] Skipping {name}: not found in node_map.")
-            continue
 
-        labels = set(meta.get("labels", []))
+    # Inspect every node's labels in one SSH session on the leader.
+    inspect_cmds = [f"docker node inspect {name} --format '{{{{json .Spec.Labels}}}}'" for name in known]
+    inspections = ssh_many(advertise, inspect_cmds, debug=debug)
+    pending = {}  # node name -> (labels to add, labels to remove)
+
+    for name, result in zip(known, inspections):
+        labels = set(nodes[name].get("labels", []))
         logger.debug(f"[labels] Desired labels for {name}: {sorted(labels)}")
 
-        cmd = f"docker node inspect {name} --format '{{{{json .Spec.Labels}}}}'"
-        result = ssh(advertise, cmd, debug=debug)
+        if result.returncode != 0:
+            logger.warning(f"[labels] Could not inspect {name} (exit {result.returncode}), skipping.")
+            continue
+
         current = result.stdout.strip()
 
         try:
@@ -46,22 +55,34 @@ def sync_labels(advertise, nodes, node_map, prune=False, dry_run=False, debug=Fa
         logger.debug(f"[labels] Current labels on {name}: {current_labels}")
 
         # Add missing or incorrect labels
-        for label in labels:
-            if current_labels.get(label) != "true":
-                if dry_run:
-                    logger.info(f"[labels] (Dry Run) Would add {label}=true to {name}")
-                else:
-                    ssh(advertise, f"docker node update --label-add {label}=true {name}", debug=debug)
-                    logger.info(f"[labels] Added {label}=true to {name}")
+        to_add = sorted(label for label in labels if current_labels.get(label) != "true")
 
         # Optionally remove extra labels
+        to_remove = []
         if prune:
-            for label in current_labels:
-                if label not in labels and label != name:
-                    if dry_run:
-                        logger.info(f"[labels] (Dry Run) Would remove label {label} from {name}")
-                    else:
-                        ssh(advertise, f"docker node update --label-rm {label} {name}", debug=debug)
-                        logger.info(f"[labels] Removed label {label} from {name}")
+            to_remove = sorted(label for label in current_labels if label not in labels and label != name)
+
+        if not to_add and not to_remove:
+            continue
+
+        pending[name] = (to_add, to_remove)
+
+    def apply(name):
+        to_add, to_remove = pending[name]
+        if dry_run:
+            for label in to_add:
+                logger.info(f"[labels] (Dry Run) Would add {label}=true to {name}")
+            for label in to_remove:
+                logger.info(f"[labels] (Dry Run) Would remove label {label} from {name}")
+            return
+
+        # One `docker node update` per node carrying every label change.
+        flags = " ".join([f"--label-add {label}=true" for label in to_add] + [f"--label-rm {label}" for label in to_remove])
+        ssh(advertise, f"docker node update {flags} {name}", debug=debug)
+        for label in to_add:
+            logger.info(f"[labels] Added {label}=true to {name}")
+        for label in to_remove:
+            logger.info(f"[labels] Removed label {label} from {name}")
 
+    fan_out("labels", apply, list(pending))
     logger.info("[labels] Label reconciliation complete.")
@@ -2,10 +2,51 @@
 bootstrap_tasks.py
 - Wraps Swarm init/join logic and remote commands used during cluster bootstrapping.
 - Uses SSH to communicate with nodes and the leader directly.
+- Provides `fan_out` to run one bootstrap phase across nodes concurrently.
+  Phases that target one host from many workers (e.g. promotions run on the
+  leader) stay within sshd's session limit through SSHPool's per-host cap.
 """
 
+import contextvars
+import os
 import yaml
-from lib.common.ssh_helpers import ssh, is_online
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from lib.common.ssh_helpers import ssh
+
+BOOTSTRAP_CONCURRENCY = int(os.getenv("BOOTSTRAP_CONCURRENCY", "8"))
+
+def fan_out(phase, fn, items, concurrency=BOOTSTRAP_CONCURRENCY):
+    """
+    Run `fn(item)` for every item concurrently and wait for all of them.
+
+    Acts as a barrier between bootstrap phases: nothing from the next phase
+    starts until every item of this one has finished.
+
+    Args:
+        phase (str): Phase name, used for thread names and logging.
+        fn (callable): Function applied to each item.
+        items (iterable): Items (node names, IPs, ...) to process.
+        concurrency (int): Maximum number of items processed at once.
+
+    Returns:
+        dict: item -> fn(item) result, or None if it raised.
+    """
+    items = list(items)
+    if not items:
+        return {}
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items))), thread_name_prefix=f"bootstrap-{phase}") as executor:
+        # Each worker runs in a copy of the caller's context so its API calls count towards the bootstrap runner.
+        futures = {item: executor.submit(contextvars.copy_context().run, fn, item) for item in items}
+        for item, future in futures.items():
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                logger.error(f"[bootstrap] Phase '{phase}' failed for {item}: {e}")
+                results[item] = None
+    return results
 
 def check_swarm(advertise, debug=False):
     """
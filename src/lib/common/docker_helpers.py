@@ -7,7 +7,7 @@ docker_helpers.py
 import subprocess
 import logging
 import time
-from core.docker_client import client
+from core.cluster_snapshot import get_snapshot
 
 
 def get_docker_node_memory(node_name):
@@ -38,13 +38,11 @@ def get_task_state(service_name, wait_timeout=5, debug=False):
 
     while time.time() < deadline:
         try:
-            service = client.services.get(service_name)
-            tasks = service.tasks()
+            most_recent = get_snapshot().latest_task(service_name)
 
-            if not tasks:
+            if most_recent is None:
                 return None, None
 
-            most_recent = sorted(tasks, key=lambda t: t.get("Status", {}).get("Timestamp", ""))[-1]
             status = most_recent.get("Status", {})
             state = status.get("State")
             desired = most_recent.get("DesiredState")
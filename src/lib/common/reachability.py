@@ -0,0 +1,133 @@
+"""
+reachability.py
+- Node reachability service based on async TCP connects instead of ping.
+- Probes only the ports orcastra actually needs (22 for SSH, 2377 for Swarm
+  management) and caches results for REACHABILITY_TTL seconds.
+- Tracks per-node up/down transitions so bootstrap and node-health logic can
+  read current state without forking processes or needing ICMP privileges.
+"""
+
+import asyncio
+import os
+import time
+from loguru import logger
+
+from core.metrics import registry
+
+# --- Config via Environment Variables ---
+SSH_PORT = 22
+SWARM_PORT = 2377
+REACHABILITY_PORTS = [int(p) for p in os.getenv("REACHABILITY_PORTS", f"{SSH_PORT},{SWARM_PORT}").split(",") if p.strip()]
+REACHABILITY_TTL = float(os.getenv("REACHABILITY_TTL", "15"))
+REACHABILITY_TIMEOUT = float(os.getenv("REACHABILITY_TIMEOUT", "1"))
+
+# --- Metrics ---
+node_reachable = registry.gauge("node_reachable", "1 if the node accepted a TCP connection on a probed port", ["host"])
+node_reachability_transitions_total = registry.counter("node_reachability_transitions_total", "Up/down transitions observed per node", ["host"])
+node_reachability_last_change = registry.gauge(
+    "node_reachability_last_change_timestamp_seconds", "Unix time of the node's last up/down transition", ["host"]
+)
+
+
+class ReachabilityProber:
+    """
+    Cached TCP reachability prober with per-host transition tracking.
+
+    A host is considered up when at least one probed port accepts a connection;
+    per-port results are kept so callers can ask about SSH or Swarm specifically.
+    """
+
+    def __init__(self, ports=REACHABILITY_PORTS, ttl=REACHABILITY_TTL, timeout=REACHABILITY_TIMEOUT):
+        self.ports = list(ports)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.ports_up = {}       # host -> {port: bool}
+        self.checked_at = {}     # host -> monotonic time of last probe
+        self.up = {}             # host -> bool
+
+    async def _probe_port(self, host, port):
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+        return True
+
+    def is_fresh(self, host):
+        return host in self.checked_at and time.monotonic() - self.checked_at[host] < self.ttl
+
+    def _record(self, host, ports_up):
+        up = any(ports_up.values())
+        previous = self.up.get(host)
+        self.ports_up[host] = ports_up
+        self.checked_at[host] = time.monotonic()
+        self.up[host] = up
+        node_reachable.set(int(up), host=host)
+
+        if previous is not None and previous != up:
+            node_reachability_transitions_total.inc(host=host)
+            node_reachability_last_change.set(time.time(), host=host)
+            logger.info(f"[reachability] {host} is now {'UP' if up else 'DOWN'}.")
+        elif previous is None:
+            node_reachability_transitions_total.inc(0, host=host)
+            node_reachability_last_change.set(time.time(), host=host)
+
+    async def probe(self, host, force=False):
+        """
+        Probe a host (or return the cached result while fresh).
+
+        Returns:
+            bool: True if any probed port accepted a connection.
+        """
+        if not force and self.is_fresh(host):
+            return self.up[host]
+
+        results = await asyncio.gather(*(self._probe_port(host, port) for port in self.ports))
+        self._record(host, dict(zip(self.ports, results)))
+        return self.up[host]
+
+    async def probe_many(self, hosts, force=False):
+        """
+        Probe several hosts concurrently.
+
+        Returns:
+            dict[str, bool]: host -> up.
+        """
+        hosts = list(dict.fromkeys(hosts))
+        results = await asyncio.gather(*(self.probe(host, force=force) for host in hosts))
+        return dict(zip(hosts, results))
+
+    def is_up(self, host, port=None):
+        """
+        Read the cached state without probing.
+
+        Returns:
+            bool or None: Cached state of the host (or one of its ports), None if never probed.
+        """
+        if host not in self.up:
+            return None
+        if port is None:
+            return self.up[host]
+        return self.ports_up[host].get(port)
+
+    def check(self, host, port=None):
+        """
+        Blocking variant for worker threads: probe if stale, then return the cached state.
+        On a thread that is running an event loop it cannot probe and returns the cached state.
+        """
+        if not self.is_fresh(host):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                asyncio.run(self.probe(host))
+            else:
+                logger.debug(f"[reachability] check({host}) called from the event loop; using the cached state.")
+        return bool(self.is_up(host, port))
+
+
+# Shared prober for bootstrap and node-health logic.
+prober = ReachabilityProber()
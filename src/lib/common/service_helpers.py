@@ -3,15 +3,15 @@ service_helpers.py
 - Contains logic for:
     - Determining which node a service is running on
     - Forcibly triggering rolling updates via SDK or CLI fallback
-- Handles retry tracking when updates fail.
+- Never retries or sleeps on failure; callers schedule retries through
+  `core.retry_scheduler`.
 """
 
 import subprocess
 import time
 from loguru import logger
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from docker.errors import APIError
-from core.retry_state import retry_state
+from core.cluster_snapshot import get_snapshot, invalidate
 
 
 def get_service_node(client, service_name, wait_timeout=5):
@@ -27,11 +27,14 @@ def get_service_node(client, service_name, wait_timeout=5):
         str or None: Node ID where the service is running
     """
     try:
-        service = client.services.get(service_name)
         deadline = time.time() + wait_timeout
+        snapshot = get_snapshot()
+        if snapshot.service(service_name) is None:
+            logger.warning(f"⚠️ Could not inspect service: {service_name} — not found")
+            return None
+        tasks = snapshot.tasks(service_name)
 
-        while time.time() < deadline:
-            tasks = service.tasks()
+        while True:
             for task in tasks:
                 status = task.get("Status", {})
                 state = status.get("State")
@@ -43,7 +46,11 @@ def get_service_node(client, service_name, wait_timeout=5):
                 if state == "starting" and node_id:
                     logger.info(f"⏳ {service_name} is starting on node {node_id}, will retry later")
 
+            if time.time() >= deadline:
+                break
             time.sleep(1)
+            # Re-poll only this service's tasks; the shared snapshot keeps its normal TTL.
+            tasks = client.api.tasks(filters={"service": service_name})
 
         for task in tasks:
             logger.debug(
@@ -60,12 +67,6 @@ def get_service_node(client, service_name, wait_timeout=5):
     return None
 
 
-@retry(
-    reraise=True,
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=2, max=10),
-    retry=retry_if_exception_type(APIError)
-)
 def force_update_service(client, service_name):
     """
     Force-update a Docker service using SDK or fallback to CLI.
@@ -88,15 +89,13 @@ def force_update_service(client, service_name):
             logger.info(f"🔁 Forced update of service: {service_name} (SDK)")
         except Exception as sdk_error:
             logger.warning(f"⚠️ SDK update failed for {service_name}: {sdk_error}, falling back to CLI")
-            subprocess.run(["docker", "service", "update", "--force", service_name], check=True)
+            # --detach: return once the update is accepted; the retry scheduler re-checks convergence.
+            subprocess.run(["docker", "service", "update", "--force", "--detach", service_name], check=True)
             logger.info(f"🔁 Forced update of service: {service_name} (CLI fallback)")
 
-        retry_state.pop(service_name, None)
+        invalidate()
         return True
 
     except Exception as e:
         logger.error(f"❌ Failed to update service '{service_name}': {e}")
-        retry_state.setdefault(service_name, {"failures": 0, "last_attempt": time.time()})
-        retry_state[service_name]["failures"] += 1
-        retry_state[service_name]["last_attempt"] = time.time()
         return False
@@ -1,27 +1,221 @@
 """
 ssh_helpers.py
-- Provides basic SSH and ping connectivity utilities for remote command execution.
+- Provides basic SSH utilities for remote command execution (reachability lives in `lib.common.reachability`).
 - Used during bootstrap and label synchronization to manage Swarm nodes remotely.
+- SSH commands share one multiplexed OpenSSH master connection per host
+  (ControlMaster), so only the first command to a host pays the TCP and
+  key-exchange handshake. Masters expire after SSH_CONTROL_PERSIST idle seconds
+  and are health-checked before reuse.
+- The master is started on its own (`ssh -MNf`, stdio detached) before the first
+  command to a host; commands only attach to its socket. A master forked by a
+  captured command would hold its output pipes open until the command timed out.
+- Concurrent commands per host are capped at SSH_MAX_SESSIONS: every command is
+  a session on the host's master, and sshd refuses sessions beyond its
+  `MaxSessions` (10 by default) when bootstrap fans out to many nodes at once.
 """
 
+import hashlib
+import os
+import re
 import subprocess
 import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
 
-def is_online(ip):
-    """
-    Check if a given IP is reachable via ping.
+from core.metrics import registry
 
-    Args:
-        ip (str): Target IP address or hostname.
+# --- Config via Environment Variables ---
+SSH_CONTROL_DIR = os.getenv("SSH_CONTROL_DIR", "/tmp/orcastra-ssh")
+SSH_CONTROL_PERSIST = int(os.getenv("SSH_CONTROL_PERSIST", "600"))  # idle seconds before a master exits (> bootstrap LOOP_INTERVAL)
+SSH_CONNECT_TIMEOUT = int(os.getenv("SSH_CONNECT_TIMEOUT", "5"))
+SSH_MAX_SESSIONS = int(os.getenv("SSH_MAX_SESSIONS", "8"))  # concurrent sessions per host; keep <= sshd MaxSessions (10)
+SSH_HEALTH_CHECK_INTERVAL = 60  # seconds between `ssh -O check` probes per host
+SSH_COMMAND_TIMEOUT = 10
 
-    Returns:
-        bool: True if ping returns successfully, False otherwise.
+# --- Metrics ---
+ssh_commands_total = registry.counter("ssh_commands_total", "SSH commands executed per host", ["host"])
+ssh_command_errors_total = registry.counter("ssh_command_errors_total", "SSH commands that failed to connect or timed out", ["host"])
+ssh_command_duration_seconds = registry.histogram("ssh_command_duration_seconds", "SSH command latency per host", ["host"])
+ssh_command_last_duration_seconds = registry.gauge("ssh_command_last_duration_seconds", "Latency of the last SSH command per host", ["host"])
+
+
+class SSHPool:
     """
-    return subprocess.call(
-        ["ping", "-c", "1", "-W", "1", ip],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL
-    ) == 0
+    Keeps one multiplexed OpenSSH master connection per host and records
+    per-host command latency.
+    """
+
+    def __init__(self, control_dir=SSH_CONTROL_DIR, persist=SSH_CONTROL_PERSIST, max_sessions=SSH_MAX_SESSIONS):
+        self.control_dir = control_dir
+        self.persist = persist
+        self.max_sessions = max(1, max_sessions)
+        self.last_used = {}      # host -> monotonic time of last command
+        self.last_checked = {}   # host -> monotonic time of last health check
+        self.locks = defaultdict(threading.Lock)
+        self.sessions = {}       # host -> BoundedSemaphore capping concurrent sessions
+        os.makedirs(self.control_dir, mode=0o700, exist_ok=True)
+
+    def control_path(self, host):
+        # Hash the host so the socket path stays under the unix socket length limit.
+        return os.path.join(self.control_dir, hashlib.sha1(host.encode()).hexdigest()[:16] + ".sock")
+
+    def _ssh_args(self, host):
+        # Never fork a master here: it would inherit the captured stdout/stderr pipes.
+        return [
+            "ssh",
+            "-o", "ControlMaster=no",
+            "-o", f"ControlPath={self.control_path(host)}",
+            "-o", f"ConnectTimeout={SSH_CONNECT_TIMEOUT}",
+            "-o", "BatchMode=yes",
+            host,
+        ]
+
+    def _start_master(self, host):
+        """
+        Start the host's master connection in the background with its stdio detached.
+        Without a master, commands fall back to a direct connection.
+        """
+        path = self.control_path(host)
+        if os.path.exists(path):
+            return
+        try:
+            result = subprocess.run(
+                [
+                    "ssh", "-MNf",
+                    "-o", f"ControlPath={path}",
+                    "-o", f"ControlPersist={self.persist}",
+                    "-o", f"ConnectTimeout={SSH_CONNECT_TIMEOUT}",
+                    "-o", "BatchMode=yes",
+                    host,
+                ],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                timeout=SSH_CONNECT_TIMEOUT + 5,
+            )
+            if result.returncode != 0:
+                logging.debug(f"[ssh_helpers] Could not start SSH master for {host} (exit {result.returncode}); connecting directly.")
+        except Exception as e:
+            logging.debug(f"[ssh_helpers] Could not start SSH master for {host}: {e}")
+
+    def _control(self, host, operation):
+        return subprocess.run(
+            ["ssh", "-o", f"ControlPath={self.control_path(host)}", "-O", operation, host],
+            capture_output=True, text=True, timeout=5,
+        )
+
+    def check(self, host):
+        """
+        Verify the host's master connection is alive, removing a stale control socket.
+        Checks are rate-limited to once per SSH_HEALTH_CHECK_INTERVAL per host.
+        """
+        now = time.monotonic()
+        if now - self.last_checked.get(host, 0) < SSH_HEALTH_CHECK_INTERVAL:
+            return
+        self.last_checked[host] = now
+
+        path = self.control_path(host)
+        if not os.path.exists(path):
+            return
+        try:
+            if self._control(host, "check").returncode != 0:
+                logging.debug(f"[ssh_helpers] Stale SSH master for {host}, removing {path}")
+                os.unlink(path)
+        except Exception as e:
+            logging.debug(f"[ssh_helpers] SSH master check failed for {host}: {e}")
+
+    def run(self, host, command, debug=False, timeout=SSH_COMMAND_TIMEOUT):
+        """
+        Execute a command on a remote host over the host's multiplexed connection.
+
+        Returns:
+            CompletedProcess: Subprocess result with stdout, stderr, returncode.
+        """
+        if debug:
+            logging.debug(f"[ssh_helpers] SSH {host}: {command}")
+
+        with self.locks[host]:
+            self.check(host)
+            self._start_master(host)
+            sessions = self.sessions.setdefault(host, threading.BoundedSemaphore(self.max_sessions))
+
+        sessions.acquire()
+        started = time.monotonic()
+        try:
+            result = subprocess.run(
+                self._ssh_args(host) + [command],
+                capture_output=True,
+                text=True,
+                timeout=timeout  # prevent indefinite hangs
+            )
+        except Exception:
+            ssh_command_errors_total.inc(host=host)
+            raise
+        finally:
+            sessions.release()
+            elapsed = time.monotonic() - started
+            ssh_commands_total.inc(host=host)
+            ssh_command_duration_seconds.observe(elapsed, host=host)
+            ssh_command_last_duration_seconds.set(elapsed, host=host)
+            self.last_used[host] = time.monotonic()
+
+        if result.returncode == 255:  # ssh itself failed (connection/auth)
+            ssh_command_errors_total.inc(host=host)
+        return result
+
+    def run_many(self, host, commands, debug=False, timeout=SSH_COMMAND_TIMEOUT):
+        """
+        Execute several commands in a single remote session.
+
+        Each command's stdout and exit code are separated by a unique marker, so
+        the results map back one-to-one. stderr is shared by all commands.
+
+        Returns:
+            list[CompletedProcess]: One result per command, in order.
+        """
+        if not commands:
+            return []
+
+        marker = f"__ORCASTRA_{uuid.uuid4().hex}__"
+        script = "\n".join(f"{cmd}\nprintf '\\n{marker} %s\\n' $?" for cmd in commands)
+        result = self.run(host, script, debug=debug, timeout=timeout)
+
+        # stdout looks like: out0 \n<marker> rc0\n out1 \n<marker> rc1\n ...
+        parts = re.split(rf"\n{marker} (\d+)\n", result.stdout)
+        results = []
+        for index, cmd in enumerate(commands):
+            if 2 * index + 1 < len(parts):
+                stdout, returncode = parts[2 * index], int(parts[2 * index + 1])
+            else:
+                # The session ended early (connection lost or timeout).
+                stdout, returncode = "", result.returncode or 255
+            results.append(subprocess.CompletedProcess(cmd, returncode, stdout, result.stderr))
+        return results
+
+    def expire_idle(self):
+        """Close master connections unused for longer than SSH_CONTROL_PERSIST."""
+        now = time.monotonic()
+        for host, last in list(self.last_used.items()):
+            if now - last >= self.persist:
+                self.close(host)
+
+    def close(self, host):
+        try:
+            if os.path.exists(self.control_path(host)):
+                self._control(host, "exit")
+        except Exception as e:
+            logging.debug(f"[ssh_helpers] Failed to close SSH master for {host}: {e}")
+        self.last_used.pop(host, None)
+        self.last_checked.pop(host, None)
+
+    def close_all(self):
+        for host in list(self.last_used):
+            self.close(host)
+
+
+# Shared pool for all SSH callers.
+ssh_pool = SSHPool()
+
 
 def ssh(host, command, debug=False):
     """
@@ -35,11 +229,14 @@ def ssh(host, command, debug=False):
     Returns:
         CompletedProcess: Subprocess result with stdout, stderr, returncode.
     """
-    if debug:
-        logging.debug(f"[ssh_helpers] SSH {host}: {command}")
-    return subprocess.run(
-        ["ssh", host, command],
-        capture_output=True,
-        text=True,
-        timeout=10  # prevent indefinite hangs
-    )
+    return ssh_pool.run(host, command, debug=debug)
+
+
+def ssh_many(host, commands, debug=False):
+    """
+    Execute several commands on a remote host in one SSH session.
+
+    Returns:
+        list[CompletedProcess]: One result per command, in order.
+    """
+    return ssh_pool.run_many(host, commands, debug=debug)
@@ -0,0 +1,180 @@
+"""
+cgroup_reader.py
+- Reads container memory straight from cgroup v2 files instead of `docker stats`:
+    - memory.current   (total bytes charged to the cgroup)
+    - memory.stat      (anon / file / inactive_file breakdown)
+    - memory.pressure  (PSI stall averages)
+- Container IDs are mapped to their cgroup directory for both the systemd and
+  cgroupfs Docker cgroup drivers; the resolved path is cached per container.
+- Keeps a rolling per-container buffer of recent samples so callers get current
+  and recent values without spawning processes.
+"""
+
+import os
+import time
+from collections import deque
+from loguru import logger
+
+# --- Config via Environment Variables ---
+CGROUP_ROOT = os.getenv("CGROUP_ROOT", "/host/sys/fs/cgroup")  # host cgroup hierarchy mounted read-only
+CGROUP_BUFFER_SIZE = int(os.getenv("CGROUP_BUFFER_SIZE", "60"))          # samples kept per container
+CGROUP_SAMPLE_INTERVAL = float(os.getenv("CGROUP_SAMPLE_INTERVAL", "10"))  # seconds between background samples
+
+# Directory layouts used by Docker's cgroup drivers, relative to CGROUP_ROOT.
+CGROUP_LAYOUTS = (
+    "system.slice/docker-{id}.scope",   # systemd driver
+    "docker/{id}",                      # cgroupfs driver
+)
+
+
+def _read_int(path):
+    with open(path) as f:
+        value = f.read().strip()
+    return 0 if value == "max" else int(value)
+
+
+def parse_memory_stat(text):
+    """
+    Parse `memory.stat` into a dict of byte counters.
+
+    Returns:
+        dict[str, int]: Counter name -> value.
+    """
+    stat = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(" ")
+        if value:
+            stat[key] = int(value)
+    return stat
+
+
+def parse_pressure(text):
+    """
+    Parse a PSI file (`some avg10=0.00 avg60=0.00 avg300=0.00 total=0`).
+
+    Returns:
+        dict[str, dict[str, float]]: "some"/"full" -> {"avg10", "avg60", "avg300", "total"}.
+    """
+    pressure = {}
+    for line in text.splitlines():
+        kind, *fields = line.split()
+        pressure[kind] = {k: float(v) for k, v in (field.split("=", 1) for field in fields)}
+    return pressure
+
+
+class CgroupMemoryReader:
+    """
+    Samples container memory from cgroup v2 and buffers recent samples per container.
+    """
+
+    def __init__(self, root=CGROUP_ROOT, buffer_size=CGROUP_BUFFER_SIZE):
+        self.root = root
+        self.buffer_size = buffer_size
+        self.paths = {}      # container ID -> cgroup directory
+        self.buffers = {}    # container ID -> deque of samples
+
+    def available(self):
+        """True if the host exposes a unified (v2) cgroup hierarchy."""
+        return os.path.exists(os.path.join(self.root, "cgroup.controllers"))
+
+    def cgroup_path(self, container_id):
+        """Resolve (and cache) the cgroup directory of a container, or None if not found."""
+        path = self.paths.get(container_id)
+        if path and os.path.isdir(path):
+            return path
+        for layout in CGROUP_LAYOUTS:
+            candidate = os.path.join(self.root, layout.format(id=container_id))
+            if os.path.isdir(candidate):
+                self.paths[container_id] = candidate
+                return candidate
+        self.paths.pop(container_id, None)
+        return None
+
+    def read(self, container_id):
+        """
+        Read one memory sample for a container.
+
+        Returns:
+            dict or None: {"timestamp", "current", "working_set", "anon", "file",
+            "pressure_some_avg10", "pressure_full_avg10"} in bytes / percent, or None
+            if the container has no cgroup v2 directory.
+        """
+        path = self.cgroup_path(container_id)
+        if path is None:
+            return None
+
+        current = _read_int(os.path.join(path, "memory.current"))
+        with open(os.path.join(path, "memory.stat")) as f:
+            stat = parse_memory_stat(f.read())
+        try:
+            with open(os.path.join(path, "memory.pressure")) as f:
+                pressure = parse_pressure(f.read())
+        except OSError:
+            pressure = {}  # PSI disabled on this kernel
+
+        return {
+            "timestamp": time.time(),
+            "current": current,
+            # Same definition as `docker stats`: usage minus reclaimable inactive page cache.
+            "working_set": max(current - stat.get("inactive_file", 0), 0),
+            "anon": stat.get("anon", 0),
+            "file": stat.get("file", 0),
+            "pressure_some_avg10": pressure.get("some", {}).get("avg10", 0.0),
+            "pressure_full_avg10": pressure.get("full", {}).get("avg10", 0.0),
+        }
+
+    def sample(self, container_ids):
+        """
+        Read every container once, append to its buffer and drop containers that are gone.
+
+        Returns:
+            dict[str, dict]: Container ID -> latest sample, for containers with a readable cgroup.
+        """
+        samples = {}
+        for container_id in container_ids:
+            try:
+                sample = self.read(container_id)
+            except OSError as e:
+                # The container exited between listing and reading.
+                logger.debug(f"[cgroup] Could not read cgroup of {container_id[:12]}: {e}")
+                continue
+            if sample is None:
+                continue
+            self.buffers.setdefault(container_id, deque(maxlen=self.buffer_size)).append(sample)
+            samples[container_id] = sample
+
+        for container_id in set(self.buffers) - set(container_ids):
+            self.buffers.pop(container_id, None)
+            self.paths.pop(container_id, None)
+        return samples
+
+    def latest(self, container_id):
+        buffer = self.buffers.get(container_id)
+        return buffer[-1] if buffer else None
+
+    def history(self, container_id):
+        """All buffered samples of a container, oldest first."""
+        return list(self.buffers.get(container_id, ()))
+
+
+# Shared reader for the local node.
+cgroup_reader = CgroupMemoryReader()
+
+
+async def run(interval=CGROUP_SAMPLE_INTERVAL):
+    """Background sampler that keeps the rolling buffers of local containers filled."""
+    from core.async_docker import async_client
+    from core.scheduler import scheduler, Job
+
+    if not cgroup_reader.available():
+        logger.info(f"[cgroup] No cgroup v2 hierarchy at {CGROUP_ROOT}; memory falls back to the stats API.")
+        return
+
+    async def sample():
+        try:
+            containers = await async_client.containers()
+            cgroup_reader.sample([c["Id"] for c in containers])
+        except Exception as e:
+            logger.warning(f"[cgroup] Sampling failed: {e}")
+
+    await scheduler.run_job(Job("cgroup_sampler", sample, every=interval))
@@ -0,0 +1,205 @@
+"""
+container_usage.py
+- Cluster-wide container memory usage for rebalancing.
+- Every orcastra instance reports the memory of its own Swarm task containers
+  through the `/usage` endpoint (one batched response per node), read from
+  cgroup v2 where possible.
+- The leader collects all followers concurrently, each with its own timeout,
+  and builds a service -> task -> node -> bytes index. A follower that fails
+  to answer keeps contributing its last-known-good report until USAGE_STALE_TTL.
+"""
+
+import asyncio
+import os
+import time
+from collections import defaultdict
+
+import aiohttp
+from loguru import logger
+
+from core.async_docker import async_client, bounded_gather
+from core.config import API_PORT
+from core.metrics import registry
+from lib.metrics.cgroup_reader import cgroup_reader
+
+# --- Config via Environment Variables ---
+USAGE_TIMEOUT = float(os.getenv("USAGE_TIMEOUT", "5"))            # seconds per follower request
+USAGE_STALE_TTL = float(os.getenv("USAGE_STALE_TTL", "300"))      # seconds a follower's last report stays usable
+USAGE_CONCURRENCY = int(os.getenv("USAGE_CONCURRENCY", "16"))     # followers queried at once
+
+SERVICE_LABEL = "com.docker.swarm.service.name"
+TASK_LABEL = "com.docker.swarm.task.id"
+
+# --- Metrics ---
+usage_collect_last_duration_seconds = registry.gauge("usage_collect_last_duration_seconds", "Duration of the last cluster usage collection")
+usage_collect_duration_seconds = registry.histogram("usage_collect_duration_seconds", "Duration of cluster usage collections")
+usage_report_failures_total = registry.counter("usage_report_failures_total", "Follower usage requests that failed or timed out", ["node"])
+usage_stale_reports_total = registry.counter("usage_stale_reports_total", "Failed requests answered with the last-known-good report", ["node"])
+
+_local_node_id = None
+
+
+def container_memory_bytes(stats):
+    """
+    Working-set memory of a container from a Docker stats sample, matching `docker stats`
+    (usage minus inactive page cache, cgroup v1 or v2).
+    """
+    memory = stats.get("memory_stats", {}) or {}
+    usage = memory.get("usage", 0) or 0
+    detail = memory.get("stats", {}) or {}
+    cache = detail.get("inactive_file", detail.get("total_inactive_file", 0)) or 0
+    return max(usage - cache, 0)
+
+
+async def local_node_id():
+    """Swarm node ID of this daemon (cached after the first lookup)."""
+    global _local_node_id
+    if _local_node_id is None:
+        _local_node_id = (await async_client.info()).get("Swarm", {}).get("NodeID")
+    return _local_node_id
+
+
+async def local_usage():
+    """
+    Memory usage of the Swarm task containers running on this node.
+
+    Usage is read from cgroup v2 files when available; containers without a
+    readable cgroup fall back to a one-shot stats API call.
+
+    Returns:
+        dict: {"node_id": str, "tasks": [[service, task_id, bytes], ...]}
+    """
+    containers = await async_client.containers(filters={"label": [SERVICE_LABEL]})
+
+    used = {}
+    for container in containers:
+        try:
+            sample = cgroup_reader.read(container["Id"])
+        except OSError:
+            sample = None
+        if sample is not None:
+            used[container["Id"]] = sample["working_set"]
+
+    missing = [c for c in containers if c["Id"] not in used]
+    stats = await bounded_gather([async_client.container_stats(c["Id"]) for c in missing])
+    for container, sample in zip(missing, stats):
+        if isinstance(sample, Exception):
+            logger.debug(f"[usage] Stats failed for {container['Id'][:12]}: {sample}")
+            continue
+        used[container["Id"]] = container_memory_bytes(sample)
+
+    tasks = []
+    for container in containers:
+        if container["Id"] not in used:
+            continue
+        labels = container.get("Labels", {}) or {}
+        tasks.append([labels[SERVICE_LABEL], labels.get(TASK_LABEL, container["Id"]), used[container["Id"]]])
+    return {"node_id": await local_node_id(), "tasks": tasks}
+
+
+class UsageIndex:
+    """
+    Service -> task -> (node ID, bytes) index built from per-node usage reports.
+    """
+
+    def __init__(self):
+        self.by_service = defaultdict(dict)
+        self.bytes_by_node = defaultdict(int)
+
+    def add_report(self, report):
+        node_id = report.get("node_id")
+        for service, task_id, used in report.get("tasks", []):
+            self.by_service[service][task_id] = (node_id, used)
+            self.bytes_by_node[node_id] += used
+
+    def service_bytes(self, service):
+        return sum(used for _, used in self.by_service.get(service, {}).values())
+
+    def node_bytes(self, node_id):
+        return self.bytes_by_node.get(node_id, 0)
+
+    def service_gb(self):
+        """
+        Returns:
+            dict[str, float]: Service name -> memory used by all its tasks, in GB.
+        """
+        return {service: round(self.service_bytes(service) / (1024**3), 2) for service in self.by_service}
+
+
+class UsageCollector:
+    """
+    Leader-side aggregation of follower `/usage` reports.
+    """
+
+    def __init__(self, port=API_PORT, timeout=USAGE_TIMEOUT, stale_ttl=USAGE_STALE_TTL, concurrency=USAGE_CONCURRENCY):
+        self.port = port
+        self.timeout = timeout
+        self.stale_ttl = stale_ttl
+        self.concurrency = concurrency
+        self._session = None
+        self.last_good = {}      # node ID -> (report, monotonic time)
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=120),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _fetch(self, addr):
+        async with self._get_session().get(f"http://{addr}:{self.port}/usage") as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def _report(self, node_id, fetch):
+        try:
+            report = await asyncio.wait_for(fetch, timeout=self.timeout)
+            self.last_good[node_id] = (report, time.monotonic())
+            return report
+        except Exception as e:
+            usage_report_failures_total.inc(node=node_id)
+            cached = self.last_good.get(node_id)
+            if cached and time.monotonic() - cached[1] < self.stale_ttl:
+                usage_stale_reports_total.inc(node=node_id)
+                logger.warning(f"[usage] No report from {node_id} ({e}); using report from {time.monotonic() - cached[1]:.0f}s ago.")
+                return cached[0]
+            logger.warning(f"[usage] No usage report from node {node_id}: {e}")
+            return None
+
+    async def collect(self, snapshot):
+        """
+        Query the local daemon and every ready follower concurrently.
+
+        Args:
+            snapshot (ClusterSnapshot): Source of node IDs and addresses.
+
+        Returns:
+            UsageIndex: Cluster-wide usage for this cycle.
+        """
+        started = time.monotonic()
+        own_id = await local_node_id()
+
+        reports = [self._report(own_id, local_usage())]
+        for node in snapshot.nodes:
+            status = node.attrs.get("Status", {})
+            if node.id == own_id or status.get("State") != "ready" or not status.get("Addr"):
+                continue
+            reports.append(self._report(node.id, self._fetch(status["Addr"])))
+
+        index = UsageIndex()
+        for report in await asyncio.gather(*reports):
+            if report:
+                index.add_report(report)
+
+        usage_collect_last_duration_seconds.set(time.monotonic() - started)
+        usage_collect_duration_seconds.observe(time.monotonic() - started)
+        return index
+
+
+# Shared collector used by the rebalance loop on the leader.
+usage_collector = UsageCollector()
@@ -62,9 +62,31 @@ def get_docker_reported_memory(node_names):
             logging.warning(f"[metrics] Failed to get Docker memory for {node}: {e}")
     return memory_data
 
+# Binary and decimal size suffixes as printed by `docker stats` (e.g. "512MiB", "1.2GB").
+SIZE_UNITS = {
+    "b": 1,
+    "kib": 1024, "mib": 1024**2, "gib": 1024**3, "tib": 1024**4,
+    "kb": 1000, "mb": 1000**2, "gb": 1000**3, "tb": 1000**4,
+}
+
+def parse_size_bytes(value):
+    """
+    Convert a human-readable size such as "12.5MiB" or "1.9GB" to bytes.
+
+    Raises:
+        ValueError: If the value has no recognised unit.
+    """
+    value = value.strip().lower()
+    number = value.rstrip("abcdefghijklmnopqrstuvwxyz")
+    unit = value[len(number):].strip()
+    if unit not in SIZE_UNITS:
+        raise ValueError(f"Unknown size unit in {value!r}")
+    return float(number) * SIZE_UNITS[unit]
+
 def get_container_memory_usage():
     """
     Use `docker stats` to collect active container memory usage.
+    Slow (waits for a CPU sampling window); `cgroup_reader` is preferred on the nodes themselves.
 
     Returns:
         dict[str, float]: Mapping of container name -> used memory in GB.
@@ -78,13 +100,7 @@ def get_container_memory_usage():
         for line in result.stdout.strip().splitlines():
             try:
                 name, mem = line.split(":")
-                mem_value = mem.split("/")[0].strip().lower()
-                if mem_value.endswith("mb"):
-                    value = float(mem_value[:-2]) / 1024
-                elif mem_value.endswith("gb"):
-                    value = float(mem_value[:-2])
-                else:
-                    value = 0
+                value = parse_size_bytes(mem.split("/")[0]) / (1024**3)
                 usage[name] = max(round(value, 2), 0)
             except Exception:
                 continue
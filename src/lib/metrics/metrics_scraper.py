@@ -2,10 +2,20 @@
 metrics_scraper.py
 - Lightweight wrapper to scrape memory metrics from node_exporter endpoints.
 - Used in simple integrations or direct CLI-style testing.
+- ExporterScraper fetches many exporters concurrently over one keep-alive
+  session, parses only the requested metric families from the stream and keeps
+  a last-known-good value per target.
 """
 
-import requests
+import asyncio
 import logging
+import os
+import time
+
+import aiohttp
+import requests
+
+from core.metrics import registry
 
 def get_node_exporter_memory(url):
     """
@@ -31,3 +41,140 @@ def get_node_exporter_memory(url):
     except Exception as e:
         logging.warning(f"[metrics_scraper] Failed to scrape metrics from {url}: {e}")
     return None
+
+
+# --- Pooled async scraping ---
+
+EXPORTER_SCRAPE_TIMEOUT = float(os.getenv("EXPORTER_SCRAPE_TIMEOUT", "3"))
+EXPORTER_STALE_TTL = float(os.getenv("EXPORTER_STALE_TTL", "300"))
+EXPORTER_POOL_SIZE = int(os.getenv("EXPORTER_POOL_SIZE", "32"))
+
+MEMORY_FAMILIES = ("node_memory_MemTotal_bytes", "node_memory_MemAvailable_bytes")
+
+exporter_scrapes_total = registry.counter("exporter_scrapes_total", "node_exporter scrapes attempted per target", ["target"])
+exporter_scrape_failures_total = registry.counter("exporter_scrape_failures_total", "node_exporter scrapes that failed or timed out", ["target"])
+exporter_stale_values_total = registry.counter("exporter_stale_values_total", "Failed scrapes answered with the last-known-good value", ["target"])
+exporter_scrape_duration_seconds = registry.histogram("exporter_scrape_duration_seconds", "Duration of node_exporter scrapes per target", ["target"])
+
+
+async def parse_families(lines, families):
+    """
+    Read unlabelled samples of the requested metric families from an exposition stream.
+
+    Stops consuming `lines` as soon as every requested family has a value, so the
+    rest of a large exposition body is never split or parsed.
+
+    Args:
+        lines: Async iterable of raw exposition lines (bytes).
+        families (Iterable[str]): Metric names to collect.
+
+    Returns:
+        dict[str, float]: Family -> sample value for every family found.
+    """
+    wanted = {f.encode() for f in families}
+    found = {}
+    async for line in lines:
+        if line.startswith(b"#"):
+            continue
+        name, _, rest = line.partition(b" ")
+        if name in wanted and name.decode() not in found:
+            found[name.decode()] = float(rest.split()[0])
+            if len(found) == len(wanted):
+                break
+    return found
+
+
+class ExporterScraper:
+    """
+    Scrapes node_exporter targets concurrently over a shared keep-alive session.
+
+    Every target keeps its last successful reading; when a scrape fails or times
+    out, that value is served until it is older than EXPORTER_STALE_TTL.
+    """
+
+    def __init__(self, timeout=EXPORTER_SCRAPE_TIMEOUT, stale_ttl=EXPORTER_STALE_TTL, pool_size=EXPORTER_POOL_SIZE):
+        self.timeout = timeout
+        self.stale_ttl = stale_ttl
+        self.pool_size = pool_size
+        self._session = None
+        self.last_good = {}      # target -> (families dict, monotonic time)
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=120),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def scrape(self, url, families):
+        """
+        Fetch one target and return the requested families (streaming, early stop).
+
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError, ValueError: On scrape failure.
+        """
+        session = self._get_session()
+        async with session.get(url, headers={"Accept-Encoding": "gzip"}) as response:
+            response.raise_for_status()
+            found = await parse_families(response.content, families)
+            # Discard the unparsed remainder so the connection returns to the pool.
+            while await response.content.readany():
+                pass
+        return found
+
+    async def collect(self, targets, families=MEMORY_FAMILIES):
+        """
+        Scrape all targets concurrently, falling back to last-known-good values.
+
+        Args:
+            targets (dict[str, str]): Name -> exporter URL.
+            families (Iterable[str]): Metric names to collect.
+
+        Returns:
+            dict[str, dict[str, float]]: Name -> family values, for targets with fresh or non-stale data.
+        """
+        async def one(name, url):
+            started = time.monotonic()
+            exporter_scrapes_total.inc(target=name)
+            try:
+                found = await asyncio.wait_for(self.scrape(url, families), timeout=self.timeout)
+                self.last_good[name] = (found, time.monotonic())
+                return found
+            except Exception as e:
+                exporter_scrape_failures_total.inc(target=name)
+                cached = self.last_good.get(name)
+                if cached and time.monotonic() - cached[1] < self.stale_ttl:
+                    exporter_stale_values_total.inc(target=name)
+                    logging.warning(f"[metrics_scraper] Scrape of {name} failed ({e}); using value from {time.monotonic() - cached[1]:.0f}s ago.")
+                    return cached[0]
+                logging.warning(f"[metrics_scraper] Failed to scrape metrics from {url}: {e}")
+                return None
+            finally:
+                exporter_scrape_duration_seconds.observe(time.monotonic() - started, target=name)
+
+        results = await asyncio.gather(*(one(name, url) for name, url in targets.items()))
+        return {name: found for name, found in zip(targets, results) if found}
+
+    async def available_memory_gb(self, targets):
+        """
+        Return available memory in GB per target, like `get_node_exporter_memory` for all targets at once.
+
+        Returns:
+            dict[str, float]: Target name -> available memory in GB.
+        """
+        memory = {}
+        for name, found in (await self.collect(targets, MEMORY_FAMILIES)).items():
+            total = found.get("node_memory_MemTotal_bytes", 0)
+            available = found.get("node_memory_MemAvailable_bytes", 0)
+            if total > 0 and available > 0:
+                memory[name] = max(round(available / (1024**3), 2), 0)
+        return memory
+
+
+# Shared scraper used by the rebalance loop.
+exporter_scraper = ExporterScraper()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 mod_manager.py
-- Periodically inspects running containers for mod labels and downloads mods into /modcache.
+- Inspects running containers every MOD_MANAGER_REFRESH_INTERVAL_MINUTES (a job on
+  the shared scheduler) for mod labels and downloads mods into /modcache.
 - Matches LinuxServer docker-modmanager automatic behavior.
 - Exposes Prometheus metrics.
 """
@@ -12,6 +13,9 @@ import requests
 import time
 from datetime import datetime
 from core.docker_client import client
+from core.metrics import registry
+from core.runner_pool import runner_pool
+from core.scheduler import scheduler, Job
 
 # --- Config ---
 DEST_DIR = os.getenv("MOD_MANAGER_DEST", "/modcache")
@@ -20,9 +24,9 @@ DOWNLOAD_RETRIES = 3
 TIMEOUT_SECONDS = 30
 
 # --- Metrics ---
-mod_downloads_total = 0
-mod_download_errors_total = 0
-mod_refresh_last_duration_seconds = 0.0
+mod_downloads_total = registry.counter("mod_downloads_total", "Total successful mod downloads")
+mod_download_errors_total = registry.counter("mod_download_errors_total", "Total failed mod downloads")
+mod_refresh_last_duration_seconds = registry.gauge("mod_refresh_last_duration_seconds", "Duration of last mod refresh cycle")
 
 # --- Core Functions ---
 
@@ -38,8 +42,6 @@ def discover_mods_from_containers():
     return mods
 
 def download_file(url, dest_folder, retries=DOWNLOAD_RETRIES):
-    global mod_downloads_total, mod_download_errors_total
-
     os.makedirs(dest_folder, exist_ok=True)
     filename = url.split("/")[-1]
     dest_path = os.path.join(dest_folder, filename)
@@ -52,24 +54,22 @@ def download_file(url, dest_folder, retries=DOWNLOAD_RETRIES):
             with open(dest_path, "wb") as f:
                 f.write(response.content)
             logging.info(f"[mod_manager] ✅ Successfully downloaded {filename}")
-            mod_downloads_total += 1
+            mod_downloads_total.inc()
             return
         except Exception as e:
             logging.warning(f"[mod_manager] ⚠️ Attempt {attempt+1} failed for {url}: {e}")
             time.sleep(5)
 
     logging.error(f"[mod_manager] ❌ Failed to download {url} after {retries} attempts.")
-    mod_download_errors_total += 1
+    mod_download_errors_total.inc()
 
 def refresh_mods():
-    global mod_refresh_last_duration_seconds
-
     start_time = datetime.utcnow()
 
     mods = discover_mods_from_containers()
     if not mods:
         logging.info("[mod_manager] No mod labels found.")
-        mod_refresh_last_duration_seconds = (datetime.utcnow() - start_time).total_seconds()
+        mod_refresh_last_duration_seconds.set((datetime.utcnow() - start_time).total_seconds())
         return
 
     logging.info(f"[mod_manager] Found {len(mods)} mod(s) to download.")
@@ -77,14 +77,11 @@ def refresh_mods():
     for mod_url in mods:
         download_file(mod_url, DEST_DIR)
 
-    mod_refresh_last_duration_seconds = (datetime.utcnow() - start_time).total_seconds()
+    mod_refresh_last_duration_seconds.set((datetime.utcnow() - start_time).total_seconds())
 
-def scheduled_mod_refresh():
-    while True:
-        try:
-            logging.info("[mod_manager] Running scheduled mod refresh...")
-            refresh_mods()
-        except Exception as e:
-            logging.error(f"[mod_manager] Unexpected error during mod refresh: {e}")
-        logging.info(f"[mod_manager] Sleeping {REFRESH_INTERVAL_MINUTES} minutes...")
-        time.sleep(REFRESH_INTERVAL_MINUTES * 60)
+async def scheduled_mod_refresh():
+    logging.info("[mod_manager] Running scheduled mod refresh...")
+    await runner_pool.run("mod_manager", refresh_mods)
+
+async def run():
+    await scheduler.run_job(Job("mod_manager", scheduled_mod_refresh, every=REFRESH_INTERVAL_MINUTES * 60, jitter=30))
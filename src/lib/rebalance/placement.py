@@ -0,0 +1,145 @@
+"""
+placement.py
+- Executes rebalance moves by placing tasks on the chosen node instead of a
+  blind force-update the scheduler may answer by restarting the task in place.
+- A move adds a temporary `node.id==<target>` placement constraint, waits for a
+  running task on the target and then removes the constraint again. Swarm does
+  not restart tasks for a constraint-only change the node still satisfies, so
+  the cleanup costs no second restart.
+- Anchor groups move together: the anchor first, then its node label follows
+  it and the dependents are placed on the same node.
+- Temporary constraints are recorded in the rebalance state so a crash between
+  placement and cleanup is repaired on the next start.
+"""
+
+import asyncio
+import os
+import time
+from loguru import logger
+
+from core.async_docker import async_client
+from core.cluster_snapshot import invalidate
+from core.state import save_state
+from lib.rebalance.policy import short_name
+
+# --- Config via Environment Variables ---
+PLACEMENT_TIMEOUT = float(os.getenv("PLACEMENT_TIMEOUT", "180"))  # seconds to wait for a task on the target
+PLACEMENT_POLL_INTERVAL = 2
+
+
+def target_constraint(node_id):
+    return f"node.id=={node_id}"
+
+
+def is_pinned(spec):
+    """True if a service is already pinned to one node by its own constraints (cannot be moved)."""
+    constraints = spec.get("TaskTemplate", {}).get("Placement", {}).get("Constraints", []) or []
+    return any(c.replace(" ", "").startswith(("node.id==", "node.hostname==")) for c in constraints)
+
+
+def _constraints(spec):
+    placement = spec.setdefault("TaskTemplate", {}).setdefault("Placement", {})
+    return placement.setdefault("Constraints", [])
+
+
+async def add_constraint(service_id, constraint):
+    def mutate(spec):
+        constraints = _constraints(spec)
+        if constraint not in constraints:
+            constraints.append(constraint)
+    await async_client.mutate_service_spec(service_id, mutate)
+
+
+async def remove_constraint(service_id, constraint):
+    def mutate(spec):
+        constraints = _constraints(spec)
+        if constraint in constraints:
+            constraints.remove(constraint)
+    await async_client.mutate_service_spec(service_id, mutate)
+
+
+async def wait_running_on(service_id, node_id, timeout=PLACEMENT_TIMEOUT):
+    """
+    Wait until the service has a running task on `node_id`.
+
+    Returns:
+        bool: True if the task came up before the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        tasks = await async_client.tasks(filters={"service": service_id, "desired-state": "running"})
+        if any(t.get("NodeID") == node_id and t.get("Status", {}).get("State") == "running" for t in tasks):
+            return True
+        await asyncio.sleep(PLACEMENT_POLL_INTERVAL)
+    return False
+
+
+async def _place(names, service_ids, node_id, state):
+    constraint = target_constraint(node_id)
+    for name in names:
+        state.setdefault(name, {})["placement_constraint"] = constraint
+    save_state(state)  # persisted before the spec changes so a crash can be cleaned up
+    await asyncio.gather(*(add_constraint(service_ids[name], constraint) for name in names))
+    placed = await asyncio.gather(*(wait_running_on(service_ids[name], node_id) for name in names))
+    return dict(zip(names, placed))
+
+
+async def release(names, service_ids, state):
+    """Remove the temporary placement constraints of `names` and clear them from the state."""
+    for name in names:
+        constraint = state.get(name, {}).get("placement_constraint")
+        if not constraint or name not in service_ids:
+            continue
+        try:
+            await remove_constraint(service_ids[name], constraint)
+            state[name].pop("placement_constraint", None)
+        except Exception as e:
+            logger.error(f"[rebalance] Failed to remove placement constraint {constraint} from {name}: {e}")
+
+
+async def move_group(services, service_ids, node_id, state, anchored=False):
+    """
+    Move a service (or an anchor and its dependents) onto one node.
+
+    Args:
+        services (list[str]): Service names; with `anchored`, the first one is the anchor.
+        service_ids (dict[str, str]): Service name -> service ID.
+        node_id (str): Target node ID.
+        state (dict): Rebalance state, used to record temporary constraints.
+        anchored (bool): True if `services[0]` is an anchor whose node label the others follow.
+
+    Returns:
+        dict[str, bool]: Service -> whether it ended up running on the target.
+    """
+    from lib.sync.label_utils import label_anchor_services
+
+    lead, followers = services[0], services[1:]
+    try:
+        placed = await _place([lead], service_ids, node_id, state)
+        if followers and placed[lead]:
+            if anchored:
+                # Move the anchor label first so the dependents' label constraint holds on the target.
+                invalidate()
+                await asyncio.to_thread(label_anchor_services, {short_name(lead): lead})
+            placed.update(await _place(followers, service_ids, node_id, state))
+        else:
+            placed.update({name: False for name in followers})
+        return placed
+    finally:
+        await release(services, service_ids, state)
+
+
+async def release_stale(state):
+    """Remove temporary placement constraints left behind by an interrupted move."""
+    from core.cluster_snapshot import get_snapshot_async
+
+    stale = [name for name, entry in state.items() if isinstance(entry, dict) and entry.get("placement_constraint")]
+    if not stale:
+        return
+    snapshot = await get_snapshot_async()
+    service_ids = {name: snapshot.service(name).id for name in stale if snapshot.service(name) is not None}
+    logger.warning(f"[rebalance] Removing leftover placement constraints from {stale}")
+    await release(stale, service_ids, state)
+    for name in stale:
+        if name not in service_ids:
+            state[name].pop("placement_constraint", None)  # service no longer exists
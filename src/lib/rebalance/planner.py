@@ -0,0 +1,130 @@
+"""
+planner.py
+- Cluster-wide rebalance planning stage.
+- Takes every movable unit (an anchor with its dependents, or a standalone
+  service) together with per-node free memory and computes one move plan for
+  the whole cluster, so several services are never all sent to the same node.
+- Candidate moves are scored as a NumPy matrix (units x nodes) by the reduction
+  in free-memory variance per GB moved; moves are picked greedily (best fit
+  first) and the free-memory vector is updated after each pick, under a move budget.
+"""
+
+import numpy as np
+
+
+def build_units(candidates, placements, usage_gb, dependencies, policies=None):
+    """
+    Group candidate services into movable units; dependents move with their anchor.
+
+    Args:
+        candidates (dict[str, str | None]): Service -> preferred target node (None for any).
+        placements (dict[str, str]): Service -> node it currently runs on.
+        usage_gb (dict[str, float]): Service -> memory used, in GB.
+        dependencies (dict[str, list[str]]): Anchor service -> dependent services.
+        policies (PolicyTable): Per-service policies; a unit uses its anchor's
+            `memory_difference_gb` and `rebalance_buffer_gb`.
+
+    Returns:
+        list[dict]: {"name", "services", "node", "size", "preferred"} per unit, plus
+        "min_difference" and "buffer" when `policies` is given.
+    """
+    dependents = {dep for deps in dependencies.values() for dep in deps or []}
+    units = []
+    for service, preferred in candidates.items():
+        if service in dependents or service not in placements:
+            continue  # dependents are planned as part of their anchor's unit
+        members = [service] + [d for d in dependencies.get(service, []) or [] if placements.get(d) == placements[service]]
+        unit = {
+            "name": service,
+            "services": members,
+            "node": placements[service],
+            "size": sum(usage_gb.get(m, 0) for m in members),
+            "preferred": preferred,
+        }
+        if policies is not None:
+            policy = policies.get(service)
+            unit["min_difference"] = policy["memory_difference_gb"]
+            unit["buffer"] = policy["rebalance_buffer_gb"]
+        units.append(unit)
+    return units
+
+
+def plan_moves(free_mem_by_node, units, max_moves, min_difference, buffer):
+    """
+    Compute a cluster-wide move plan.
+
+    A unit of size s moving from node i to node j changes the sum of squared free
+    memory by 2s(f_i - f_j) + 2s^2, so its variance reduction per GB moved is
+    2(f_j - f_i - s). A move is feasible if the target fits the unit, the gap is at
+    least `min_difference` (waived for a unit's preferred node) and the predicted
+    gap after the move is at least `buffer`.
+
+    Args:
+        free_mem_by_node (dict[str, float]): Node -> free memory in GB.
+        units (list[dict]): Movable units from `build_units`.
+        max_moves (int): Move budget for this plan.
+        min_difference (float): Minimum free-memory gap (GB) to consider a move,
+            unless the unit carries its own "min_difference".
+        buffer (float): Minimum predicted improvement (GB) after the move, unless
+            the unit carries its own "buffer".
+
+    Returns:
+        list[dict]: {"name", "services", "source", "target", "size", "gain"} in execution order.
+    """
+    nodes = sorted(free_mem_by_node)
+    index = {node: i for i, node in enumerate(nodes)}
+    units = [u for u in units if u["node"] in index]
+    if not units or len(nodes) < 2 or max_moves <= 0:
+        return []
+
+    free = np.array([free_mem_by_node[n] for n in nodes], dtype=np.float64)
+    source = np.array([index[u["node"]] for u in units])
+    size = np.array([u["size"] for u in units], dtype=np.float64)
+    min_diff = np.array([u.get("min_difference", min_difference) for u in units], dtype=np.float64)
+    buffers = np.array([u.get("buffer", buffer) for u in units], dtype=np.float64)
+    rows = np.arange(len(units))
+
+    # allowed[g, j]: unit g may go to node j (only its preferred node, if it has one).
+    allowed = np.ones((len(units), len(nodes)), dtype=bool)
+    pinned = np.zeros(len(units), dtype=bool)
+    for g, unit in enumerate(units):
+        if unit.get("preferred") in index:
+            allowed[g] = False
+            allowed[g, index[unit["preferred"]]] = True
+            pinned[g] = True
+    allowed[rows, source] = False
+
+    active = np.ones(len(units), dtype=bool)
+    moves = []
+    while len(moves) < max_moves and active.any():
+        diff = free[None, :] - free[source][:, None]
+        feasible = (
+            allowed & active[:, None]
+            & (free[None, :] >= size[:, None])
+            & ((diff >= min_diff[:, None]) | pinned[:, None])
+            & (diff - 2 * size[:, None] >= buffers[:, None])
+        )
+        if not feasible.any():
+            break
+
+        score = np.where(feasible, 2 * (diff - size[:, None]), -np.inf)
+        g, j = np.unravel_index(np.argmax(score), score.shape)
+
+        moves.append({
+            "name": units[g]["name"],
+            "services": units[g]["services"],
+            "source": nodes[source[g]],
+            "target": nodes[j],
+            "size": float(size[g]),
+            "gain": float(score[g, j] * size[g]),
+        })
+        free[source[g]] += size[g]
+        free[j] -= size[g]
+        active[g] = False
+    return moves
+
+
+def imbalance(free_mem_by_node):
+    """Spread (max - min) of free memory across nodes, in GB."""
+    values = np.fromiter(free_mem_by_node.values(), dtype=np.float64)
+    return float(values.max() - values.min()) if len(values) else 0.0
@@ -0,0 +1,154 @@
+"""
+policy.py
+- Compiles the rebalance config into a per-service policy table. Each service's
+  policy is resolved once from three layers, later layers winning:
+    - `default:` settings
+    - `services:` overrides, keyed by full service name or by the name without
+      the `<STACK_NAME>_` prefix
+    - `orchestration.*` service labels
+  Policies are re-resolved only when the config is reloaded or a service's spec
+  version changes, so evaluating a service is a dict lookup.
+- Per-service cooldown/hysteresis state machine, persisted in the rebalance state:
+    - idle -> pressured: the free-memory gap reached `memory_difference_gb`
+    - pressured -> idle: the gap fell below `memory_difference_gb - hysteresis_gb`
+    - any -> cooldown: the service was moved; it is not moved again for `cooldown_minutes`
+    - cooldown -> idle: the cooldown expired
+"""
+
+from loguru import logger
+
+from core.config import STACK_NAME
+from core.constants import DEFAULT_REBALANCE_BUFFER_GB, DEFAULT_REBALANCE_HYSTERESIS_GB, DEFAULT_MAX_MOVES_PER_CYCLE
+
+POLICY_DEFAULTS = {
+    "rebalance": True,
+    "preferred_node": None,
+    "cooldown_minutes": 15,
+    "sustained_high_minutes": 10,
+    "memory_difference_gb": 2,
+    "rebalance_buffer_gb": DEFAULT_REBALANCE_BUFFER_GB,
+    "hysteresis_gb": DEFAULT_REBALANCE_HYSTERESIS_GB,
+}
+
+# Service label -> policy key it overrides.
+POLICY_LABELS = {
+    "orchestration.rebalance": "rebalance",
+    "orchestration.preferred.node": "preferred_node",
+    "orchestration.rebalance.cooldown_minutes": "cooldown_minutes",
+    "orchestration.rebalance.sustained_high_minutes": "sustained_high_minutes",
+    "orchestration.rebalance.memory_difference_gb": "memory_difference_gb",
+    "orchestration.rebalance.rebalance_buffer_gb": "rebalance_buffer_gb",
+    "orchestration.rebalance.hysteresis_gb": "hysteresis_gb",
+}
+
+IDLE = "idle"
+PRESSURED = "pressured"
+COOLDOWN = "cooldown"
+
+
+def short_name(service, stack=STACK_NAME):
+    """Service name without its `<stack>_` prefix (e.g. swarm-dev_gitea_db -> gitea_db)."""
+    prefix = f"{stack}_"
+    return service[len(prefix):] if service.startswith(prefix) else service
+
+
+def _coerce(key, value):
+    if key == "rebalance":
+        return value if isinstance(value, bool) else str(value).strip().lower() == "true"
+    if key == "preferred_node":
+        return str(value) if value else None
+    return float(value)
+
+
+def _settings(entry):
+    return {key: _coerce(key, value) for key, value in (entry or {}).items() if key in POLICY_DEFAULTS}
+
+
+class PolicyTable:
+    """
+    Compiled per-service rebalance policies for one loaded config.
+    """
+
+    def __init__(self, config):
+        default = config.get("default") or {}
+        self.defaults = {**POLICY_DEFAULTS, **_settings(default)}
+        self.overrides = {name: _settings(entry) for name, entry in (config.get("services") or {}).items()}
+        self.max_moves = int(default.get("max_moves_per_cycle", DEFAULT_MAX_MOVES_PER_CYCLE))
+        self.interval = config.get("comonitor_interval_seconds", default.get("check_interval_seconds", 60))
+        self.policies = {}   # service -> resolved policy
+        self.versions = {}   # service -> spec version the policy was resolved from
+
+    def resolve(self, service, labels=None):
+        """
+        Resolve one service's policy from defaults, config overrides and labels.
+
+        Returns:
+            dict: Every key of POLICY_DEFAULTS.
+        """
+        policy = dict(self.defaults)
+        policy.update(self.overrides.get(short_name(service), {}))
+        policy.update(self.overrides.get(service, {}))
+        for label, key in POLICY_LABELS.items():
+            if labels and label in labels:
+                try:
+                    policy[key] = _coerce(key, labels[label])
+                except ValueError:
+                    logger.warning(f"[rebalance] Ignoring invalid label {label}={labels[label]!r} on {service}")
+        return policy
+
+    def refresh(self, snapshot, services):
+        """Re-resolve the policies of services whose spec changed since they were last resolved."""
+        for service in services:
+            svc = snapshot.service(service)
+            version = svc.attrs.get("Version", {}).get("Index") if svc is not None else None
+            if service in self.policies and self.versions.get(service) == version:
+                continue
+            labels = svc.attrs["Spec"].get("Labels", {}) if svc is not None else {}
+            self.policies[service] = self.resolve(service, labels)
+            self.versions[service] = version
+
+    def get(self, service):
+        policy = self.policies.get(service)
+        if policy is None:
+            policy = self.policies[service] = self.resolve(service)
+        return policy
+
+
+# --- Cooldown / Hysteresis State Machine ---
+
+def advance(entry, policy, gap, now):
+    """
+    Advance one service's state machine with the gap observed at `now`.
+
+    Args:
+        entry (dict): The service's rebalance state entry (updated in place).
+        policy (dict): The service's resolved policy.
+        gap (float): Free-memory gap between the best node and the service's node, in GB.
+        now (float): Unix timestamp.
+
+    Returns:
+        str: The new phase (IDLE, PRESSURED or COOLDOWN).
+    """
+    phase = entry.get("phase", IDLE)
+    if phase == COOLDOWN:
+        if now < entry.get("cooldown_until", 0):
+            return COOLDOWN
+        phase = IDLE
+
+    threshold = policy["memory_difference_gb"]
+    if phase == IDLE and gap >= threshold:
+        phase = PRESSURED
+        entry["pressured_since"] = now
+    elif phase == PRESSURED and gap < threshold - policy["hysteresis_gb"]:
+        phase = IDLE
+    if phase == IDLE:
+        entry.pop("pressured_since", None)
+    entry["phase"] = phase
+    return phase
+
+
+def enter_cooldown(entry, policy, now):
+    """Put a service that was just moved into cooldown."""
+    entry["phase"] = COOLDOWN
+    entry["cooldown_until"] = now + policy["cooldown_minutes"] * 60
+    entry.pop("pressured_since", None)
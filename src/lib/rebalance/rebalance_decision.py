@@ -2,36 +2,78 @@
 """
 rebalance_decision.py
 - Encapsulates the decision logic for memory-aware Docker Swarm service rebalancing.
+- With SHARDING=true each instance evaluates and moves only the anchor groups it owns.
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime
 import asyncio
 from loguru import logger
 from time import time
 
-from core.constants import DEFAULT_REBALANCE_BUFFER_GB
+from core.metrics import registry
+from lib.rebalance.timeseries import series_store
+from lib.rebalance.planner import build_units, plan_moves, imbalance
+from lib.rebalance.policy import PolicyTable, advance, enter_cooldown, short_name, PRESSURED, COOLDOWN
 
-rebalance_attempts_total = 0
-rebalance_success_total = 0
-rebalance_failures_total = 0
-rebalance_last_duration_seconds = 0.0
+# --- Metrics ---
+rebalance_attempts_total = registry.counter("rebalance_attempts_total", "Total rebalance evaluation attempts")
+rebalance_success_total = registry.counter("rebalance_success_total", "Successful service rebalances", ["service", "node"])
+rebalance_failures_total = registry.counter("rebalance_failures_total", "Failed service rebalances", ["service"])
+rebalance_last_duration_seconds = registry.gauge("rebalance_last_duration_seconds", "Last rebalance loop duration in seconds")
+rebalance_cycle_duration_seconds = registry.histogram("rebalance_cycle_duration_seconds", "Rebalance cycle duration in seconds")
+node_free_memory_gb = registry.gauge("node_free_memory_gb", "Free memory per node as seen by the last rebalance cycle", ["node"])
+service_memory_gb = registry.gauge("service_memory_gb", "Memory used per service as seen by the last rebalance cycle", ["service"])
 
 # --- Decision Logic ---
 
-def should_rebalance(service, current_node, free_mem_by_node, config, state, container_mem, dependencies, preferred_node=None, debug=False):
-    now = datetime.utcnow()
-    cooldown = config['default'].get('cooldown_minutes', 15)
-    sustained = config['default'].get('sustained_high_minutes', 10)
-    threshold = config['default'].get('memory_difference_gb', 2)
+def should_rebalance(service, current_node, free_mem_by_node, config, state, container_mem, dependencies, preferred_node=None, debug=False, history=None, now=None, policy=None):
+    """
+    Decide whether a service should move off its current node.
+
+    Every threshold comes from the service's policy. The free-memory gap between
+    the best node and the current node drives the service's state machine (see
+    `policy.advance`); pressure counts as sustained once the service has been
+    pressured for the whole `sustained_high_minutes` window and its gap series
+    never fell below the hysteresis floor in that window. A service in cooldown
+    after a move is never moved.
+
+    Args:
+        state (dict): Rebalance state; holds the per-service state machine.
+        policy (dict): The service's resolved policy (compiled from `config` if omitted).
+        history (SeriesStore): Time-series store to record and judge the gap in
+            (defaults to the shared `series_store`).
+        now (float): Evaluation time as a Unix timestamp (defaults to the current
+            time; injected by the offline simulator).
+
+    Returns:
+        tuple[bool, str | None]: (should move, target node).
+    """
+    history = history if history is not None else series_store
+    now = now if now is not None else time()
+    policy = policy if policy is not None else PolicyTable(config).get(service)
+    preferred_node = preferred_node or policy['preferred_node']
+    sustained = policy['sustained_high_minutes']
+    threshold = policy['memory_difference_gb']
 
     if current_node not in free_mem_by_node:
         return False, None
 
+    # Recorded every evaluation so the sustained window also sees calm periods.
+    gap = max(free_mem_by_node.values()) - free_mem_by_node[current_node]
+    history.record("pressure_gap_gb", service, now, gap)
+
+    entry = state.setdefault(service, {})
+    phase = advance(entry, policy, gap, now)
+    if phase == COOLDOWN:
+        if debug:
+            logger.debug(f"[rebalance] {service} is cooling down after its last move.")
+        return False, None
+
     total_mem = container_mem.get(service, 0)
     for dep in dependencies.get(service, []):
         total_mem += container_mem.get(dep, 0)
 
-    rebalance_buffer = config['default'].get('rebalance_buffer_gb', DEFAULT_REBALANCE_BUFFER_GB)
+    rebalance_buffer = policy['rebalance_buffer_gb']
 
     if preferred_node and preferred_node != current_node:
         preferred_mem = free_mem_by_node.get(preferred_node)
@@ -46,19 +88,19 @@ def should_rebalance(service, current_node, free_mem_by_node, config, state, con
 
     better_nodes = [n for n, mem in free_mem_by_node.items() if mem - free_mem_by_node[current_node] >= threshold]
     if not better_nodes:
-        state.pop(service, None)
         return False, None
 
     max_delta = max(free_mem_by_node.values()) - min(free_mem_by_node.values())
     if total_mem >= max_delta:
         return False, None
 
-    if service not in state:
-        state[service] = {'first_detected': now.isoformat()}
-        return False, None
-
-    first_seen = datetime.fromisoformat(state[service]['first_detected'])
-    if now - first_seen >= timedelta(minutes=sustained):
+    window = sustained * 60
+    floor = threshold - policy['hysteresis_gb']
+    if (
+        phase == PRESSURED
+        and now - entry['pressured_since'] >= window
+        and history.sustained_above("pressure_gap_gb", service, floor, window, now)
+    ):
         best = max(better_nodes, key=lambda n: free_mem_by_node[n])
 
         source_mem = free_mem_by_node[current_node]
@@ -73,84 +115,213 @@ def should_rebalance(service, current_node, free_mem_by_node, config, state, con
             logger.info(f"[rebalance] Skipping move for {service}: improvement less than {rebalance_buffer} GB after accounting for dependents.")
             return False, None
 
+    if debug:
+        stats = history.stats("pressure_gap_gb", service, window, now)
+        logger.debug(f"[rebalance] {service} pressure not sustained yet: {stats}")
     return False, None
 
 # --- Async Rebalance Loop ---
 
+def plan_rebalance(config, free_mem_by_node, candidates, placements, container_mem, dependencies, policies=None):
+    """
+    Planning stage: turn the services judged movable this cycle into one
+    cluster-wide move plan (see `planner.plan_moves`).
+
+    Returns:
+        list[dict]: Planned moves in execution order.
+    """
+    policies = policies if policies is not None else PolicyTable(config)
+    units = build_units(candidates, placements, container_mem, dependencies, policies)
+    moves = plan_moves(
+        free_mem_by_node,
+        units,
+        max_moves=policies.max_moves,
+        min_difference=policies.defaults['memory_difference_gb'],
+        buffer=policies.defaults['rebalance_buffer_gb'],
+    )
+    for move in moves:
+        logger.info(
+            f"[rebalance] Planned move of {move['services']} ({move['size']:.2f} GB) "
+            f"from {move['source']} to {move['target']}"
+        )
+    if moves:
+        predicted = dict(free_mem_by_node)
+        for move in moves:
+            predicted[move['source']] += move['size']
+            predicted[move['target']] -= move['size']
+        logger.info(f"[rebalance] Plan reduces free-memory spread from {imbalance(free_mem_by_node):.2f} GB to {imbalance(predicted):.2f} GB.")
+    if len(units) > len(moves):
+        logger.debug(f"[rebalance] {len(units) - len(moves)} candidate(s) left in place by the planner.")
+    return moves
+
+async def rebalance_cycle(config, state, exporters, policies=None):
+    """
+    Run one rebalance cycle in three stages: evaluate every service, plan
+    moves for the whole cluster at once, then execute the plan.
+
+    Args:
+        policies (PolicyTable): Compiled policies of `config` (compiled here if omitted).
+    """
+    from core.config import REBALANCE_RECORD_FILE
+    from core.config_loader import config_service, validate_dependency_map
+    from core.dependency_graph import dependency_graph
+    from lib.metrics.container_usage import usage_collector
+    from lib.metrics.metrics_scraper import exporter_scraper
+    from core.cluster_snapshot import get_snapshot_async, invalidate
+    from core.sharding import shard_map
+    from lib.rebalance.placement import move_group, is_pinned, PLACEMENT_TIMEOUT
+
+    # All exporters are scraped concurrently; a failing one falls back to its last-known-good value.
+    free_mem_by_node = await exporter_scraper.available_memory_gb(exporters)
+
+    if not free_mem_by_node:
+        logger.warning("[rebalance] No memory data available. Skipping.")
+        return
+
+    # Usage is reported per node by every orcastra instance and keyed by service name.
+    snapshot = await get_snapshot_async()
+    usage = await usage_collector.collect(snapshot)
+    container_mem = usage.service_gb()
+    policies = policies if policies is not None else PolicyTable(config)
+    policies.refresh(snapshot, container_mem.keys())
+
+    sampled_at = time()
+    for node, free in free_mem_by_node.items():
+        series_store.record("node_free_gb", node, sampled_at, free)
+        node_free_memory_gb.set(free, node=node)
+    for service, used in container_mem.items():
+        series_store.record("service_gb", service, sampled_at, used)
+        service_memory_gb.set(round(used, 3), service=service)
+    # swarm.yml's anchor groups, plus groups only listed in the legacy dependencies file.
+    legacy = config_service.get(config['default'].get('dependencies_file', '/etc/swarm-orchestration/dependencies.yml'), validate_dependency_map)
+    graph = dependency_graph(legacy)
+    dependencies = graph.dependents_of
+
+    # Exporters are keyed by hostname; tasks report node IDs.
+    hostnames = {
+        node_id: node.attrs.get("Description", {}).get("Hostname", node_id)
+        for node_id, node in snapshot.nodes_by_id.items()
+    }
+
+    # --- Evaluation stage ---
+    placements, candidates, service_ids = {}, {}, {}
+    for service in container_mem.keys():
+        try:
+            svc_obj = snapshot.service(service)
+            if svc_obj is None:
+                logger.debug(f"[rebalance] {service} is not a Swarm service, skipping.")
+                continue
+
+            current_node = hostnames.get(snapshot.running_node(service))
+            if not current_node:
+                continue
+            placements[service] = current_node
+            service_ids[service] = svc_obj.id
+
+            # Sharded by anchor group: the same key label sync uses, so a group has one owner.
+            if not shard_map.owns(graph.anchor_of(service) or short_name(service)):
+                continue
+
+            policy = policies.get(service)
+
+            if not policy["rebalance"]:
+                logger.debug(f"[rebalance] Skipping {service}: rebalancing disabled by its policy")
+                continue
+
+            if is_pinned(svc_obj.attrs['Spec']):
+                logger.debug(f"[rebalance] Skipping {service}: pinned to a node by its placement constraints")
+                continue
+
+            preferred_node = policy["preferred_node"]
+
+            if preferred_node and current_node != preferred_node:
+                logger.debug(f"[rebalance] {service} prefers node {preferred_node}. Currently on {current_node}.")
+
+            rebalance_attempts_total.inc()
+
+            should_move, target_node = should_rebalance(
+                service, current_node, free_mem_by_node, config, state, container_mem, dependencies,
+                preferred_node=preferred_node, policy=policy,
+            )
+
+            if should_move and target_node:
+                candidates[service] = target_node if target_node == preferred_node else None
+
+        except Exception as e:
+            logger.error(f"[rebalance] Failed to evaluate rebalance for {service}: {e}")
+            rebalance_failures_total.inc(service=service)
+
+    if REBALANCE_RECORD_FILE:
+        from lib.rebalance.simulator import record_cycle
+        record_cycle(REBALANCE_RECORD_FILE, sampled_at, free_mem_by_node, container_mem, placements)
+
+    # --- Planning stage ---
+    moves = plan_rebalance(config, free_mem_by_node, candidates, placements, container_mem, dependencies, policies)
+
+    # --- Execution stage ---
+    for move in moves:
+        target = snapshot.nodes_by_hostname.get(move["target"])
+        if target is None:
+            logger.error(f"[rebalance] Target node {move['target']} not found in the Swarm; skipping move of {move['services']}.")
+            for service in move["services"]:
+                rebalance_failures_total.inc(service=service)
+            continue
+
+        logger.warning(f"[rebalance] Moving {move['services']} to {move['target']}")
+        try:
+            placed = await move_group(move["services"], service_ids, target.id, state, anchored=len(move["services"]) > 1)
+        except Exception as e:
+            logger.error(f"[rebalance] Failed to move {move['services']}: {e}")
+            placed = {}
+
+        for service in move["services"]:
+            if placed.get(service):
+                # The gap history belonged to the old placement.
+                series_store.reset("pressure_gap_gb", service)
+                rebalance_success_total.inc(service=service, node=move["target"])
+                state.setdefault(service, {})['last_moved'] = datetime.utcnow().isoformat()
+                state[service]['moved_to'] = move["target"]
+                enter_cooldown(state[service], policies.get(service), time())
+            else:
+                logger.error(f"[rebalance] {service} did not come up on {move['target']} within {PLACEMENT_TIMEOUT:.0f}s.")
+                rebalance_failures_total.inc(service=service)
+    if moves:
+        invalidate()
+
 async def run_rebalance_loop():
-    from core.config import REBALANCE_CONFIG_PATH
-    from core.config_loader import load_yaml
+    from core.config_loader import rebalance_config
     from core.state import load_state, save_state
-    from lib.metrics.metrics_helpers import get_node_exporter_memory, get_container_memory_usage
-    from core.docker_client import client
-
-    global rebalance_attempts_total, rebalance_success_total, rebalance_failures_total, rebalance_last_duration_seconds
+    from core.runner_pool import runner_pool
+    from lib.rebalance.placement import release_stale
 
-    config = load_yaml(REBALANCE_CONFIG_PATH)
+    config = rebalance_config()
+    policies = PolicyTable(config)
     state = load_state()
 
-    loop_interval = config['default'].get('check_interval_seconds', 60)
-    exporters = config.get('node_exporters', {})
+    try:
+        await release_stale(state)
+        save_state(state)
+    except Exception as e:
+        logger.error(f"[rebalance] Failed to clean up leftover placement constraints: {e}")
 
     while True:
+        # The config service hands out the same instance until the file changes.
+        current = rebalance_config()
+        if current is not config:
+            logger.info("[rebalance] Rebalance config changed; recompiling service policies.")
+            config, policies = current, PolicyTable(current)
+        exporters = config.get('node_exporters', {})
+
         logger.info("[rebalance] Checking memory stats for rebalancing decisions...")
         start_time = time()
 
-        free_mem_by_node = {}
-        for node, url in exporters.items():
-            mem = get_node_exporter_memory(url)
-            if mem is not None:
-                free_mem_by_node[node] = mem
-
-        if not free_mem_by_node:
-            logger.warning("[rebalance] No memory data available. Skipping.")
-            await asyncio.sleep(loop_interval)
-            continue
-
-        container_mem = get_container_memory_usage()
-        dependencies = load_yaml(config['default'].get('dependencies_file', '/etc/swarm-orchestration/dependencies.yml'))
-
-        for service in container_mem.keys():
-            try:
-                svc_obj = client.services.get(service)
-                labels = svc_obj.attrs['Spec'].get('Labels', {})
-
-                if labels.get("orchestration.rebalance", "true").lower() != "true":
-                    logger.debug(f"[rebalance] Skipping {service} due to orchestration.rebalance=false")
-                    continue
-
-                preferred_node = labels.get("orchestration.preferred.node")
-
-                current_node = None
-                tasks = svc_obj.tasks()
-                for task in tasks:
-                    if task.get('Status', {}).get('State') == 'running':
-                        current_node = task.get('NodeID')
-                        break
-
-                if not current_node:
-                    continue
-
-                if preferred_node and current_node != preferred_node:
-                    logger.debug(f"[rebalance] {service} prefers node {preferred_node}. Currently on {current_node}.")
-
-                rebalance_attempts_total += 1
-
-                should_move, target_node = should_rebalance(
-                    service, current_node, free_mem_by_node, config, state, container_mem, dependencies, preferred_node=preferred_node
-                )
-
-                if should_move and target_node:
-                    logger.warning(f"[rebalance] Triggering rebalance of {service} to {target_node}")
-                    svc_obj.update(force_update=True)
-                    rebalance_success_total += 1
-                    state[service]['last_moved'] = datetime.utcnow().isoformat()
-                    state[service]['moved_to'] = target_node
-
-            except Exception as e:
-                logger.error(f"[rebalance] Failed to evaluate rebalance for {service}: {e}")
-                rebalance_failures_total += 1
+        try:
+            with runner_pool.track("rebalance"):
+                await rebalance_cycle(config, state, exporters, policies)
+        except Exception as e:
+            logger.exception(f"[rebalance] Rebalance cycle failed: {e}")
 
-        rebalance_last_duration_seconds = time() - start_time
+        rebalance_last_duration_seconds.set(time() - start_time)
+        rebalance_cycle_duration_seconds.observe(time() - start_time)
         save_state(state)
-        await asyncio.sleep(loop_interval)
+        await asyncio.sleep(policies.interval)
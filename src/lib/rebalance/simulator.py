@@ -0,0 +1,424 @@
+"""
+simulator.py
+- Offline replay of rebalance decisions; no service is ever touched.
+- Replays recorded cluster snapshots (node free memory, service usage,
+  placements) through `should_rebalance` and the planning stage with an
+  injected clock, applies each planned move to a simulated placement and reports:
+    - moves per hour
+    - peak imbalance (max - min free memory across nodes)
+    - time spent with imbalance over the default `memory_difference_gb`
+    - flapping (a service moved again within REBALANCE_FLAP_WINDOW of its last move)
+- Snapshots are held as NumPy arrays (time x node, time x service). The policy
+  state machine of every service (pressure runs with hysteresis, cooldowns after
+  moves) is computed for blocks of cycles at once from the per-service policies,
+  and the decision code only runs at cycles where some service's pressure is
+  sustained or a service could move to its preferred node, so long replays run
+  at thousands of simulated hours per second.
+- Candidates are built like the rebalance loop builds them: preferred-node
+  moves keep their target, every other move is left to the planner.
+- Snapshots are recorded by the rebalance loop when REBALANCE_RECORD_FILE is
+  set, or produced by the synthetic workload generators below.
+- Usage:
+    python entrypoint.py simulate <steady|diurnal|recording.jsonl> [--hours N] [--config rebalance_config.yml]
+"""
+
+import argparse
+import json
+import math
+import time
+
+import numpy as np
+from loguru import logger
+
+from lib.rebalance.rebalance_decision import should_rebalance, plan_rebalance
+from lib.rebalance.policy import PolicyTable, enter_cooldown, PRESSURED
+
+REBALANCE_FLAP_WINDOW = 3600  # seconds; a second move inside this window counts as a flap
+SIMULATION_BLOCK = 4096       # max cycles evaluated per vectorized block
+
+
+# --- Recording ---
+
+def record_cycle(path, timestamp, free_mem_by_node, usage_gb, placements):
+    """Append one rebalance cycle's inputs to a JSON lines recording."""
+    with open(path, "a") as f:
+        f.write(json.dumps({
+            "t": timestamp,
+            "free": free_mem_by_node,
+            "usage": usage_gb,
+            "placements": placements,
+        }) + "\n")
+
+
+def load_recording(path):
+    """
+    Load a JSON lines recording into workload arrays.
+
+    Returns:
+        dict: Workload (see `workload()`); nodes or services missing from a cycle
+        get NaN free memory, zero usage and placement -1.
+    """
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    nodes = sorted({n for row in rows for n in row["free"]})
+    services = sorted({s for row in rows for s in row["usage"]} | {s for row in rows for s in row["placements"]})
+    node_index = {n: i for i, n in enumerate(nodes)}
+    service_index = {s: i for i, s in enumerate(services)}
+
+    free = np.full((len(rows), len(nodes)), np.nan)
+    usage = np.zeros((len(rows), len(services)))
+    placements = np.full((len(rows), len(services)), -1, dtype=np.int64)
+    for r, row in enumerate(rows):
+        for node, value in row["free"].items():
+            free[r, node_index[node]] = value
+        for service, value in row["usage"].items():
+            usage[r, service_index[service]] = value
+        for service, node in row["placements"].items():
+            if node in node_index:
+                placements[r, service_index[service]] = node_index[node]
+    return workload(np.array([row["t"] for row in rows], dtype=np.float64), nodes, services, free, usage, placements)
+
+
+def workload(t, nodes, services, free, usage, placements):
+    """
+    Bundle workload arrays.
+
+    Args:
+        t (np.ndarray): (T,) cycle timestamps in seconds, increasing.
+        nodes (list[str]), services (list[str]): Column names.
+        free (np.ndarray): (T, N) free memory per node in GB.
+        usage (np.ndarray): (T, S) memory used per service in GB.
+        placements (np.ndarray): (T, S) recorded node index per service (-1 if not running).
+    """
+    return {"t": t, "nodes": nodes, "services": services, "free": free, "usage": usage, "placements": placements}
+
+
+# --- Synthetic Workloads ---
+
+def _free_from_usage(rng, capacity_gb, usage, placement, nodes, noise=0.1):
+    onehot = np.zeros((usage.shape[1], nodes))
+    onehot[np.arange(usage.shape[1]), placement] = 1
+    free = capacity_gb - usage @ onehot + rng.uniform(-noise, noise, (usage.shape[0], nodes))
+    return np.maximum(free, 0)
+
+
+def steady_with_spikes(hours=24, step=60, nodes=3, services=12, capacity_gb=16, seed=0):
+    """
+    Constant per-service usage, packed unevenly, plus short random 3x spikes.
+    A good policy settles the initial skew once and then ignores the spikes.
+    """
+    rng = np.random.default_rng(seed)
+    steps = int(hours * 3600 / step)
+    rows = np.arange(steps)[:, None]
+
+    base = rng.uniform(0.3, 2.0, services)
+    # Spikes start with 2% probability per cycle and last 1-5 cycles.
+    starts = rng.random((steps, services)) < 0.02
+    ends = np.where(starts, rows + rng.integers(1, 6, (steps, services)), -1)
+    spiking = np.maximum.accumulate(ends, axis=0) >= rows
+    usage = base * np.where(spiking, 3.0, 1.0)
+
+    # Skewed start: the first node hosts half of the services.
+    placement = np.where(np.arange(services) % 2 == 0, 0, np.arange(services) % nodes)
+    free = _free_from_usage(rng, capacity_gb, usage, placement, nodes)
+    return workload(
+        rows[:, 0] * float(step), [f"node{i + 1}" for i in range(nodes)], [f"svc{i + 1}" for i in range(services)],
+        free, usage, np.broadcast_to(placement, (steps, services)).copy(),
+    )
+
+
+def diurnal_drift(hours=72, step=60, nodes=3, services=12, capacity_gb=16, leak_gb_per_hour=0.05, seed=0):
+    """
+    Daily sinusoidal load on every service plus one service that slowly leaks memory.
+    A good policy moves the leaking service (eventually) without chasing the daily cycle.
+    """
+    rng = np.random.default_rng(seed)
+    steps = int(hours * 3600 / step)
+    t = np.arange(steps) * float(step)
+
+    base = rng.uniform(0.5, 2.0, services)
+    phase = rng.uniform(0, 2 * math.pi, services)
+    usage = base * (1 + 0.4 * np.sin(2 * math.pi * t[:, None] / 86400 + phase))
+    usage[:, 0] += leak_gb_per_hour * t / 3600
+
+    placement = np.arange(services) % nodes
+    free = _free_from_usage(rng, capacity_gb, usage, placement, nodes)
+    return workload(
+        t, [f"node{i + 1}" for i in range(nodes)], [f"svc{i + 1}" for i in range(services)],
+        free, usage, np.broadcast_to(placement, (steps, services)).copy(),
+    )
+
+
+WORKLOADS = {
+    "steady": steady_with_spikes,
+    "diurnal": diurnal_drift,
+}
+
+
+# --- Replay ---
+
+class SimulatedHistory:
+    """
+    Stand-in for `SeriesStore` inside the simulator: the simulator computes the
+    sustained-gap condition for all services vectorized and `should_rebalance`
+    reads the answer from here.
+    """
+
+    def __init__(self):
+        self.sustained = {}
+
+    def record(self, kind, name, timestamp, value):
+        pass
+
+    def reset(self, kind, name):
+        self.sustained.pop(name, None)
+
+    def stats(self, kind, name, seconds, now):
+        return None
+
+    def sustained_above(self, kind, name, threshold, seconds, now):
+        return name in self.sustained
+
+
+class Simulation:
+    """
+    Replays a workload through the decision and planning code against a simulated placement.
+
+    Recorded free memory reflects the recorded placement; once the simulated placement
+    differs, each node's free memory is corrected by the usage of the services that
+    moved on or off it.
+    """
+
+    def __init__(self, config, dependencies=None):
+        self.config = config
+        self.policies = PolicyTable(config)
+        self.dependencies = dependencies or {}
+        self.state = {}
+        self.history = SimulatedHistory()
+        self._just_moved = []
+        self.moves = 0
+        self.flaps = 0
+        self.peak_imbalance = 0.0
+        self.seconds_over_threshold = 0.0
+        self.simulated_seconds = 0.0
+
+    def _simulated_free(self, w, rows, placement):
+        free = w["free"][rows].copy()
+        recorded = w["placements"][rows]
+        usage = w["usage"][rows]
+        differs = (recorded != placement) & (recorded >= 0) & (placement >= 0)
+        for s in np.flatnonzero(differs.any(axis=0)).tolist():
+            r = np.flatnonzero(differs[:, s])
+            free[r, recorded[r, s]] += usage[r, s]
+            free[r, placement[s]] -= usage[r, s]
+        return free
+
+    def run(self, w):
+        """
+        Replay a workload.
+
+        Returns:
+            dict: Report (see `report()`).
+        """
+        t, usage = w["t"], w["usage"]
+        services = w["services"]
+        steps, count = len(t), len(services)
+        if steps == 0:
+            return self.report()
+
+        policies = [self.policies.get(service) for service in services]
+        threshold = np.array([p["memory_difference_gb"] for p in policies], dtype=np.float64)
+        floor = threshold - np.array([p["hysteresis_gb"] for p in policies], dtype=np.float64)
+        window = np.array([p["sustained_high_minutes"] * 60 for p in policies], dtype=np.float64)
+        buffer = np.array([p["rebalance_buffer_gb"] for p in policies], dtype=np.float64)
+        enabled = np.array([p["rebalance"] for p in policies], dtype=bool)
+        node_index = {n: j for j, n in enumerate(w["nodes"])}
+        preferred = np.array([node_index.get(p["preferred_node"], -1) for p in policies], dtype=np.int64)
+
+        # group[i, j] = 1 if service j's usage moves with service i (itself and its dependents).
+        service_index = {name: i for i, name in enumerate(services)}
+        group = np.eye(count)
+        for anchor, deps in self.dependencies.items():
+            for dep in deps or []:
+                if anchor in service_index and dep in service_index:
+                    group[service_index[anchor], service_index[dep]] = 1
+
+        # Simulated placement starts from each service's first recorded node.
+        placement = np.full(count, -1, dtype=np.int64)
+        run_start = np.full(count, np.nan)   # start time of the current pressured run (NaN while idle)
+        last_moved = np.full(count, -np.inf)
+        cooldown_until = np.full(count, -np.inf)
+
+        logger.disable("lib.rebalance")
+        try:
+            row, block = 0, SIMULATION_BLOCK
+            while row < steps:
+                rows = np.arange(row, min(row + block, steps))
+                recorded = w["placements"][rows]
+                unplaced = placement < 0
+                if unplaced.any():
+                    first = np.where((recorded >= 0).any(axis=0), recorded[(recorded >= 0).argmax(axis=0), np.arange(count)], -1)
+                    placement[unplaced] = first[unplaced]
+
+                free = self._simulated_free(w, rows, placement)
+                top = np.nanmax(free, axis=1)
+                spread = top - np.nanmin(free, axis=1)
+                gap = np.where(placement >= 0, top[:, None] - free[:, np.maximum(placement, 0)], np.nan)
+                gap = np.where(usage[rows] > 0, gap, np.nan)  # not running -> not evaluated
+
+                # Pressure state machine (see `policy.advance`): a run starts when the gap
+                # reaches the threshold and ends when it drops below the hysteresis floor,
+                # the service stops running or it is cooling down after a move.
+                times = t[rows]
+                n = len(rows)
+                index = np.arange(n)[:, None]
+                above = gap >= threshold
+                reset = ~(gap >= floor) | (times[:, None] < cooldown_until)
+                last_reset = np.maximum.accumulate(np.where(reset, index, -1), axis=0)
+                hits = np.where(above & ~reset, index, n)
+                next_hit = np.vstack([np.minimum.accumulate(hits[::-1], axis=0)[::-1], np.full((1, count), n)])
+                entry = np.take_along_axis(next_hit, last_reset + 1, axis=0)
+                since = np.where(entry <= index, times[np.minimum(entry, n - 1)], np.nan)
+                since = np.where((last_reset < 0) & ~np.isnan(run_start), run_start, since)
+                sustained = enabled & (since <= times[:, None] - window)
+
+                # Cheap vectorized pre-filter with the same conditions `should_rebalance` applies
+                # to a sustained service (a better node exists, the group fits the spread, a move
+                # to the emptiest node clears the buffer); the decision code itself only runs at
+                # the remaining cycles.
+                total = usage[rows] @ group.T
+                movable = sustained & above & (total < spread[:, None]) & (gap - 2 * total >= buffer - 1e-9)
+                # Same pre-filter for a move to the preferred node, which needs no sustained pressure.
+                preferred_gap = free[:, np.maximum(preferred, 0)] - free[:, np.maximum(placement, 0)]
+                prefers = (
+                    enabled & (preferred >= 0) & (placement >= 0) & (placement != preferred)
+                    & (usage[rows] > 0) & (times[:, None] >= cooldown_until)
+                    & (preferred_gap - 2 * total >= buffer - 1e-9)
+                )
+                movable |= prefers
+
+                event_rows = np.flatnonzero(movable.any(axis=1))
+                moved_at = None
+                for e in event_rows.tolist():
+                    if self._evaluate(w, rows[e], free[e], placement, sustained[e], prefers[e], since[e], last_moved, cooldown_until):
+                        moved_at = e
+                        break
+
+                end = moved_at + 1 if moved_at is not None else n
+                self._account(times[:end], spread[:end], self.policies.defaults["memory_difference_gb"], rows[0], t)
+                run_start = since[end - 1].copy()
+                if moved_at is not None:
+                    run_start[self._just_moved] = np.nan
+                # Moves invalidate the rest of a block; grow blocks again while nothing moves.
+                block = 64 if moved_at is not None else min(block * 2, SIMULATION_BLOCK)
+                row = rows[0] + end
+        finally:
+            logger.enable("lib.rebalance")
+        return self.report()
+
+    def _account(self, times, spread, threshold, first_row, t):
+        previous = t[first_row - 1] if first_row > 0 else times[0]
+        dt = np.diff(np.concatenate(([previous], times)))
+        self.simulated_seconds += float(dt.sum())
+        self.seconds_over_threshold += float(dt[spread >= threshold].sum())
+        if len(spread):
+            self.peak_imbalance = max(self.peak_imbalance, float(np.nanmax(spread)))
+
+    def _evaluate(self, w, row, free_row, placement, sustained_row, prefers_row, since_row, last_moved, cooldown_until):
+        """Run the decision and planning code at one cycle. Returns True if anything moved."""
+        nodes, services = w["nodes"], w["services"]
+        now = float(w["t"][row])
+        free = {n: float(free_row[j]) for j, n in enumerate(nodes) if not np.isnan(free_row[j])}
+        usage = {s: float(w["usage"][row, i]) for i, s in enumerate(services) if w["usage"][row, i] > 0}
+        placements = {s: nodes[placement[i]] for i, s in enumerate(services) if placement[i] >= 0 and s in usage}
+
+        self.history.sustained = {services[i]: i for i in np.flatnonzero(sustained_row)}
+        candidates = {}
+        for i in np.flatnonzero(sustained_row | prefers_row).tolist():
+            service = services[i]
+            if service in self.history.sustained:
+                # The state machine was advanced vectorized; hand its result to the decision code.
+                entry = self.state.setdefault(service, {})
+                entry["phase"] = PRESSURED
+                entry["pressured_since"] = float(since_row[i])
+            policy = self.policies.get(service)
+            should_move, target_node = should_rebalance(
+                service, placements[service], free, self.config, self.state, usage, self.dependencies,
+                preferred_node=policy["preferred_node"], history=self.history, now=now, policy=policy,
+            )
+            if should_move and target_node:
+                candidates[service] = target_node if target_node == policy["preferred_node"] else None
+        if not candidates:
+            return False
+
+        node_index = {n: j for j, n in enumerate(nodes)}
+        service_index = {s: i for i, s in enumerate(services)}
+        self._just_moved = []
+        for move in plan_rebalance(self.config, free, candidates, placements, usage, self.dependencies, self.policies):
+            for service in move["services"]:
+                i = service_index[service]
+                if now - last_moved[i] < REBALANCE_FLAP_WINDOW:
+                    self.flaps += 1
+                last_moved[i] = now
+                placement[i] = node_index[move["target"]]
+                self.state.setdefault(service, {})["last_moved"] = now
+                self.state[service]["moved_to"] = move["target"]
+                enter_cooldown(self.state[service], self.policies.get(service), now)
+                cooldown_until[i] = self.state[service]["cooldown_until"]
+                self._just_moved.append(i)
+                self.moves += 1
+        return bool(self._just_moved)
+
+    def report(self):
+        hours = self.simulated_seconds / 3600
+        return {
+            "simulated_hours": round(hours, 2),
+            "moves": self.moves,
+            "moves_per_hour": round(self.moves / hours, 4) if hours else 0.0,
+            "peak_imbalance_gb": round(self.peak_imbalance, 2),
+            "hours_over_threshold": round(self.seconds_over_threshold / 3600, 2),
+            "flaps": self.flaps,
+        }
+
+
+def simulate(config, w, dependencies=None):
+    """
+    Replay workload `w` under `config` and return the report plus replay speed.
+    """
+    started = time.perf_counter()
+    report = Simulation(config, dependencies).run(w)
+    elapsed = time.perf_counter() - started
+    report["wall_seconds"] = round(elapsed, 3)
+    report["simulated_hours_per_second"] = round(report["simulated_hours"] / elapsed, 1) if elapsed else None
+    return report
+
+
+def main(argv=None):
+    """CLI: replay a recording or a synthetic workload and print the report as JSON."""
+    from core.config import REBALANCE_CONFIG_PATH
+    from core.config_loader import load_yaml
+    from core.dependency_graph import DependencyGraph, legacy_groups
+
+    parser = argparse.ArgumentParser(prog="simulate", description="Offline rebalance replay simulator")
+    parser.add_argument("source", help=f"Recording (.jsonl) or synthetic workload: {', '.join(WORKLOADS)}")
+    parser.add_argument("--hours", type=float, default=None, help="Simulated hours for synthetic workloads")
+    parser.add_argument("--config", default=REBALANCE_CONFIG_PATH, help="rebalance_config.yml to evaluate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    config = load_yaml(args.config)
+    dependencies = None
+    if args.source in WORKLOADS:
+        kwargs = {"seed": args.seed}
+        if args.hours is not None:
+            kwargs["hours"] = args.hours
+        w = WORKLOADS[args.source](**kwargs)
+    else:
+        w = load_recording(args.source)
+        dependencies_file = config["default"].get("dependencies_file")
+        if dependencies_file:
+            # Recordings use fully-qualified service names; the file may not.
+            dependencies = DependencyGraph.compile(legacy_groups(load_yaml(dependencies_file))).dependents_of
+
+    print(json.dumps(simulate(config, w, dependencies), indent=2))
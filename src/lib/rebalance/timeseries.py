@@ -0,0 +1,153 @@
+"""
+timeseries.py
+- Fixed-size ring buffers of (timestamp, value) samples backed by NumPy arrays.
+- One buffer per node or service series, fed once per rebalance cycle; memory
+  per series is constant (REBALANCE_SERIES_CAPACITY samples).
+- Windowed statistics (EWMA, p95, min, max, slope) are computed vectorized over
+  the samples inside a time window.
+- `sustained_above` is the windowed condition behind `sustained_high_minutes`:
+  the value must have stayed at or above a threshold for the whole window.
+"""
+
+import os
+
+import numpy as np
+
+# --- Config via Environment Variables ---
+REBALANCE_SERIES_CAPACITY = int(os.getenv("REBALANCE_SERIES_CAPACITY", "256"))  # samples kept per series
+EWMA_ALPHA = 0.3
+
+
+class RingBuffer:
+    """
+    Fixed-capacity (timestamp, value) series stored in two preallocated float arrays.
+    """
+
+    __slots__ = ("times", "values", "head", "count")
+
+    def __init__(self, capacity=REBALANCE_SERIES_CAPACITY):
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.head = 0    # index of the next write
+        self.count = 0
+
+    @property
+    def capacity(self):
+        return len(self.values)
+
+    def append(self, timestamp, value):
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def ordered(self):
+        """
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (times, values), oldest first.
+        """
+        if self.count < self.capacity:
+            return self.times[:self.count], self.values[:self.count]
+        order = np.roll(np.arange(self.capacity), -self.head)
+        return self.times[order], self.values[order]
+
+    def window(self, seconds, now):
+        """
+        Samples from the last `seconds`, plus the newest sample at or before the window
+        start so the result describes the whole window.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (times, values), oldest first.
+        """
+        times, values = self.ordered()
+        start = np.searchsorted(times, now - seconds, side="right")
+        start = max(start - 1, 0)
+        return times[start:], values[start:]
+
+
+def ewma(values, alpha=EWMA_ALPHA):
+    """Exponentially weighted mean of `values` (oldest first), newest weighted most."""
+    if len(values) == 0:
+        return None
+    weights = (1 - alpha) ** np.arange(len(values) - 1, -1, -1)
+    return float(np.dot(weights, values) / weights.sum())
+
+
+def slope(times, values):
+    """Least-squares slope of `values` over `times`, in units per second."""
+    if len(values) < 2:
+        return 0.0
+    dt = times - times.mean()
+    denom = np.dot(dt, dt)
+    if denom == 0:
+        return 0.0
+    return float(np.dot(dt, values - values.mean()) / denom)
+
+
+def window_stats(times, values):
+    """
+    Vectorized summary of one window.
+
+    Returns:
+        dict or None: {"count", "last", "ewma", "p95", "min", "max", "slope"}, None if empty.
+    """
+    if len(values) == 0:
+        return None
+    return {
+        "count": int(len(values)),
+        "last": float(values[-1]),
+        "ewma": ewma(values),
+        "p95": float(np.percentile(values, 95)),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "slope": slope(times, values),
+    }
+
+
+class SeriesStore:
+    """
+    Ring buffers keyed by (kind, name), e.g. ("node_free_gb", "node-1") or ("service_gb", "gitea").
+    """
+
+    def __init__(self, capacity=REBALANCE_SERIES_CAPACITY):
+        self.capacity = capacity
+        self.series = {}
+
+    def record(self, kind, name, timestamp, value):
+        buffer = self.series.get((kind, name))
+        if buffer is None:
+            buffer = self.series[(kind, name)] = RingBuffer(self.capacity)
+        buffer.append(timestamp, value)
+
+    def reset(self, kind, name):
+        buffer = self.series.get((kind, name))
+        if buffer is not None:
+            buffer.clear()
+
+    def stats(self, kind, name, seconds, now):
+        """Windowed statistics of one series, or None if it has no samples."""
+        buffer = self.series.get((kind, name))
+        if buffer is None:
+            return None
+        return window_stats(*buffer.window(seconds, now))
+
+    def sustained_above(self, kind, name, threshold, seconds, now):
+        """
+        True if the series has samples covering the full window and none of them
+        dropped below `threshold`.
+        """
+        buffer = self.series.get((kind, name))
+        if buffer is None or buffer.count == 0:
+            return False
+        times, values = buffer.window(seconds, now)
+        if len(times) == 0 or times[0] > now - seconds:
+            return False  # history does not reach back to the window start yet
+        return bool(values.min() >= threshold)
+
+
+# Shared store fed by the rebalance loop.
+series_store = SeriesStore()
@@ -0,0 +1,294 @@
+"""
+event_watcher.py
+- Event-driven reconciler for label_manager (EVENT_MODE=true).
+- Subscribes to the Docker events stream (service, node and container events),
+  maps each event to the anchor group it affects through the dependency graph's
+  reverse index (service -> group), and reconciles only that group after a short debounce.
+- Service events (create/update/remove, including rolling-update `updatestate`
+  changes) and node events are cluster-wide on a manager; container events only
+  come from the local daemon. Task state changes on other nodes are picked up by
+  comparing each group's tasks in the cluster snapshot every EVENT_TASK_POLL_INTERVAL.
+- Groups that have not settled yet (anchor starting, dependents still moving)
+  are re-checked after EVENT_SETTLE_SECONDS until they converge.
+- Reconnects resume from the timestamp of the last event seen.
+- With SHARDING=true every anchor group is re-checked when the sharding ring
+  changes, so groups of a manager that dropped are picked up immediately;
+  `reconcile` skips groups owned by other instances.
+- Retries scheduled by `core.retry_scheduler` wake the loop when they are due
+  and re-run only their anchor group.
+- A `stop` event ends the reconciler (and its stream thread) without touching
+  `should_run`, so label sync can be stopped and restarted when leadership moves.
+  The events stream is closed on stop, so the stream thread exits right away
+  instead of waiting for the next event.
+"""
+
+import os
+import time
+import threading
+from loguru import logger
+
+from core.docker_client import client
+from core.metrics import registry
+from core.cluster_snapshot import get_snapshot, invalidate
+from core.runner_pool import current_runner
+from core.retry_scheduler import retry_scheduler
+from core.sharding import shard_map
+
+# --- Config via Environment Variables ---
+EVENT_DEBOUNCE_SECONDS = float(os.getenv("EVENT_DEBOUNCE_SECONDS", "1"))
+EVENT_SETTLE_SECONDS = float(os.getenv("EVENT_SETTLE_SECONDS", "5"))
+EVENT_TASK_POLL_INTERVAL = float(os.getenv("EVENT_TASK_POLL_INTERVAL", "15"))
+EVENT_RESYNC_INTERVAL = int(os.getenv("EVENT_RESYNC_INTERVAL", "300"))
+EVENT_RECONNECT_DELAY = 5
+EVENT_SETTLE_MAX_SECONDS = 300  # backoff cap for groups that stay unsettled
+EVENT_STOP_CHECK_SECONDS = 1  # longest the reconcile loop sleeps before re-checking `stop`
+
+EVENT_FILTERS = {"type": ["service", "node", "container"]}
+
+# --- Metrics ---
+events_received_total = registry.counter("label_sync_events_received_total", "Docker events received by the label_sync event reconciler", ["type"])
+event_reconciles_total = registry.counter("label_sync_event_reconciles_total", "Anchor group reconciles triggered by events", ["anchor"])
+event_stream_reconnects_total = registry.counter("label_sync_event_stream_reconnects_total", "Docker events stream reconnects")
+task_changes_total = registry.counter("label_sync_task_changes_total", "Anchor groups whose tasks changed between snapshot polls", ["anchor"])
+
+should_run = True
+
+
+def anchors_for_event(event, graph):
+    """
+    Resolve which anchor groups a single Docker event affects.
+
+    Args:
+        event (dict): Decoded Docker event.
+        graph (DependencyGraph): Compiled dependencies; its reverse index maps
+            a service name to its group.
+
+    Returns:
+        set[str]: Anchor labels to reconcile (empty if the event is unrelated).
+    """
+    event_type = event.get("Type")
+    actor = event.get("Actor", {})
+    attributes = actor.get("Attributes", {}) or {}
+
+    if event_type == "service":
+        # Covers create/update/remove and `updatestate.new` changes of rolling updates.
+        anchor = graph.anchor_of(attributes.get("name"))
+        return {anchor} if anchor else set()
+
+    if event_type == "container":
+        anchor = graph.anchor_of(attributes.get("com.docker.swarm.service.name"))
+        return {anchor} if anchor else set()
+
+    if event_type == "node":
+        # A node changing state affects every group with a task placed on it.
+        snapshot = get_snapshot()
+        affected = set()
+        for task in snapshot.tasks_by_node_id.get(actor.get("ID"), []):
+            service = snapshot.services_by_id.get(task.get("ServiceID"))
+            if service is None:
+                continue
+            anchor = graph.anchor_of(service.attrs.get("Spec", {}).get("Name"))
+            if anchor:
+                affected.add(anchor)
+        return affected
+
+    return set()
+
+
+def task_states(snapshot, graph):
+    """
+    Task fingerprint of every anchor group, used to spot task changes on any node.
+
+    Args:
+        snapshot (ClusterSnapshot): Current cluster view.
+        graph (DependencyGraph): Compiled dependencies.
+
+    Returns:
+        dict[str, frozenset]: Anchor label -> {(task ID, node ID, state)} of its services' tasks.
+    """
+    return {
+        group.anchor: frozenset(
+            (task.get("ID"), task.get("NodeID"), task.get("Status", {}).get("State"))
+            for service in group.members
+            for task in snapshot.tasks(service)
+        )
+        for group in graph
+    }
+
+
+class EventReconciler:
+    """
+    Collects anchor groups touched by Docker events and reconciles each one
+    once its debounce window has passed.
+    """
+
+    def __init__(self, graph, reconcile, resync, stop=None):
+        self.graph = graph
+        self.reconcile = reconcile
+        self.resync = resync
+        self.pending = {}  # anchor label -> monotonic time it becomes due
+        self.unsettled = {}  # anchor label -> consecutive unsettled reconciles
+        self.last_event_time = None
+        self.task_states = None  # anchor label -> task fingerprint from the last poll
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop = stop or threading.Event()
+        self.stream = None  # the open events stream, closed on stop to unblock the watch thread
+
+    def running(self):
+        return should_run and not self.stop.is_set()
+
+    def mark(self, anchor, delay):
+        due = time.monotonic() + delay
+        with self.lock:
+            # Keep the earliest deadline so a burst of events does not postpone work.
+            if anchor not in self.pending or due < self.pending[anchor]:
+                self.pending[anchor] = due
+        self.wakeup.set()
+
+    def handle_event(self, event):
+        events_received_total.inc(type=event.get("Type", "unknown"))
+        self.last_event_time = event.get("time", self.last_event_time)
+
+        anchors = anchors_for_event(event, self.graph)
+        if not anchors:
+            return
+
+        logger.debug(
+            f"[events] {event.get('Type')}/{event.get('Action')} affects anchor group(s): {sorted(anchors)}"
+        )
+        invalidate()
+        for anchor in anchors:
+            self.unsettled.pop(anchor, None)
+            self.mark(anchor, EVENT_DEBOUNCE_SECONDS)
+
+    def poll_tasks(self):
+        """Mark anchor groups whose tasks changed since the last poll (anywhere in the cluster)."""
+        try:
+            states = task_states(get_snapshot(max_age=EVENT_TASK_POLL_INTERVAL), self.graph)
+        except Exception as e:
+            logger.warning(f"[events] Task poll failed: {e}")
+            return
+        if self.task_states is not None:
+            for anchor, tasks in states.items():
+                if self.task_states.get(anchor) != tasks:
+                    task_changes_total.inc(anchor=anchor)
+                    logger.debug(f"[events] Tasks of anchor group {anchor} changed.")
+                    self.unsettled.pop(anchor, None)
+                    self.mark(anchor, EVENT_DEBOUNCE_SECONDS)
+        self.task_states = states
+
+    def watch(self):
+        """Consume the events stream forever, reconnecting from the last seen timestamp."""
+        current_runner.set("label_sync_events")  # this thread's own context: attributes the stream's API calls
+        while self.running():
+            if self.last_event_time is None:
+                self.last_event_time = int(time.time())
+            since = self.last_event_time
+            try:
+                logger.info(f"[events] Subscribing to Docker events (since={since}).")
+                self.stream = client.events(decode=True, filters=EVENT_FILTERS, since=since)
+                if not self.running():  # stopped while connecting
+                    self.close_stream()
+                    return
+                for event in self.stream:
+                    self.handle_event(event)
+                    if not self.running():
+                        return
+            except Exception as e:
+                if not self.running():
+                    return  # the stream was closed by close_stream()
+                logger.warning(f"[events] Event stream interrupted: {e}")
+
+            event_stream_reconnects_total.inc()
+            time.sleep(EVENT_RECONNECT_DELAY)
+
+    def close_stream(self):
+        """Close the events stream so the watch thread stops waiting for the next event."""
+        stream = self.stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception as e:
+                logger.debug(f"[events] Failed to close the events stream: {e}")
+
+    def pop_due(self):
+        now = time.monotonic()
+        with self.lock:
+            due = [anchor for anchor, at in self.pending.items() if at <= now]
+            for anchor in due:
+                del self.pending[anchor]
+        return due
+
+    def next_due(self):
+        with self.lock:
+            return min(self.pending.values(), default=None)
+
+    def reshard(self):
+        for anchor in self.graph.groups:
+            self.mark(anchor, EVENT_DEBOUNCE_SECONDS)
+
+    def run(self):
+        threading.Thread(target=self.watch, name="docker-events", daemon=True).start()
+        shard_map.subscribe(self.reshard)
+        try:
+            self.loop()
+        finally:
+            shard_map.unsubscribe(self.reshard)
+            self.stop.set()
+            self.close_stream()
+
+    def loop(self):
+        next_resync = time.monotonic() + EVENT_RESYNC_INTERVAL
+        next_task_poll = time.monotonic()
+
+        while self.running():
+            self.wakeup.clear()
+
+            if time.monotonic() >= next_task_poll:
+                self.poll_tasks()
+                next_task_poll = time.monotonic() + EVENT_TASK_POLL_INTERVAL
+
+            for anchor in retry_scheduler.pop_due():
+                self.mark(anchor, 0)
+
+            for anchor in self.pop_due():
+                event_reconciles_total.inc(anchor=anchor)
+                logger.info(f"[events] Reconciling anchor group {anchor}.")
+                if self.reconcile(anchor, self.graph):
+                    self.unsettled.pop(anchor, None)
+                else:
+                    attempts = self.unsettled.get(anchor, 0)
+                    self.unsettled[anchor] = attempts + 1
+                    self.mark(anchor, min(EVENT_SETTLE_SECONDS * 2 ** attempts, EVENT_SETTLE_MAX_SECONDS))
+
+            now = time.monotonic()
+            if now >= next_resync:
+                logger.info("[events] Periodic full resync of all anchor groups.")
+                self.resync(self.graph)
+                next_resync = now + EVENT_RESYNC_INTERVAL
+
+            timeout = min(next_resync, next_task_poll) - time.monotonic()
+            next_due = self.next_due()
+            if next_due is not None:
+                timeout = min(timeout, next_due - time.monotonic())
+            retry_due = retry_scheduler.next_due()  # wall clock: retries outlive restarts
+            if retry_due is not None:
+                timeout = min(timeout, retry_due - time.time())
+            self.wakeup.wait(timeout=min(max(timeout, 0), EVENT_STOP_CHECK_SECONDS))
+
+
+def run_event_loop(graph, reconcile, resync, stop=None):
+    """
+    Block until `stop` is set, reconciling anchor groups as Docker events arrive.
+
+    Args:
+        graph (DependencyGraph): Compiled `dependencies` of swarm.yml.
+        reconcile (callable): reconcile(anchor_label, graph) -> bool settled.
+        resync (callable): resync(graph) for the periodic full pass.
+        stop (threading.Event | None): Set to end the loop; None runs forever.
+    """
+    if not graph:
+        logger.warning("[events] No dependencies found. Nothing to watch.")
+        return
+    EventReconciler(graph, reconcile, resync, stop).run()
@@ -2,6 +2,13 @@
 """
 label_manager.py
 - Main orchestration logic for label synchronization and dependent service updates in Docker Swarm.
+- Restarts are rate-limited per service by the retry scheduler (backoff from the
+  group's `retry_intervals`); a failed restart or group pass is re-run when it
+  is due instead of blocking the pass. Retry cooldowns and mismatch timers live
+  in the state store and are saved after every pass, so a restart does not reset them.
+- With SHARDING=true only the anchor groups owned by this instance are reconciled.
+- Works on the compiled dependency graph (`core.dependency_graph`): service
+  names, stacks and per-group retry policy are resolved once per swarm.yml change.
 """
 
 import os
@@ -9,22 +16,26 @@ import time
 import signal
 import threading
 from loguru import logger
-from datetime import datetime
 
 from core.docker_client import client
-from core.retry_state import retry_state, should_retry, record_retry, clear_retry
+from core.metrics import registry
+from core.sharding import shard_map
+from core.retry_scheduler import retry_scheduler
+from core.state import state_store
 from lib.common.service_helpers import force_update_service
-from lib.sync.label_utils import label_anchors, get_anchor_state_for_failover
+from lib.sync.label_utils import label_anchors, label_anchor_services, get_anchor_state_for_failover
 from lib.common.docker_helpers import get_task_state
 from lib.common.task_diagnostics import log_task_status
-from tenacity import retry, stop_after_attempt, wait_fixed
+from lib.sync.event_watcher import run_event_loop
+from core.runner_pool import runner_pool
 
 # --- Metrics ---
-anchor_updates_total = 0
-dependent_updates_total = 0
-dependent_force_update_failures_total = 0
-anchor_sync_errors_total = 0
-anchor_sync_last_duration_seconds = 0.0
+anchor_updates_total = registry.counter("anchor_updates_total", "Total anchor services label updates", ["anchor"])
+dependent_updates_total = registry.counter("dependent_updates_total", "Total dependent services updated", ["anchor", "service"])
+dependent_force_update_failures_total = registry.counter("dependent_force_update_failures_total", "Dependent force-updates that failed", ["anchor", "service"])
+anchor_sync_errors_total = registry.counter("anchor_sync_errors_total", "Total errors during anchor-dependent sync (anchor=\"all\" for full passes)", ["anchor"])
+anchor_sync_last_duration_seconds = registry.gauge("anchor_sync_last_duration_seconds", "Duration of last sync in seconds")
+anchor_sync_duration_seconds = registry.histogram("anchor_sync_duration_seconds", "Duration of full label sync passes in seconds")
 
 # --- Task State Groups ---
 IGNORED_STATES = {"new", "allocated", "pending"}
@@ -34,150 +45,203 @@ FAILURE_STATES = {"failed", "rejected", "remove", "orphaned"}
 TERMINAL_STATES = SUCCESS_STATES | FAILURE_STATES | {"shutdown"}
 
 # --- Config via Environment Variables ---
-STACK_NAME = os.getenv("STACK_NAME", "swarm-dev")
 RELABEL_TIME = int(os.getenv("RELABEL_TIME", "60"))
 POLLING_MODE = os.getenv("POLLING_MODE", "true").lower() == "true"
 EVENT_MODE = os.getenv("EVENT_MODE", "false").lower() == "true"
-RESTART_DEPENDENTS = os.getenv("RESTART_DEPENDENTS", "false").lower() == "true"
-DEFAULT_RETRY_INTERVALS = [2, 10, 60, 300, 900]
 MAX_MISMATCH_DURATION = int(os.getenv("MAX_MISMATCH_DURATION", "600"))
 
 should_run = True
-mismatch_timestamps = {}
-missing_anchors = {}
-
-# --- Retry & Restart Configuration ---
-def retry_intervals_for(anchor_label, dependencies):
-    value = dependencies.get(anchor_label)
-    if isinstance(value, dict):
-        return value.get("retry_intervals", DEFAULT_RETRY_INTERVALS)
-    return DEFAULT_RETRY_INTERVALS
-
-def should_restart(anchor_label, dependencies):
-    value = dependencies.get(anchor_label)
-    if isinstance(value, dict):
-        return value.get("restart_dependents", RESTART_DEPENDENTS)
-    return RESTART_DEPENDENTS
+mismatch_timestamps = state_store.namespace("mismatches")  # dependent service -> unix time first seen off its anchor
+missing_anchors = state_store.namespace("missing_anchors")
 
 # --- Core Orchestration Logic ---
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(5))
-def update_dependents(client, dependencies):
-    global dependent_updates_total
-    logger.info("[label_sync] Updating dependents strictly based on anchor status and configured cooldowns.")
-
-    for anchor_label, config in dependencies.items():
-        dependents = config.get("services") if isinstance(config, dict) else config
-        stack = config.get("stack", STACK_NAME) if isinstance(config, dict) else STACK_NAME
+def update_group(client, group):
+    """
+    Reconcile a single anchor group: restart a failed anchor or move dependents
+    that are not colocated with it, respecting the group's retry cooldowns.
+
+    Args:
+        group (AnchorGroup): Compiled group from the dependency graph.
+
+    Returns:
+        bool: True if the anchor is running and every dependent is colocated.
+    """
+    anchor_label = group.anchor
+    anchor_service = group.anchor_service
+    retry_intervals = group.retry_intervals
+
+    anchor_state, anchor_node = get_anchor_state_for_failover(anchor_service, debug=True)
+
+    if anchor_state in WAITING_STATES:
+        logger.info(f"[label_sync] Anchor {anchor_service} initializing (state={anchor_state}). Waiting, no restarts yet.")
+        return False
+
+    if anchor_state in FAILURE_STATES or anchor_node is None:
+        logger.warning(f"[label_sync] Anchor {anchor_service} failed (state={anchor_state}). Considering restart per cooldown.")
+
+        if retry_scheduler.eligible(anchor_service):
+            logger.warning(f"[label_sync] Restarting anchor {anchor_service} per cooldown settings.")
+            retry_scheduler.attempt(anchor_service, retry_intervals, action=anchor_label)
+            force_update_service(client, anchor_service)
+        else:
+            logger.info(f"[label_sync] Anchor {anchor_service} in cooldown. Skipping anchor restart.")
+
+        if group.restart_dependents:
+            for dep_service in group.dependents:
+                if retry_scheduler.eligible(dep_service):
+                    logger.warning(f"[label_sync] Restarting dependent {dep_service} due to anchor failure per cooldown.")
+                    retry_scheduler.attempt(dep_service, retry_intervals, action=anchor_label)
+                    force_update_service(client, dep_service)
+                    dependent_updates_total.inc(anchor=anchor_label, service=dep_service)
+                else:
+                    logger.debug(f"[label_sync] Dependent {dep_service} cooldown active, skipping restart.")
+        return False
 
-        anchor_service = f"{stack}_{anchor_label}"
-        retry_intervals = retry_intervals_for(anchor_label, dependencies)
+    if anchor_state != "running":
+        return False
+    retry_scheduler.clear(anchor_service)
 
-        anchor_state, anchor_node = get_anchor_state_for_failover(anchor_service, debug=True)
+    settled = True
+    for dep_service in group.dependents:
+        task_state, dep_node = get_task_state(dep_service, debug=True)
 
-        if anchor_state in WAITING_STATES:
-            logger.info(f"[label_sync] Anchor {anchor_service} initializing (state={anchor_state}). Waiting, no restarts yet.")
+        if not dep_node:
+            settled = False
+            logger.warning(f"[label_sync] {dep_service} has no valid NodeID, skipping temporarily.")
             continue
 
-        if anchor_state in FAILURE_STATES or anchor_node is None:
-            logger.warning(f"[label_sync] Anchor {anchor_service} failed (state={anchor_state}). Considering restart per cooldown.")
-
-            if should_retry(anchor_service, retry_intervals):
-                logger.warning(f"[label_sync] Restarting anchor {anchor_service} per cooldown settings.")
-                record_retry(anchor_service)
-                force_update_service(client, anchor_service)
-            else:
-                logger.info(f"[label_sync] Anchor {anchor_service} in cooldown. Skipping anchor restart.")
-
-            restart_dependents = config.get("restart_dependents", False)
-            if restart_dependents:
-                for dep in dependents:
-                    dep_service = f"{stack}_{dep}"
-                    if should_retry(dep_service, retry_intervals):
-                        logger.warning(f"[label_sync] Restarting dependent {dep_service} due to anchor failure per cooldown.")
-                        record_retry(dep_service)
-                        force_update_service(client, dep_service)
-                        dependent_updates_total += 1
-                    else:
-                        logger.debug(f"[label_sync] Dependent {dep_service} cooldown active, skipping restart.")
+        if task_state in IGNORED_STATES | WAITING_STATES:
+            settled = False
+            logger.debug(f"[label_sync] {dep_service} is initializing (state={task_state}), skipping.")
             continue
 
-        if anchor_state == "running":
-            for dep in dependents:
-                dep_service = f"{stack}_{dep}"
-                task_state, dep_node = get_task_state(dep_service, debug=True)
+        if dep_node == anchor_node:
+            logger.debug(f"[label_sync] ✅ {dep_service} correctly colocated with anchor {anchor_label}.")
+            retry_scheduler.clear(dep_service)
+            mismatch_timestamps.pop(dep_service, None)
+            continue
 
-                if not dep_node:
-                    logger.warning(f"[label_sync] {dep_service} has no valid NodeID, skipping temporarily.")
-                    continue
+        settled = False
+        now = time.time()
+        first_mismatch = mismatch_timestamps.setdefault(dep_service, now)
+        mismatch_duration = now - first_mismatch
 
-                if task_state in IGNORED_STATES | WAITING_STATES:
-                    logger.debug(f"[label_sync] {dep_service} is initializing (state={task_state}), skipping.")
-                    continue
+        logger.info(f"[label_sync] {dep_service} mismatch detected for {int(mismatch_duration)}s (should follow {anchor_node}).")
 
-                if dep_node == anchor_node:
-                    logger.debug(f"[label_sync] ✅ {dep_service} correctly colocated with anchor {anchor_label}.")
-                    clear_retry(dep_service)
-                    mismatch_timestamps.pop(dep_service, None)
-                    continue
+        if mismatch_duration >= MAX_MISMATCH_DURATION:
+            logger.warning(f"[label_sync] {dep_service} mismatch duration exceeded. Skipping further updates for now.")
+            continue
 
-                now = datetime.utcnow()
-                first_mismatch = mismatch_timestamps.get(dep_service, now)
-                mismatch_timestamps[dep_service] = first_mismatch
-                mismatch_duration = (now - first_mismatch).total_seconds()
+        if retry_scheduler.eligible(dep_service):
+            logger.info(f"[label_sync] Restarting {dep_service} due to mismatch per cooldown.")
+            retry_scheduler.attempt(dep_service, retry_intervals, action=anchor_label)
+            force_update_service(client, dep_service)
+            dependent_updates_total.inc(anchor=anchor_label, service=dep_service)
+        else:
+            logger.debug(f"[label_sync] {dep_service} cooldown active, skipping restart.")
 
-                logger.info(f"[label_sync] {dep_service} mismatch detected for {int(mismatch_duration)}s (should follow {anchor_node}).")
+    return settled
 
-                if mismatch_duration >= MAX_MISMATCH_DURATION:
-                    logger.warning(f"[label_sync] {dep_service} mismatch duration exceeded. Skipping further updates for now.")
-                    continue
+def update_dependents(client, graph):
+    logger.info("[label_sync] Updating dependents strictly based on anchor status and configured cooldowns.")
 
-                if should_retry(dep_service, retry_intervals):
-                    logger.info(f"[label_sync] Restarting {dep_service} due to mismatch per cooldown.")
-                    record_retry(dep_service)
-                    force_update_service(client, dep_service)
-                    dependent_updates_total += 1
-                else:
-                    logger.debug(f"[label_sync] {dep_service} cooldown active, skipping restart.")
+    for group in graph:
+        # A failing group is retried on its own schedule; the other groups carry on.
+        try:
+            update_group(client, group)
+            retry_scheduler.clear(group.retry_key)
+        except Exception:
+            logger.exception(f"[label_sync] Failed to reconcile anchor group {group.anchor}; retrying it when due.")
+            anchor_sync_errors_total.inc(anchor=group.anchor)
+            retry_scheduler.attempt(group.retry_key, group.retry_intervals, action=group.anchor)
 
     logger.info("[label_sync] Dependent services updated respecting anchor-specific cooldown rules.")
 
+def reconcile_anchor(anchor_label, graph):
+    """
+    Relabel and reconcile only the group of `anchor_label`.
+    Used by the event-driven reconciler instead of a full dependency-map pass.
+
+    Returns:
+        bool: True if the group has settled, False if it should be re-checked.
+    """
+    group = graph.group(anchor_label)
+    if group is None or not shard_map.owns(anchor_label):
+        return True
+
+    try:
+        label_anchors([anchor_label], group.stack, debug=True)
+        anchor_updates_total.inc(anchor=anchor_label)
+        return update_group(client, group)
+    except Exception:
+        logger.exception(f"[label_sync] Unexpected error reconciling anchor group {anchor_label}")
+        anchor_sync_errors_total.inc(anchor=anchor_label)
+        return False
+    finally:
+        save_sync_state()
+
+def save_sync_state():
+    """Persist retry cooldowns and mismatch timers changed by this pass."""
+    try:
+        state_store.flush("retries", "mismatches", "missing_anchors")
+    except OSError as e:
+        logger.error(f"[label_sync] Failed to persist label sync state: {e}")
+
 # --- Entrypoint Loop ---
-def main_loop(dependencies):
-    global anchor_updates_total, anchor_sync_errors_total, anchor_sync_last_duration_seconds
+def main_loop(graph):
+    """
+    One full label sync pass over every owned anchor group.
 
+    Args:
+        graph (DependencyGraph): Compiled `dependencies` of swarm.yml.
+    """
     start_time = time.time()
     try:
-        if not dependencies:
+        if not graph:
             logger.warning("[label_sync] No dependencies found.")
             return
 
+        graph = graph.subset(shard_map.select(graph.groups))
+        if not graph:
+            logger.debug("[label_sync] No anchor groups owned by this instance.")
+            return
+
         logger.info("[label_sync] Running label sync main loop")
-        for anchor_label, config in dependencies.items():
-            stack = config.get("stack", STACK_NAME) if isinstance(config, dict) else STACK_NAME
-            label_anchors([anchor_label], stack, debug=True)
+        label_anchor_services({group.anchor: group.anchor_service for group in graph}, debug=True)
 
-        anchor_updates_total += 1
-        update_dependents(client, dependencies)
+        for group in graph:
+            anchor_updates_total.inc(anchor=group.anchor)
+        update_dependents(client, graph)
 
     except Exception as e:
         logger.exception(f"[label_sync] Unexpected error during label sync")
-        anchor_sync_errors_total += 1
+        anchor_sync_errors_total.inc(anchor="all")
 
     finally:
-        anchor_sync_last_duration_seconds = time.time() - start_time
+        save_sync_state()
+        anchor_sync_last_duration_seconds.set(time.time() - start_time)
+        anchor_sync_duration_seconds.observe(time.time() - start_time)
 
 # --- Signal Support for SIGHUP Rerun ---
 def signal_handler(signum, frame):
     logger.info("[label_sync] SIGHUP received — forcing label sync now")
 
 # --- Entrypoint Dispatcher ---
-def run(dependencies):
+def run(graph, stop=None):
     if threading.current_thread() is threading.main_thread():
-        signal.signal(signal.SIGHUP, lambda s, f: main_loop(dependencies))
-
-    if POLLING_MODE:
-        while should_run:
-            main_loop(dependencies)
-            time.sleep(RELABEL_TIME)
-    elif EVENT_MODE:
-        logger.info("[label_sync] Event-driven mode is not implemented yet.")
+        signal.signal(signal.SIGHUP, lambda s, f: main_loop(graph))
+
+    if EVENT_MODE:
+        logger.info("[label_sync] EVENT_MODE=true — reconciling anchor groups from the Docker events stream.")
+        runner_pool.tracked("label_sync", main_loop)(graph)
+        run_event_loop(
+            graph,
+            reconcile=runner_pool.tracked("label_sync", reconcile_anchor),
+            resync=runner_pool.tracked("label_sync", main_loop),
+            stop=stop,
+        )
+    elif POLLING_MODE:
+        stop = stop or threading.Event()
+        while should_run and not stop.is_set():
+            main_loop(graph)
+            stop.wait(RELABEL_TIME)
@@ -0,0 +1,84 @@
+"""
+label_planner.py
+- Computes the desired anchor label set for every node in one pass.
+- Diffs it against a single node listing and applies each node's changes as
+  one versioned `node.update` call instead of one CLI subprocess per label.
+- On a version conflict the node is reloaded and its diff re-applied once.
+"""
+
+from loguru import logger
+
+
+def plan_anchor_labels(anchor_nodes, nodes):
+    """
+    Compute per-node label changes for all anchors at once.
+
+    Args:
+        anchor_nodes (dict[str, str | None]): Anchor label -> node ID it runs on (None if down).
+        nodes (list): Docker SDK Node objects from one listing.
+
+    Returns:
+        dict[str, dict]: Node ID -> {"node", "add": set, "remove": set}, only for nodes that change.
+    """
+    plan = {}
+    for node in nodes:
+        labels = node.attrs["Spec"].get("Labels", {}) or {}
+        add, remove = set(), set()
+
+        for anchor, anchor_node in anchor_nodes.items():
+            if anchor_node == node.id:
+                if not labels.get(anchor):
+                    add.add(anchor)
+            elif labels.get(anchor):
+                remove.add(anchor)
+
+        if add or remove:
+            plan[node.id] = {"node": node, "add": add, "remove": remove}
+    return plan
+
+
+def _merged_spec(node, add, remove):
+    spec = dict(node.attrs["Spec"])
+    labels = dict(spec.get("Labels", {}) or {})
+    for anchor in remove:
+        labels.pop(anchor, None)
+    for anchor in add:
+        labels[anchor] = "true"
+    spec["Labels"] = labels
+    return spec
+
+
+def apply_label_plan(plan, dry_run=False):
+    """
+    Apply a plan from `plan_anchor_labels`, one `node.update` per changed node.
+
+    Returns:
+        int: Number of nodes updated.
+    """
+    updated = 0
+    for node_id, change in plan.items():
+        node, add, remove = change["node"], change["add"], change["remove"]
+        hostname = node.attrs.get("Description", {}).get("Hostname", node_id)
+        summary = f"+{sorted(add)} -{sorted(remove)}"
+
+        if dry_run:
+            logger.info(f"[label_planner] (Dry Run) Would update {hostname}: {summary}")
+            continue
+
+        for attempt in range(2):
+            try:
+                node.update(_merged_spec(node, add, remove))
+                logger.info(f"[label_planner] Updated anchor labels on {hostname}: {summary}")
+                updated += 1
+                break
+            except Exception as e:
+                if attempt == 0:
+                    # Most likely a version conflict with a concurrent writer: reload and retry once.
+                    logger.debug(f"[label_planner] Update of {hostname} failed ({e}); reloading node and retrying.")
+                    try:
+                        node.reload()
+                    except Exception:
+                        pass
+                    continue
+                logger.error(f"[label_planner] Failed to update labels on {hostname}: {e}")
+    return updated
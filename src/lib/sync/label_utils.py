@@ -2,7 +2,7 @@
 label_utils.py
 - Encapsulates logic for:
     - Resolving which node a Docker Swarm service is running on
-    - Applying and removing node labels through the Docker CLI
+    - Applying and removing node labels (batched per node via label_planner, or through the Docker CLI)
 
 Used by label_sync, bootstrap, and rebalance logic for task placement control.
 """
@@ -10,16 +10,15 @@ Used by label_sync, bootstrap, and rebalance logic for task placement control.
 import logging
 import time
 import subprocess
-import docker
-from core.docker_client import client
+from core.cluster_snapshot import get_snapshot, invalidate
 from lib.common.task_diagnostics import log_task_status
+from lib.sync.label_planner import plan_anchor_labels, apply_label_plan
 
 
 def debug_anchor(anchor_service):
     print(f"Debugging anchor service: {anchor_service}")
     try:
-        service = client.services.get(anchor_service)
-        tasks = service.tasks()
+        tasks = get_snapshot().tasks(anchor_service)
         print(f"Found {len(tasks)} task(s) for {anchor_service}")
         for task in tasks:
             print(f"Task ID: {task['ID']}, State: {task['Status']['State']}, NodeID: {task.get('NodeID')}")
@@ -60,54 +59,54 @@ def label_anchors(anchor_list, stack_name, dry_run=False, debug=False):
     Applies labels to nodes running anchor services.
     Labels are ONLY cleared or updated when anchors move or go down.
     """
+    label_anchor_services({anchor: f"{stack_name}_{anchor}" for anchor in anchor_list}, dry_run=dry_run, debug=debug)
+
+
+def label_anchor_services(anchor_services, dry_run=False, debug=False):
+    """
+    Label nodes for many anchors at once, against a single node listing.
+
+    Args:
+        anchor_services (dict[str, str]): Anchor label -> full service name.
+        dry_run (bool): Only log the planned changes.
+        debug (bool): Log per-task details while resolving anchors.
+    """
     logging.info("[label_anchors] Updating anchor labels without aggressive clearing.")
     current_anchor_nodes = {}
 
-    for anchor in anchor_list:
-        service_name = f"{stack_name}_{anchor}"
+    for anchor, service_name in anchor_services.items():
         node_id = get_anchor_node_for_labeling(service_name, debug=debug)
 
         if node_id and node_id != "starting":
             current_anchor_nodes[anchor] = node_id
             logging.info(f"[label_anchors] {anchor} is running on node {node_id}.")
         else:
+            current_anchor_nodes[anchor] = None
             logging.warning(f"[label_anchors] {anchor} is down or starting (node_id={node_id}).")
 
-    for node in client.nodes.list():
-        node_id = node.id
-        labels = node.attrs["Spec"].get("Labels", {})
-        hostname = node.attrs["Description"]["Hostname"]
-
-        for anchor in anchor_list:
-            anchor_current_node = current_anchor_nodes.get(anchor)
-
-            if labels.get(anchor) and anchor_current_node != node_id:
-                reason = "down" if not anchor_current_node else f"moved to {anchor_current_node}"
-                logging.info(f"[label_anchors] Removing {anchor}=true from {hostname} ({reason}).")
-                if not dry_run:
-                    remove_label(node_id, anchor)
-
-            if anchor_current_node == node_id and not labels.get(anchor):
-                logging.info(f"[label_anchors] Adding {anchor}=true to {hostname}.")
-                if not dry_run:
-                    apply_label(node_id, anchor)
+    plan = plan_anchor_labels(current_anchor_nodes, get_snapshot().nodes)
+    if not plan:
+        logging.info("[label_anchors] Anchor labels already up to date.")
+        return
 
+    if apply_label_plan(plan, dry_run=dry_run):
+        invalidate()
     logging.info("[label_anchors] Anchor labels updated correctly.")
 
 
 def get_anchor_node_for_labeling(service_name, debug=False):
     try:
-        service = client.services.get(service_name)
-        tasks = service.tasks()
-        for task in tasks:
+        snapshot = get_snapshot()
+        if snapshot.service(service_name) is None:
+            logging.warning(f"[labeling] Anchor service {service_name} not found.")
+            return None
+        for task in snapshot.tasks(service_name):
             state = task["Status"]["State"]
             node_id = task.get("NodeID")
             if debug:
                 logging.debug(f"[labeling] Task {task['ID']} - State: {state}, NodeID: {node_id}")
             if state == "running" and node_id:
                 return node_id
-    except docker.errors.NotFound:
-        logging.warning(f"[labeling] Anchor service {service_name} not found.")
     except Exception as e:
         logging.error(f"[labeling] Unexpected error for {service_name}: {e}")
     return None
@@ -115,21 +114,21 @@ def get_anchor_node_for_labeling(service_name, debug=False):
 
 def get_anchor_state_for_failover(service_name, debug=False):
     try:
-        service = client.services.get(service_name)
-        tasks = service.tasks()
-        if not tasks:
+        snapshot = get_snapshot()
+        if snapshot.service(service_name) is None:
+            logging.error(f"[failover] Service {service_name} not found.")
+            return ("not_found", None)
+
+        recent = snapshot.latest_task(service_name)
+        if recent is None:
             return ("no_tasks", None)
 
-        recent = sorted(tasks, key=lambda t: t["Status"]["Timestamp"], reverse=True)[0]
         state = recent["Status"]["State"]
         node_id = recent.get("NodeID")
 
         if debug:
             logging.debug(f"[failover] Task {recent['ID']} - State: {state}, NodeID: {node_id}")
         return (state, node_id)
-    except docker.errors.NotFound:
-        logging.error(f"[failover] Service {service_name} not found.")
-        return ("not_found", None)
     except Exception as e:
         logging.error(f"[failover] Error resolving failover state for {service_name}: {e}")
         return ("error", None)
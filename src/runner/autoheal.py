@@ -6,67 +6,84 @@ autoheal.py
 - No enable/disable toggle; always active as part of swarm-orch.
 - Adheres to swarm-orch project structure and best practices.
 - Exposes basic metrics for Prometheus.
+- With SHARDING=true each manager instance heals only the services it owns.
 """
 
 import os
-import asyncio
 import logging
-from datetime import datetime, timedelta
-from core.docker_client import client
+from datetime import datetime, timezone
+from core.async_docker import async_client, bounded_gather
+from core.cluster_snapshot import get_snapshot_async, invalidate
+from core.metrics import registry
+from core.sharding import shard_map
+from core.runner_pool import runner_pool
+from core.scheduler import scheduler, Job
 
 # --- Autoheal Metrics ---
-autoheal_attempts_total = 0
-autoheal_success_total = 0
-autoheal_failures_total = 0
+autoheal_attempts_total = registry.counter("autoheal_attempts_total", "Total autoheal attempts on unhealthy containers", ["service"])
+autoheal_success_total = registry.counter("autoheal_success_total", "Successful autoheal operations", ["service"])
+autoheal_failures_total = registry.counter("autoheal_failures_total", "Failed autoheal operations", ["service"])
 
 # --- Configuration Defaults ---
 AUTOHEAL_CHECK_INTERVAL = int(os.getenv("AUTOHEAL_CHECK_INTERVAL", 30))  # seconds
 AUTOHEAL_GRACE_PERIOD = int(os.getenv("AUTOHEAL_GRACE_PERIOD", 60))      # seconds unhealthy before action
 
-async def run():
-    global autoheal_attempts_total, autoheal_success_total, autoheal_failures_total
-
-    while True:
-        logging.info("[autoheal] Scanning services for unhealthy containers...")
+def find_unhealthy(snapshot, now):
+    """
+    Return services with at least one running task unhealthy for longer than the grace period.
 
+    Returns:
+        list[tuple[str, Service]]: (service name, SDK service) pairs to heal.
+    """
+    unhealthy = []
+    for service_name, service in snapshot.services_by_name.items():
+        if not shard_map.owns(service_name):
+            continue
         try:
-            services = client.services.list()
-            now = datetime.utcnow()
+            for task in snapshot.tasks(service_name, desired_state="running"):
+                status = task.get("Status", {})
+                health = status.get("ContainerStatus", {}).get("Health", {})
+                health_status = health.get("Status", "")
+                started_at = status.get("Timestamp")
 
-            for service in services:
-                service_name = service.attrs.get("Spec", {}).get("Name", "unknown")
+                if health_status.lower() == "unhealthy":
+                    # Respect grace period
+                    task_started = datetime.fromisoformat(started_at.replace("Z", "+00:00"))
+                    unhealthy_duration = (now - task_started).total_seconds()
 
-                try:
-                    tasks = service.tasks(filters={"desired-state": "running"})
+                    if unhealthy_duration >= AUTOHEAL_GRACE_PERIOD:
+                        unhealthy.append((service_name, service))
+                        break
 
-                    for task in tasks:
-                        status = task.get("Status", {})
-                        state = status.get("State", "")
-                        container_status = status.get("ContainerStatus", {})
-                        health = container_status.get("Health", {})
-                        health_status = health.get("Status", "")
-                        started_at = status.get("Timestamp")
+        except Exception as inner_e:
+            logging.error(f"[autoheal] Failed to inspect service {service_name}: {inner_e}")
+    return unhealthy
 
-                        if health_status.lower() == "unhealthy":
-                            # Respect grace period
-                            task_started = datetime.fromisoformat(started_at.replace("Z", "+00:00"))
-                            unhealthy_duration = (now - task_started).total_seconds()
+async def heal(service_name, service):
+    autoheal_attempts_total.inc(service=service_name)
+    logging.warning(f"[autoheal] {service_name} has unhealthy container. Attempting recovery...")
+    try:
+        await async_client.force_update_service(service.id)
+        autoheal_success_total.inc(service=service_name)
+        logging.info(f"[autoheal] Successfully triggered update for {service_name}.")
+    except Exception as e:
+        autoheal_failures_total.inc(service=service_name)
+        logging.error(f"[autoheal] Failed to heal {service_name}: {e}")
 
-                            if unhealthy_duration >= AUTOHEAL_GRACE_PERIOD:
-                                autoheal_attempts_total += 1
-                                logging.warning(f"[autoheal] {service_name} has unhealthy container. Attempting recovery...")
-                                try:
-                                    service.update(force_update=True)
-                                    autoheal_success_total += 1
-                                    logging.info(f"[autoheal] Successfully triggered update for {service_name}.")
-                                except Exception as e:
-                                    autoheal_failures_total += 1
-                                    logging.error(f"[autoheal] Failed to heal {service_name}: {e}")
+async def scan():
+    logging.info("[autoheal] Scanning services for unhealthy containers...")
 
-                except Exception as inner_e:
-                    logging.error(f"[autoheal] Failed to inspect service {service_name}: {inner_e}")
+    try:
+        with runner_pool.track("autoheal"):
+            snapshot = await get_snapshot_async()
+            unhealthy = find_unhealthy(snapshot, datetime.now(timezone.utc))
 
-        except Exception as outer_e:
-            logging.error(f"[autoheal] Top-level autoheal scan failed: {outer_e}")
+            if unhealthy:
+                await bounded_gather([heal(name, service) for name, service in unhealthy])
+                invalidate()
 
-        await asyncio.sleep(AUTOHEAL_CHECK_INTERVAL)
+    except Exception as outer_e:
+        logging.error(f"[autoheal] Top-level autoheal scan failed: {outer_e}")
+
+async def run():
+    await scheduler.run_job(Job("autoheal", scan, every=AUTOHEAL_CHECK_INTERVAL))
@@ -4,6 +4,9 @@ bootstrap.py
 - Ensures Docker Swarm is initialized and that all nodes have the correct labels.
 - Can be run via main supervisor or manually via CLI.
 - Executes node promotion, label syncing, static label syncing, and initial join flow.
+- The loop is a job on the shared scheduler (every LOOP_INTERVAL seconds, with jitter).
+- Each phase (reachability, membership check, join, promote, label sync) fans out
+  across nodes concurrently and completes before the next phase starts.
 """
 
 import os
@@ -11,32 +14,38 @@ import signal
 import asyncio
 from loguru import logger
 
-from core.config_loader import load_yaml, preview_yaml
-from lib.bootstrap.bootstrap_tasks import check_swarm, get_join_token, join_node, get_node_map
+from core.config_loader import swarm_config
+from lib.bootstrap.bootstrap_tasks import check_swarm, get_join_token, join_node, get_node_map, fan_out
 from lib.bootstrap.bootstrap_labels import sync_labels
-from lib.common.ssh_helpers import is_online, ssh
+from lib.common.ssh_helpers import ssh, ssh_pool
+from lib.common.reachability import prober, SSH_PORT
 from runner import static_labels  # Static label sync module
+from core.runner_pool import runner_pool
+from core.scheduler import scheduler, Job
 
 # --- Runtime Environment Variables ---
-SWARM_FILE = os.getenv("SWARM_FILE", "/etc/swarm-orchestration/swarm.yml")
 DRY_RUN = os.getenv("DRY_RUN", "false").lower() == "true"
 RUN_ONCE = os.getenv("RUN_ONCE", "false").lower() == "true"
 LOOP_INTERVAL = int(os.getenv("LOOP_INTERVAL", "300"))
+LOOP_JITTER_SECONDS = 30
 DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 should_run = True
 
-# --- Startup Preview ---
-preview_yaml(SWARM_FILE, name="swarm.yml")
-
 def bootstrap_swarm():
     logger.info("[bootstrap] Starting bootstrap sequence...")
-    config = load_yaml(SWARM_FILE)
-    leader = config.get("leader")
-    advertise = config.get("advertise_addr")
-    nodes = config.get("nodes", {})
-    prune = config.get("options", {}).get("prune_unknown_labels", False)
+    config = swarm_config()
+    leader = config.leader
+    advertise = config.advertise_addr
+    nodes = config.nodes
+    prune = config.options.get("prune_unknown_labels", False)
+
+    members = {name: meta["ip"] for name, meta in nodes.items() if name != leader}
+
+    # --- Phase 1: reachability (leader and all nodes probed concurrently over TCP) ---
+    asyncio.run(prober.probe_many([advertise] + list(members.values())))
+    online = {ip: prober.is_up(ip, SSH_PORT) for ip in [advertise] + list(members.values())}
 
-    if not is_online(advertise):
+    if not online.get(advertise):
         logger.warning(f"[bootstrap] Leader {leader} offline at {advertise}, skipping.")
         return False
 
@@ -50,28 +59,45 @@ def bootstrap_swarm():
         logger.error("[bootstrap] Failed to retrieve join token.")
         return False
 
-    for name, meta in nodes.items():
-        ip = meta["ip"]
-        if name == leader:
-            logger.debug(f"[bootstrap] Skipping leader {name}")
-            continue
-        if not is_online(ip):
-            logger.warning(f"[bootstrap] Node {name} at {ip} is offline, skipping.")
-            continue
-        if ssh(ip, "docker info | grep 'Swarm: active'", DEBUG).returncode != 0:
-            join_node(ip, token, advertise, DEBUG)
-            logger.info(f"[bootstrap] Node {name} joined to Swarm.")
+    reachable = []
+    for name, ip in members.items():
+        if online.get(ip):
+            reachable.append(name)
         else:
+            logger.warning(f"[bootstrap] Node {name} at {ip} is offline, skipping.")
+
+    # --- Phase 2: swarm membership check ---
+    in_swarm = fan_out(
+        "membership",
+        lambda name: ssh(members[name], "docker info | grep 'Swarm: active'", DEBUG).returncode == 0,
+        reachable,
+    )
+
+    # --- Phase 3: join ---
+    to_join = [name for name in reachable if in_swarm.get(name) is False]
+    for name in reachable:
+        if in_swarm.get(name):
             logger.debug(f"[bootstrap] Node {name} already in Swarm.")
 
+    def join(name):
+        join_node(members[name], token, advertise, DEBUG)
+        logger.info(f"[bootstrap] Node {name} joined to Swarm.")
+
+    fan_out("join", join, to_join)
+
+    # --- Phase 4: promote ---
     node_map = get_node_map(advertise, DEBUG)
     for name in nodes:
-        if name in node_map:
-            logger.info(f"[bootstrap] Promoting node {name} to manager.")
-            ssh(advertise, f"docker node promote {node_map[name]}", DEBUG)
-        else:
+        if name not in node_map:
             logger.warning(f"[bootstrap] Skipping promotion — {name} not found in node_map.")
 
+    def promote(name):
+        logger.info(f"[bootstrap] Promoting node {name} to manager.")
+        ssh(advertise, f"docker node promote {node_map[name]}", DEBUG)
+
+    fan_out("promote", promote, [name for name in nodes if name in node_map])
+
+    # --- Phase 5: label sync ---
     logger.info("[bootstrap] Applying bootstrap-time dynamic labels...")
     sync_labels(advertise, nodes, node_map, prune=prune, dry_run=DRY_RUN, debug=DEBUG)
 
@@ -84,20 +110,26 @@ def bootstrap_swarm():
 
     return True
 
-def sighup_handler(signum, frame):
+def sighup_handler():
+    # Runs on the event loop thread; bootstrap blocks (and drives its own probe loop), so it goes to the pool.
     logger.info("📣 SIGHUP received — re-running bootstrap...")
-    bootstrap_swarm()
+    asyncio.create_task(runner_pool.run("bootstrap", bootstrap_swarm, timeout=LOOP_INTERVAL))
 
 async def run():
-    signal.signal(signal.SIGHUP, sighup_handler)
+    asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, sighup_handler)
     if RUN_ONCE:
         logger.info("[bootstrap] RUN_ONCE=true — running bootstrap once.")
-        bootstrap_swarm()
+        await runner_pool.run("bootstrap", bootstrap_swarm, timeout=LOOP_INTERVAL)
     else:
         logger.info(f"[bootstrap] Starting loop every {LOOP_INTERVAL} seconds...")
-        while should_run:
-            bootstrap_swarm()
-            await asyncio.sleep(LOOP_INTERVAL)
+        await scheduler.run_job(Job("bootstrap", tick, every=LOOP_INTERVAL, jitter=LOOP_JITTER_SECONDS))
+
+async def tick():
+    if not should_run:
+        return
+    # SSH work is blocking; keep it off the event loop.
+    await runner_pool.run("bootstrap", bootstrap_swarm, timeout=LOOP_INTERVAL)
+    ssh_pool.expire_idle()
 
 if __name__ == "__main__":
     asyncio.run(run())
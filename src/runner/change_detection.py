@@ -2,8 +2,11 @@
 """
 change_detection.py
 - Watches key config files (nodes.yml, dependencies.yml, rebalance_config.yml)
-- Triggers appropriate handlers when changes are detected.
-- Includes debouncing to avoid rapid repeated triggers.
+- Triggers appropriate handlers when changes are detected; every change first
+  refreshes the config service, which notifies its subscribers (label sync
+  restarts its event reconciler, rebalance recompiles its policies).
+- Includes debouncing to avoid rapid repeated triggers; the last trigger time per
+  file is kept in the state store, so a restart does not re-trigger immediately.
 """
 
 import time
@@ -14,18 +17,19 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
 from runner.static_labels import run as sync_static_labels
-from lib.sync.label_manager import main_loop as sync_dynamic_labels
 from core.config import SWARM_FILE, REBALANCE_CONFIG_PATH
+from core.config_loader import config_service
 from core.constants import DEBOUNCE_TIME
+from core.state import state_store
 
 CONFIG_DIR = Path("/etc/swarm-orchestration")
 
 WATCHED_FILES = {
-    CONFIG_DIR / "swarm.yml": lambda: (sync_static_labels(), sync_dynamic_labels()),
-    Path(REBALANCE_CONFIG_PATH): lambda: logger.info("[watcher] Rebalance config changed (hook not implemented)")
+    Path(SWARM_FILE): sync_static_labels,
+    Path(REBALANCE_CONFIG_PATH): lambda: None,  # picked up by the rebalance loop on its next cycle
 }
 
-debounce_tracker = {}
+debounce_tracker = state_store.namespace("debounce")  # str(path) -> unix time of the last trigger
 debounce_lock = Lock()
 
 class ConfigChangeHandler(FileSystemEventHandler):
@@ -36,14 +40,16 @@ class ConfigChangeHandler(FileSystemEventHandler):
 
         now = time.time()
         with debounce_lock:
-            last_trigger = debounce_tracker.get(path, 0)
+            last_trigger = debounce_tracker.get(str(path), 0)
             if now - last_trigger < DEBOUNCE_TIME:
                 logger.debug(f"[watcher] Debounced {path.name} (last trigger {now - last_trigger:.2f}s ago)")
                 return
-            debounce_tracker[path] = now
+            debounce_tracker[str(path)] = now
+            state_store.flush("debounce")
 
         logger.info(f"[watcher] Detected change in {path.name}, triggering handler.")
         try:
+            config_service.refresh(path)
             WATCHED_FILES[path]()
         except Exception as e:
             logger.error(f"[watcher] Failed to handle {path.name}: {e}")
@@ -1,22 +1,31 @@
 #!/usr/bin/env python3
 """
 gc_prune.py
-- Periodically runs Docker system prune and volume prune based on GC_* environment variables.
+- Runs Docker system prune and volume prune once at startup and then on the
+  GC_CRON schedule (any 5-field cron expression) via the shared scheduler, based
+  on GC_* environment variables.
 - Absorbed from docker-gc-cron.
 - Exposes Prometheus metrics for prune statistics.
 """
 
 import os
-import asyncio
+import functools
 import subprocess
 import logging
 from datetime import datetime
 from time import time
+from core.metrics import registry
+from core.runner_pool import runner_pool
+from core.scheduler import scheduler, Job, CronExpression
+
+DEFAULT_GC_CRON = "0 */4 * * *"  # every 4 hours
+GC_JITTER_SECONDS = 300  # spreads prunes of all nodes over five minutes
 
 # --- Prometheus Metrics ---
-gc_prune_runs_total = 0
-gc_prune_errors_total = 0
-gc_prune_last_duration_seconds = 0.0
+gc_prune_runs_total = registry.counter("gc_prune_runs_total", "Total successful GC prune runs")
+gc_prune_errors_total = registry.counter("gc_prune_errors_total", "Total GC prune errors")
+gc_prune_last_duration_seconds = registry.gauge("gc_prune_last_duration_seconds", "Last GC prune operation duration in seconds")
+gc_prune_duration_seconds = registry.histogram("gc_prune_duration_seconds", "GC prune operation duration in seconds")
 
 def parse_env_int(var, default=0):
     try:
@@ -24,79 +33,90 @@ def parse_env_int(var, default=0):
     except ValueError:
         return default
 
-async def run():
-    # --- Configuration ---
-    interval_seconds = 4 * 3600  # default to every 4 hours
-    cron_expr = os.getenv("GC_CRON")
-    if cron_expr:
-        # Very simple cron approximation: "0 */4 * * *" → 4 hours
-        try:
-            fields = cron_expr.split()
-            if len(fields) == 5 and fields[1].startswith("*/"):
-                hours = int(fields[1][2:])
-                interval_seconds = hours * 3600
-        except Exception:
-            logging.warning("[gc_prune] Failed to parse GC_CRON. Using 4h default.")
+def load_settings():
+    """
+    Read GC_* environment variables into a settings dict.
+    """
+    cron_expr = os.getenv("GC_CRON", DEFAULT_GC_CRON)
+    try:
+        CronExpression(cron_expr).next_after(time())
+    except ValueError as e:
+        logging.warning(f"[gc_prune] Invalid GC_CRON {cron_expr!r} ({e}). Using {DEFAULT_GC_CRON!r}.")
+        cron_expr = DEFAULT_GC_CRON
 
-    force_image_removal = parse_env_int("GC_FORCE_IMAGE_REMOVAL", 1)
-    force_container_removal = parse_env_int("GC_FORCE_CONTAINER_REMOVAL", 1)
-    minimum_images_to_save = parse_env_int("GC_MINIMUM_IMAGES_TO_SAVE", 3)
-    grace_period_seconds = parse_env_int("GC_GRACE_PERIOD_SECONDS", 10800)
-    dry_run = parse_env_int("GC_DRY_RUN", 0)
-    clean_up_volumes = parse_env_int("GC_CLEAN_UP_VOLUMES", 1)
+    return {
+        "cron": cron_expr,
+        "force_image_removal": parse_env_int("GC_FORCE_IMAGE_REMOVAL", 1),
+        "force_container_removal": parse_env_int("GC_FORCE_CONTAINER_REMOVAL", 1),
+        "minimum_images_to_save": parse_env_int("GC_MINIMUM_IMAGES_TO_SAVE", 3),
+        "grace_period_seconds": parse_env_int("GC_GRACE_PERIOD_SECONDS", 10800),
+        "dry_run": parse_env_int("GC_DRY_RUN", 0),
+        "clean_up_volumes": parse_env_int("GC_CLEAN_UP_VOLUMES", 1),
+    }
 
-    # --- Main Loop ---
-    global gc_prune_runs_total, gc_prune_errors_total, gc_prune_last_duration_seconds
+def prune_once(settings):
+    """
+    Run a single garbage collection pass (blocking; executed on the runner pool).
+    """
+    dry_run = settings["dry_run"]
+    minimum_images_to_save = settings["minimum_images_to_save"]
 
-    while True:
-        logging.info("[gc_prune] Starting garbage collection...")
-        start_time = time()
+    logging.info("[gc_prune] Starting garbage collection...")
+    start_time = time()
 
-        try:
-            # Dry-run simulation
+    try:
+        # Dry-run simulation
+        if dry_run:
+            logging.info("[gc_prune] Dry-run mode: No actual pruning will occur.")
+
+        # Prune stopped containers older than grace period
+        if settings["force_container_removal"]:
+            cmd = [
+                "docker", "container", "prune", "-f",
+                "--filter", f"until={settings['grace_period_seconds']}s"
+            ]
             if dry_run:
-                logging.info("[gc_prune] Dry-run mode: No actual pruning will occur.")
+                logging.info(f"[gc_prune] Would run: {' '.join(cmd)}")
+            else:
+                subprocess.run(cmd, check=True)
+                logging.info("[gc_prune] Containers pruned successfully.")
 
-            # Prune stopped containers older than grace period
-            if force_container_removal:
-                cmd = [
-                    "docker", "container", "prune", "-f",
-                    "--filter", f"until={grace_period_seconds}s"
-                ]
+        # Prune unused images, preserving minimum
+        if settings["force_image_removal"]:
+            images = subprocess.check_output(["docker", "images", "-q"], text=True).strip().splitlines()
+            if len(images) > minimum_images_to_save:
+                cmd = ["docker", "image", "prune", "-af"]
                 if dry_run:
                     logging.info(f"[gc_prune] Would run: {' '.join(cmd)}")
                 else:
                     subprocess.run(cmd, check=True)
-                    logging.info("[gc_prune] Containers pruned successfully.")
-
-            # Prune unused images, preserving minimum
-            if force_image_removal:
-                images = subprocess.check_output(["docker", "images", "-q"], text=True).strip().splitlines()
-                if len(images) > minimum_images_to_save:
-                    cmd = ["docker", "image", "prune", "-af"]
-                    if dry_run:
-                        logging.info(f"[gc_prune] Would run: {' '.join(cmd)}")
-                    else:
-                        subprocess.run(cmd, check=True)
-                        logging.info("[gc_prune] Images pruned successfully.")
-                else:
-                    logging.info(f"[gc_prune] Skipping image prune: Only {len(images)} images found (minimum {minimum_images_to_save}).")
+                    logging.info("[gc_prune] Images pruned successfully.")
+            else:
+                logging.info(f"[gc_prune] Skipping image prune: Only {len(images)} images found (minimum {minimum_images_to_save}).")
 
-            # Prune dangling volumes
-            if clean_up_volumes:
-                cmd = ["docker", "volume", "prune", "-f"]
-                if dry_run:
-                    logging.info(f"[gc_prune] Would run: {' '.join(cmd)}")
-                else:
-                    subprocess.run(cmd, check=True)
-                    logging.info("[gc_prune] Volumes pruned successfully.")
+        # Prune dangling volumes
+        if settings["clean_up_volumes"]:
+            cmd = ["docker", "volume", "prune", "-f"]
+            if dry_run:
+                logging.info(f"[gc_prune] Would run: {' '.join(cmd)}")
+            else:
+                subprocess.run(cmd, check=True)
+                logging.info("[gc_prune] Volumes pruned successfully.")
 
-            gc_prune_runs_total += 1
-            gc_prune_last_duration_seconds = time() - start_time
+        gc_prune_runs_total.inc()
+        gc_prune_last_duration_seconds.set(time() - start_time)
+        gc_prune_duration_seconds.observe(time() - start_time)
 
-        except Exception as e:
-            logging.error(f"[gc_prune] Prune operation failed: {e}")
-            gc_prune_errors_total += 1
+    except Exception as e:
+        logging.error(f"[gc_prune] Prune operation failed: {e}")
+        gc_prune_errors_total.inc()
 
-        logging.info(f"[gc_prune] Sleeping for {interval_seconds} seconds...")
-        await asyncio.sleep(interval_seconds)
+async def run():
+    settings = load_settings()
+    await scheduler.run_job(Job(
+        "gc_prune",
+        functools.partial(runner_pool.run, "gc_prune", prune_once, settings),
+        cron=settings["cron"],
+        jitter=GC_JITTER_SECONDS,
+        run_at_start=True,  # run once at startup, as before the scheduler, then on the cron slots
+    ))
@@ -3,25 +3,85 @@
 label_sync.py
 - Entrypoint script for Docker Swarm label orchestration.
 - Triggers anchor label application and dependent service updates.
+- Each blocking sync pass runs on the shared runner pool so the asyncio loop
+  (bootstrap, rebalance, autoheal, ...) keeps being scheduled.
+- Runs only while this instance is the Swarm leader (see `core.leadership`);
+  cancelling `run()` also stops the event reconciler thread.
+- In polling mode the loop sleeps until the next full pass or the next due
+  retry, whichever comes first, and a due retry re-runs only its anchor group.
+- Dependencies come from the compiled dependency graph of the cached swarm.yml
+  (`core.dependency_graph`): each polling pass picks up the current graph, and in
+  event mode a change restarts the reconciler with the new anchor groups.
 - Can be called by main supervisor or manually via CLI (e.g., entrypoint.py).
 """
 
 import asyncio
-from core.config_loader import load_yaml, preview_yaml
+import threading
+import time
+from loguru import logger
+from core.config import SWARM_FILE
+from core.config_loader import config_service
+from core.dependency_graph import dependency_graph
+from core.runner_pool import runner_pool
+from core.retry_scheduler import retry_scheduler
 from lib.sync import label_manager
 
-SWARM_FILE = "/etc/swarm-orchestration/swarm.yml"
-
-# Preview loaded config for clarity at startup
-preview_yaml(SWARM_FILE, name="swarm.yml")
+async def sync_once(graph=None):
+    """
+    Run a single label sync pass on the runner pool.
+    """
+    if graph is None:
+        graph = dependency_graph()
+    await runner_pool.run("label_sync", label_manager.main_loop, graph)
 
 async def run():
     """
     Run the label manager orchestration loop asynchronously.
     """
-    config = load_yaml(SWARM_FILE)
-    dependencies = config.get("dependencies", {})
-    await label_manager.run(dependencies)
+    if label_manager.EVENT_MODE:
+        # The events reconciler is a long-lived consumer; it gets its own thread
+        # and reports per-reconcile ticks to the runner pool itself. Cancelling
+        # this task (leadership lost, shutdown) does not stop the thread, `stop` does.
+        while True:
+            stop = threading.Event()
+            changed = []
+
+            def on_change(config):
+                changed.append(config)
+                stop.set()
+
+            config_service.subscribe(SWARM_FILE, on_change)
+            try:
+                await asyncio.to_thread(label_manager.run, dependency_graph(), stop)
+            finally:
+                stop.set()
+                config_service.unsubscribe(SWARM_FILE, on_change)
+            if not changed:
+                return
+            logger.info("[label_sync] swarm.yml changed — restarting the event reconciler with the new dependencies.")
+
+    if not label_manager.POLLING_MODE:
+        logger.warning("[label_sync] Neither EVENT_MODE nor POLLING_MODE enabled — label sync disabled.")
+        return
+
+    next_pass = 0
+    while label_manager.should_run:
+        graph = dependency_graph()
+        if time.time() >= next_pass:
+            await sync_once(graph)
+            next_pass = time.time() + label_manager.RELABEL_TIME
+        else:
+            due = retry_scheduler.pop_due()
+            for index, anchor in enumerate(due):
+                if await runner_pool.run("label_sync", label_manager.reconcile_anchor, anchor, graph) is None:
+                    # Skipped (previous job still running) or timed out: put the rest back
+                    # instead of dropping them until the next full pass.
+                    for pending in due[index:]:
+                        retry_scheduler.requeue(pending)
+                    break
+
+        wake = min(next_pass, retry_scheduler.next_due() or next_pass)
+        await asyncio.sleep(max(wake - time.time(), 0))
 
 if __name__ == "__main__":
     asyncio.run(run())
@@ -1,44 +1,54 @@
 #!/usr/bin/env python3
 """
 log_rotate.py
-- Periodically runs logrotate inside swarm-orch container.
+- Runs logrotate inside swarm-orch container once at startup and then on the LOGROTATE_CRON schedule.
 - Centralized, modular log management for multiple hosts/mounts.
 - Logrotate configuration mounted externally at /etc/swarm-orchestration/logrotate.d/.
 - Safe: tolerates missing log paths and missing configuration.
 - Does not crash if mountpoints are absent.
 """
 
-import asyncio
+import functools
 import logging
 import subprocess
 import os
+from core.runner_pool import runner_pool
+from core.scheduler import scheduler, Job
 
 # --- Configuration ---
 LOGROTATE_CONF_DIR = "/etc/swarm-orchestration/logrotate.d"
-LOGROTATE_INTERVAL_SECONDS = 6 * 3600  # every 6 hours
+LOGROTATE_CRON = os.getenv("LOGROTATE_CRON", "30 */6 * * *")  # every 6 hours, offset from GC at minute 0
+LOGROTATE_JITTER_SECONDS = 120
+
+def rotate_once():
+    """
+    Run logrotate once for every config in LOGROTATE_CONF_DIR (blocking; executed on the runner pool).
+    """
+    logging.info("[logrotate] Checking for logrotate configurations...")
+
+    if not os.path.isdir(LOGROTATE_CONF_DIR):
+        logging.warning(f"[logrotate] Config directory {LOGROTATE_CONF_DIR} not found. Skipping run.")
+        return
+
+    configs = [os.path.join(LOGROTATE_CONF_DIR, f) for f in os.listdir(LOGROTATE_CONF_DIR) if f.endswith(".conf")]
+
+    if not configs:
+        logging.info("[logrotate] No logrotate config files found. Nothing to rotate.")
+        return
+
+    for config in configs:
+        logging.info(f"[logrotate] Running logrotate with config {config}")
+        try:
+            subprocess.run(["logrotate", config], check=True)
+            logging.info(f"[logrotate] Logrotate completed successfully for {config}.")
+        except subprocess.CalledProcessError as e:
+            logging.error(f"[logrotate] Logrotate failed for {config}: {e}")
 
 async def run():
-    while True:
-        logging.info("[logrotate] Checking for logrotate configurations...")
-
-        if not os.path.isdir(LOGROTATE_CONF_DIR):
-            logging.warning(f"[logrotate] Config directory {LOGROTATE_CONF_DIR} not found. Skipping run.")
-            await asyncio.sleep(LOGROTATE_INTERVAL_SECONDS)
-            continue
-
-        configs = [os.path.join(LOGROTATE_CONF_DIR, f) for f in os.listdir(LOGROTATE_CONF_DIR) if f.endswith(".conf")]
-
-        if not configs:
-            logging.info("[logrotate] No logrotate config files found. Nothing to rotate.")
-            await asyncio.sleep(LOGROTATE_INTERVAL_SECONDS)
-            continue
-
-        for config in configs:
-            logging.info(f"[logrotate] Running logrotate with config {config}")
-            try:
-                subprocess.run(["logrotate", config], check=True)
-                logging.info(f"[logrotate] Logrotate completed successfully for {config}.")
-            except subprocess.CalledProcessError as e:
-                logging.error(f"[logrotate] Logrotate failed for {config}: {e}")
-
-        await asyncio.sleep(LOGROTATE_INTERVAL_SECONDS)
+    await scheduler.run_job(Job(
+        "log_rotate",
+        functools.partial(runner_pool.run, "log_rotate", rotate_once),
+        cron=LOGROTATE_CRON,
+        jitter=LOGROTATE_JITTER_SECONDS,
+        run_at_start=True,  # run once at startup, as before the scheduler, then on the cron slots
+    ))
@@ -2,18 +2,16 @@
 """
 static_labels.py
 - Entrypoint script to sync static node labels defined in swarm.yml.
-- Reads from /etc/swarm-orchestration/swarm.yml and applies labels to Docker Swarm nodes.
+- Reads the cached, validated swarm.yml (SWARM_FILE) and applies labels to Docker Swarm nodes.
 - Static labels are persistent attributes like zfs, ubuntu, proxmox — not dynamically managed.
 """
 
 import logging
-from core.config_loader import load_yaml
+from core.config_loader import swarm_config
 from core.docker_client import client
 from core.config import DRY_RUN
 from lib.sync.static_label_utils import sync_static_node_labels
 
-SWARM_FILE = "/etc/swarm-orchestration/swarm.yml"
-
 # --- Setup basic logging ---
 logging.basicConfig(
     level=logging.DEBUG,
@@ -22,12 +20,7 @@ logging.basicConfig(
 
 def run():
     logging.info("[static_labels] Starting static label synchronization...")
-    config = load_yaml(SWARM_FILE)
-    if not config:
-        logging.error(f"[static_labels] Failed to load config from {SWARM_FILE}")
-        return
-
-    nodes_config = config.get("nodes", {})
+    nodes_config = swarm_config().nodes
     if not nodes_config:
         logging.warning("[static_labels] No nodes defined in config. Exiting.")
         return
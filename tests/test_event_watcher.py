@@ -0,0 +1,34 @@
+from core.dependency_graph import DependencyGraph
+from lib.sync import event_watcher
+from lib.sync.event_watcher import EventReconciler
+
+
+class Snapshot:
+    def __init__(self, tasks):
+        self.by_service = tasks
+
+    def tasks(self, service_name):
+        return self.by_service.get(service_name, [])
+
+
+def _task(task_id, node_id, state):
+    return {"ID": task_id, "NodeID": node_id, "Status": {"State": state}}
+
+
+def test_task_failure_on_another_node_marks_its_group(monkeypatch):
+    graph = DependencyGraph.compile({"db": ["app"], "cache": ["worker"]}, stack="stack")
+    tasks = {
+        "stack_db": [_task("t1", "remote", "running")],
+        "stack_app": [_task("t2", "remote", "running")],
+        "stack_cache": [_task("t3", "local", "running")],
+    }
+    monkeypatch.setattr(event_watcher, "get_snapshot", lambda max_age=None: Snapshot(tasks))
+
+    reconciler = EventReconciler(graph, reconcile=None, resync=None)
+    reconciler.poll_tasks()
+    assert reconciler.pending == {}  # first poll only records the baseline
+
+    # The anchor fails on a remote node: no container event reaches this daemon.
+    tasks["stack_db"] = [_task("t1", "remote", "failed"), _task("t4", "other", "starting")]
+    reconciler.poll_tasks()
+    assert set(reconciler.pending) == {"db"}
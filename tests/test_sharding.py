@@ -0,0 +1,64 @@
+import asyncio
+
+from core import sharding
+from core.sharding import ShardMap, live_members
+
+
+def _manager(node_id):
+    return {
+        "ID": node_id,
+        "Spec": {"Role": "manager", "Availability": "active"},
+        "Status": {"State": "ready"},
+        "ManagerStatus": {"Reachability": "reachable"},
+    }
+
+
+def _task(node_id, state="running", desired="running"):
+    return {"NodeID": node_id, "DesiredState": desired, "Status": {"State": state}}
+
+
+def test_ready_manager_without_live_instance_is_not_a_member():
+    nodes = [_manager("m1"), _manager("m2"), _manager("m3")]
+    tasks = [_task("m1"), _task("m2", state="failed", desired="shutdown"), _task("m3")]
+    assert live_members(nodes, tasks) == ["m1", "m3"]
+
+
+def test_refresh_moves_keys_off_a_manager_whose_instance_crashed(monkeypatch):
+    nodes = [_manager("m1"), _manager("m2")]
+    tasks = [_task("m1"), _task("m2")]
+
+    class Node:
+        def __init__(self, attrs):
+            self.attrs = attrs
+
+    class Snapshot:
+        @property
+        def nodes(self):
+            return [Node(n) for n in nodes]
+
+        def tasks(self, service_name):
+            assert service_name == "stack_orcastra"
+            return tasks
+
+    class Client:
+        async def info(self):
+            return {"Swarm": {"NodeID": "m1", "ControlAvailable": True}}
+
+    async def snapshot(max_age=None):
+        return Snapshot()
+
+    monkeypatch.setattr(sharding, "async_client", Client())
+    monkeypatch.setattr(sharding, "get_snapshot_async", snapshot)
+
+    shard_map = ShardMap(enabled=True)
+    shard_map.service, shard_map.service_checked = "stack_orcastra", True
+    asyncio.run(shard_map.refresh())
+    assert shard_map.ring.members == {"m1", "m2"}
+    keys = [f"anchor-{i}" for i in range(50)]
+    assert not all(shard_map.owns(key) for key in keys)
+
+    # m2's orcastra task crashed; the node itself stays Ready.
+    tasks[1] = _task("m2", state="failed", desired="shutdown")
+    asyncio.run(shard_map.refresh())
+    assert shard_map.ring.members == {"m1"}
+    assert all(shard_map.owns(key) for key in keys)
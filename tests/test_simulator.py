@@ -0,0 +1,20 @@
+import numpy as np
+
+from lib.rebalance.simulator import Simulation, workload
+
+
+def test_replay_moves_a_service_to_its_preferred_node():
+    # No gap reaches memory_difference_gb, so only the preferred-node path can move svc1.
+    steps = 30
+    t = np.arange(steps) * 60.0
+    free = np.tile([10.0, 14.0, 10.0], (steps, 1))
+    usage = np.full((steps, 2), 1.0)
+    placements = np.tile([0, 2], (steps, 1))
+    config = {"default": {"memory_difference_gb": 5, "rebalance_buffer_gb": 1}, "services": {"svc1": {"preferred_node": "node2"}}}
+
+    simulation = Simulation(config)
+    report = simulation.run(workload(t, ["node1", "node2", "node3"], ["svc1", "svc2"], free, usage, placements))
+
+    assert report["moves"] == 1
+    assert simulation.state["svc1"]["moved_to"] == "node2"
+    assert "moved_to" not in simulation.state.get("svc2", {})
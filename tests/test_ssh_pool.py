@@ -0,0 +1,32 @@
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.common import ssh_helpers
+from lib.common.ssh_helpers import SSHPool
+
+
+def test_concurrent_sessions_per_host_are_capped(tmp_path, monkeypatch):
+    lock = threading.Lock()
+    active = {"now": 0, "peak": 0}
+
+    def fake_run(args, **kwargs):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.02)
+        with lock:
+            active["now"] -= 1
+        return subprocess.CompletedProcess(args, 0, "", "")
+
+    monkeypatch.setattr(ssh_helpers.subprocess, "run", fake_run)
+    pool = SSHPool(control_dir=str(tmp_path), max_sessions=3)
+    monkeypatch.setattr(pool, "_start_master", lambda host: None)
+
+    # Twelve promotions on the leader at once, as the promote phase fans them out.
+    with ThreadPoolExecutor(max_workers=12) as executor:
+        results = list(executor.map(lambda i: pool.run("leader", f"docker node promote n{i}"), range(12)))
+
+    assert all(r.returncode == 0 for r in results)
+    assert active["peak"] == 3
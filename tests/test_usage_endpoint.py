@@ -0,0 +1,88 @@
+"""
+/usage is served by uvicorn on its own thread and loop while the orchestrator
+loop owns the shared async Docker client; the endpoint must still reach the daemon.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import urllib.request
+
+import pytest
+from aiohttp import web
+
+pytest.importorskip("fastapi")
+pytest.importorskip("uvicorn")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _fake_daemon(path, ready):
+    async def info(request):
+        return web.json_response({"Swarm": {"NodeID": "node-1"}})
+
+    async def containers(request):
+        return web.json_response([{"Id": "c" * 64, "Labels": {"com.docker.swarm.service.name": "stack_web", "com.docker.swarm.task.id": "task-1"}}])
+
+    async def stats(request):
+        return web.json_response({"memory_stats": {"usage": 300, "stats": {"inactive_file": 100}}})
+
+    async def serve():
+        app = web.Application()
+        app.router.add_get("/info", info)
+        app.router.add_get("/containers/json", containers)
+        app.router.add_get("/containers/{id}/stats", stats)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.UnixSite(runner, path).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+# main also starts the config file watcher, which has no /etc/swarm-orchestration to watch here.
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_usage_through_api_server_thread(tmp_path, monkeypatch):
+    sock = str(tmp_path / "docker.sock")
+    ready = threading.Event()
+    threading.Thread(target=_fake_daemon, args=(sock, ready), daemon=True).start()
+    assert ready.wait(5)
+
+    os.environ.setdefault("STATE_DIR", str(tmp_path / "state"))
+    os.environ.setdefault("SWARM_FILE", str(tmp_path / "swarm.yml"))
+    import main
+    from core.async_docker import async_client
+    from lib.metrics import container_usage
+
+    monkeypatch.setattr(async_client, "socket_path", sock)
+    monkeypatch.setattr(container_usage, "_local_node_id", None)
+    port = _free_port()
+    monkeypatch.setattr(main, "API_PORT", port)
+    threading.Thread(target=main.start_api, daemon=True).start()
+
+    # The orchestrator loop uses the shared client first, binding a session to itself.
+    orchestrator = asyncio.new_event_loop()
+    threading.Thread(target=orchestrator.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(async_client.info(), orchestrator).result(5)
+
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/usage", timeout=5) as response:
+                body = json.load(response)
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+    assert body == {"node_id": "node-1", "tasks": [["stack_web", "task-1", 200]]}
+    orchestrator.call_soon_threadsafe(orchestrator.stop)